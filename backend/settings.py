@@ -1,3 +1,4 @@
+import json
 import os
 from pathlib import Path
 from dotenv import load_dotenv
@@ -6,6 +7,11 @@ BASE_DIR = Path(__file__).resolve().parent.parent
 
 load_dotenv()
 
+
+def _env_flag(name, default):
+    return os.getenv(name, str(default)).strip().lower() in ("1", "true", "yes", "on")
+
+
 SECRET_KEY = os.getenv("DJANGO_SECRET_KEY", 'fallback-secret-key-in-dev-only')
 DEBUG = True
 ALLOWED_HOSTS = []
@@ -29,6 +35,7 @@ MIDDLEWARE = [
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
+    'doc_ai_api.middleware.RequestCaptureMiddleware',
 ]
 
 ROOT_URLCONF = 'backend.urls'
@@ -81,6 +88,11 @@ USE_TZ = True
 STATIC_URL = 'static/'
 MEDIA_URL = '/media/'
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
+# Generated media (handwriting images) are content-addressed under
+# MEDIA_ROOT/generated, capped at MEDIA_CACHE_MAX_MB with LRU eviction, and served
+# with an ETag and a Cache-Control max-age of MEDIA_CACHE_MAX_AGE seconds.
+MEDIA_CACHE_MAX_BYTES = int(float(os.getenv("MEDIA_CACHE_MAX_MB", "200")) * 1024 * 1024)
+MEDIA_CACHE_MAX_AGE = int(os.getenv("MEDIA_CACHE_MAX_AGE", str(365 * 24 * 3600)))
 
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
@@ -90,9 +102,219 @@ LLM_MODEL = os.getenv("LLM_MODEL", "llama3:8b-instruct-q4_K_M")
 EMBEDDING_MODEL = os.getenv("EMBEDDING_MODEL", "all-MiniLM-L6-v2")
 CHROMA_DB_DIR_RAG = os.path.join(BASE_DIR, "chroma_db_multi_app")
 CHROMA_DB_DIR_QGEN = os.path.join(BASE_DIR, "chroma_db_questions_app")
+
+# RAG vector store backend: "chroma" or "mmap" (in-process exact search over a
+# memory-mapped embedding matrix stored in MMAP_INDEX_DIR_RAG).
+VECTOR_STORE_BACKEND = os.getenv("VECTOR_STORE_BACKEND", "chroma").lower()
+MMAP_INDEX_DIR_RAG = os.path.join(BASE_DIR, "vector_index_rag")
+# Versioned (blue-green) RAG index builds live under RAG_INDEX_ROOT/<backend>/; the
+# fixed CHROMA_DB_DIR_RAG / MMAP_INDEX_DIR_RAG directories are only read until the
+# first versioned build. Besides the live version, this many previous versions are
+# kept for rollback.
+RAG_INDEX_ROOT = os.getenv("RAG_INDEX_ROOT", os.path.join(BASE_DIR, "rag_index"))
+RAG_INDEX_KEEP_VERSIONS = int(os.getenv("RAG_INDEX_KEEP_VERSIONS", "2"))
+# mmap backend only: "int8" or "binary" keeps compact codes in RAM for a first-pass
+# scan and rescores the best k * VECTOR_INDEX_RESCORE_MULTIPLIER rows exactly.
+VECTOR_INDEX_QUANTIZATION = os.getenv("VECTOR_INDEX_QUANTIZATION", "none").lower()
+VECTOR_INDEX_RESCORE_MULTIPLIER = int(os.getenv("VECTOR_INDEX_RESCORE_MULTIPLIER", "10"))
 PDF_TEMP_DIR = os.path.join(BASE_DIR, "pdf_temp_files")
 CUSTOM_HANDWRITING_FONT_PATH = os.path.join(BASE_DIR, os.getenv("CUSTOM_HANDWRITING_FONT", "fonts/MyFont.ttf"))
 
+# Model backends: "stub" swaps in deterministic offline models (benchmarks, load tests, CI).
+LLM_BACKEND = os.getenv("LLM_BACKEND", "ollama").strip().lower()
+EMBEDDING_BACKEND = os.getenv("EMBEDDING_BACKEND", "huggingface").strip().lower()
+STUB_LLM_LATENCY_MS = float(os.getenv("STUB_LLM_LATENCY_MS", "0"))
+STUB_LLM_MS_PER_TOKEN = float(os.getenv("STUB_LLM_MS_PER_TOKEN", "0"))
+STUB_EMBEDDING_LATENCY_MS = float(os.getenv("STUB_EMBEDDING_LATENCY_MS", "0"))
+OLLAMA_BASE_URL = os.getenv("OLLAMA_BASE_URL") or None
+
+# Set to a file path to append every API POST as a JSON line for `manage.py loadtest --replay`.
+REQUEST_CAPTURE_PATH = os.getenv("REQUEST_CAPTURE_PATH") or None
+
+# Startup: fast-start brings HTTP up immediately and warms models/index in a background thread.
+DOC_AI_FAST_START = _env_flag("DOC_AI_FAST_START", False)
+# Models, index and background builders are loaded only in server processes
+# (runserver, gunicorn, uvicorn, daphne, hypercorn, uwsgi, waitress). Set
+# DOC_AI_RUN_STARTUP=true/false to force it for other entry points.
+DOC_AI_RUN_STARTUP = os.getenv("DOC_AI_RUN_STARTUP", "").strip().lower() or None
+MODEL_WARMUP_CALLS = _env_flag("MODEL_WARMUP_CALLS", True)
+RAG_RENDER_WORKFLOW_GRAPH = _env_flag("RAG_RENDER_WORKFLOW_GRAPH", False)
+
+# Document uploads: hashed while streaming; files up to UPLOAD_SPOOL_MAX_MEMORY_BYTES
+# stay in memory, larger ones spill to a temporary file. Oversized uploads get 413.
+UPLOAD_MAX_FILE_BYTES = int(os.getenv("UPLOAD_MAX_FILE_BYTES", str(25 * 1024 * 1024)))
+UPLOAD_MAX_REQUEST_BYTES = int(os.getenv("UPLOAD_MAX_REQUEST_BYTES", str(100 * 1024 * 1024)))
+UPLOAD_SPOOL_MAX_MEMORY_BYTES = int(os.getenv("UPLOAD_SPOOL_MAX_MEMORY_BYTES", str(2621440)))
+
+# Query embeddings are cached (LRU) so repeated questions, retries and batch
+# duplicates skip the embedding model. 0 disables the cache.
+QUERY_EMBEDDING_CACHE_SIZE = int(os.getenv("QUERY_EMBEDDING_CACHE_SIZE", "1024"))
+
+# Shared embedding service: set EMBEDDING_SERVICE_SOCKET to the Unix socket of
+# `manage.py embedding_server` so workers share one model. Concurrent requests are
+# micro-batched within EMBEDDING_SERVICE_MAX_WAIT_MS. With the fallback enabled, a
+# worker loads the model itself while the server is unreachable.
+EMBEDDING_SERVICE_SOCKET = os.getenv("EMBEDDING_SERVICE_SOCKET") or None
+EMBEDDING_SERVICE_MAX_BATCH = int(os.getenv("EMBEDDING_SERVICE_MAX_BATCH", "64"))
+EMBEDDING_SERVICE_MAX_WAIT_MS = float(os.getenv("EMBEDDING_SERVICE_MAX_WAIT_MS", "5"))
+EMBEDDING_SERVICE_TIMEOUT_SECONDS = float(os.getenv("EMBEDDING_SERVICE_TIMEOUT_SECONDS", "30"))
+EMBEDDING_SERVICE_FALLBACK = _env_flag("EMBEDDING_SERVICE_FALLBACK", True)
+
+# Request tracing: rag_chat/qgen/summarize record a span waterfall (graph nodes,
+# LLM calls, retrieval, web search). Traces of at least TRACE_LOG_MIN_DURATION_MS
+# are appended to a rotating JSONL file; "debug": true in the request body also
+# returns the trace inline.
+TRACING_ENABLED = _env_flag("TRACING_ENABLED", True)
+TRACE_LOG_PATH = os.getenv("TRACE_LOG_PATH", os.path.join(BASE_DIR, "traces", "traces.jsonl")) or None
+TRACE_LOG_MAX_BYTES = int(os.getenv("TRACE_LOG_MAX_BYTES", str(10 * 1024 * 1024)))
+TRACE_LOG_BACKUPS = int(os.getenv("TRACE_LOG_BACKUPS", "5"))
+TRACE_LOG_MIN_DURATION_MS = float(os.getenv("TRACE_LOG_MIN_DURATION_MS", "0"))
+
+# Logging: records are queued on the request thread and written by a background
+# listener (JSON lines by default, LOG_FORMAT=text for humans). Messages longer than
+# LOG_MAX_MESSAGE_CHARS are truncated; full answers and raw QGen output are logged at
+# DEBUG. LOG_LEVELS sets per-component levels by logger name, e.g.
+# {"doc_ai_api.rag_processing": "DEBUG", "doc_ai_api.core.web_search": "WARNING"}.
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO").strip().upper()
+LOG_FORMAT = os.getenv("LOG_FORMAT", "json").strip().lower()
+LOG_MAX_MESSAGE_CHARS = int(os.getenv("LOG_MAX_MESSAGE_CHARS", "2000"))
+LOG_QUEUE_SIZE = int(os.getenv("LOG_QUEUE_SIZE", "10000"))
+LOG_LEVELS = json.loads(os.getenv("LOG_LEVELS", "{}"))
+LOGGING = {
+    "version": 1,
+    "disable_existing_loggers": False,
+    "handlers": {
+        "async": {
+            "()": "doc_ai_api.core.logs.AsyncQueueHandler",
+            "format": LOG_FORMAT,
+            "max_message_chars": LOG_MAX_MESSAGE_CHARS,
+            "queue_size": LOG_QUEUE_SIZE,
+        },
+    },
+    "root": {"handlers": ["async"], "level": LOG_LEVEL},
+    "loggers": {
+        "django": {"handlers": ["async"], "level": "INFO", "propagate": False},
+        **{name: {"level": level.upper()} for name, level in LOG_LEVELS.items()},
+    },
+}
+
+# Per-chain decoding limits (Ollama options) for chains that only need a label.
+# Keys: num_predict, stop, and optionally format ("json" or a JSON schema, e.g.
+# {"type": "string", "enum": ["yes", "no"]}) for grammar-constrained output.
+CHAIN_GENERATION_OPTIONS = {
+    "query_classifier": {"num_predict": 12, "stop": ["\n"]},
+    "document_grader": {"num_predict": 4, "stop": ["\n"]},
+    "critique": {"num_predict": 4, "stop": ["\n"]},
+    **json.loads(os.getenv("CHAIN_GENERATION_OPTIONS", "{}")),
+}
+
+# LLM scheduler: at most LLM_MAX_CONCURRENCY generations run at once (match Ollama's
+# OLLAMA_NUM_PARALLEL); waiting calls are served interactive (rag_chat) first, then
+# standard (qgen, summarize), then batch. A request gets 429 + Retry-After when its
+# class already has LLM_ADMISSION_LIMITS[class] requests admitted and not yet
+# finished (running, waiting for a slot or streaming). LLM_QUEUE_LIMITS is the
+# old name of this setting and is still read.
+LLM_MAX_CONCURRENCY = int(os.getenv("LLM_MAX_CONCURRENCY", "2"))
+LLM_ADMISSION_LIMITS = {
+    "interactive": 32,
+    "standard": 16,
+    "batch": 64,
+    **json.loads(os.getenv("LLM_ADMISSION_LIMITS", os.getenv("LLM_QUEUE_LIMITS", "{}"))),
+}
+
+# Identical concurrent rag_chat/qgen/summarize requests (same normalized body and
+# index version) share one execution instead of each calling the LLM.
+REQUEST_COALESCING = _env_flag("REQUEST_COALESCING", True)
+
+# Batch question answering (/api/rag_chat/batch/).
+RAG_BATCH_MAX_QUESTIONS = int(os.getenv("RAG_BATCH_MAX_QUESTIONS", "200"))
+RAG_BATCH_MAX_CONCURRENCY = int(os.getenv("RAG_BATCH_MAX_CONCURRENCY", "4"))
+
+# RAG graph: start retrieval (and optionally the LLM relevance grade) while the query is
+# still being classified; the speculative work is discarded only for web-search routes.
+RAG_SPECULATIVE_RETRIEVAL = _env_flag("RAG_SPECULATIVE_RETRIEVAL", True)
+RAG_SPECULATIVE_GRADING = _env_flag("RAG_SPECULATIVE_GRADING", False)
+
+# Adaptive retrieval: each endpoint fetches RETRIEVAL_CANDIDATE_POOL chunks with
+# their cosine similarity and keeps them in rank order until one scores below
+# min_score or drops more than max_gap below the previous chunk, within
+# [min_k, max_k]. Profiles may override min_score/max_gap. ADAPTIVE_RETRIEVAL=false
+# returns to a fixed top-3.
+ADAPTIVE_RETRIEVAL = _env_flag("ADAPTIVE_RETRIEVAL", True)
+RETRIEVAL_CANDIDATE_POOL = int(os.getenv("RETRIEVAL_CANDIDATE_POOL", "12"))
+RETRIEVAL_MIN_SCORE = float(os.getenv("RETRIEVAL_MIN_SCORE", "0.25"))
+RETRIEVAL_MAX_SCORE_GAP = float(os.getenv("RETRIEVAL_MAX_SCORE_GAP", "0.1"))
+RETRIEVAL_PROFILES = {
+    "rag_chat": {"min_k": 2, "max_k": 6},
+    "qgen": {"min_k": 3, "max_k": 8},
+    "summarize": {"min_k": 3, "max_k": 8},
+    **json.loads(os.getenv("RETRIEVAL_PROFILES", "{}")),
+}
+
+# Section notes: ingestion indexes numbered sections and summarizes them in the
+# background; summarize topics matching a section title (Dice word overlap of at
+# least SECTION_MATCH_THRESHOLD) or number are answered from those notes.
+SECTION_SUMMARIES = _env_flag("SECTION_SUMMARIES", True)
+SECTION_MATCH_THRESHOLD = float(os.getenv("SECTION_MATCH_THRESHOLD", "0.6"))
+
+# Question bank: questions per section and difficulty band (inclusive ranges of
+# the 1-20 qgen scale, matching the prompt's levels) are generated in the
+# background, QUESTION_BANK_BATCH per LLM call, up to QUESTION_BANK_MAX_PER_BAND.
+# qgen topics matching a section are served from the bank; a band is topped up
+# when its unserved questions would not cover another request of the same size
+# plus QUESTION_BANK_MIN_STOCK.
+QUESTION_BANK = _env_flag("QUESTION_BANK", True)
+QUESTION_BANK_BANDS = {
+    "recall": [1, 5],
+    "understanding": [6, 10],
+    "relationships": [11, 15],
+    "analysis": [16, 20],
+    **json.loads(os.getenv("QUESTION_BANK_BANDS", "{}")),
+}
+QUESTION_BANK_BATCH = int(os.getenv("QUESTION_BANK_BATCH", "10"))
+QUESTION_BANK_MIN_STOCK = int(os.getenv("QUESTION_BANK_MIN_STOCK", "5"))
+QUESTION_BANK_MAX_PER_BAND = int(os.getenv("QUESTION_BANK_MAX_PER_BAND", "40"))
+# A band whose last batch added no new questions is not topped up again for this long.
+QUESTION_BANK_EXHAUSTED_TTL = float(os.getenv("QUESTION_BANK_EXHAUSTED_TTL", "3600"))
+
+# Multi-query retrieval for rag_chat: "local" retrieves the question, its keywords
+# and the clauses of a compound question in parallel and fuses the rankings with
+# reciprocal rank fusion (constant RAG_RRF_K); "llm" also retrieves a query
+# rewriter variant generated concurrently, in place of the sequential rewrite
+# loop after a failed grade. "off" retrieves the question alone.
+RAG_MULTI_QUERY = os.getenv("RAG_MULTI_QUERY", "off").strip().lower()
+RAG_MULTI_QUERY_VARIANTS = int(os.getenv("RAG_MULTI_QUERY_VARIANTS", "4"))
+RAG_RRF_K = int(os.getenv("RAG_RRF_K", "60"))
+
+# Critique retries widen retrieval by this many chunks per failed attempt and skip
+# chunks the previous attempts already used.
+RAG_RETRY_K_STEP = int(os.getenv("RAG_RETRY_K_STEP", "3"))
+
+# Context packing: per-chain prompt budgets in tokens. CONTEXT_TOKENIZER optionally names a
+# HuggingFace tokenizer matching LLM_MODEL; otherwise tokens are estimated from characters.
+CONTEXT_TOKENIZER = os.getenv("CONTEXT_TOKENIZER") or None
+CONTEXT_TOKEN_BUDGETS = {
+    "default": 1500,
+    "grade_documents": 1200,
+    "summarize_context": 2000,
+    "critique_answer": 1500,
+    "qgen": 2000,
+    "summarize": 2000,
+    **json.loads(os.getenv("CONTEXT_TOKEN_BUDGETS", "{}")),
+}
+
+# Web search: "google" (Custom Search API), "local" (offline JSONL file or directory of .txt/.md files) or "none".
+GOOGLE_API_KEY = os.getenv("GOOGLE_API_KEY")
+GOOGLE_CSE_ID = os.getenv("GOOGLE_CSE_ID")
+WEB_SEARCH_BACKEND = os.getenv("WEB_SEARCH_BACKEND", "google").strip().lower()
+WEB_SEARCH_LOCAL_CORPUS = os.path.join(BASE_DIR, os.getenv("WEB_SEARCH_LOCAL_CORPUS", "web_search_corpus"))
+WEB_SEARCH_NUM_RESULTS = int(os.getenv("WEB_SEARCH_NUM_RESULTS", "5"))
+WEB_SEARCH_TIMEOUT_SECONDS = float(os.getenv("WEB_SEARCH_TIMEOUT_SECONDS", "8"))
+WEB_SEARCH_CACHE_TTL_SECONDS = float(os.getenv("WEB_SEARCH_CACHE_TTL_SECONDS", "900"))
+WEB_SEARCH_CACHE_MAX_ENTRIES = int(os.getenv("WEB_SEARCH_CACHE_MAX_ENTRIES", "512"))
+WEB_SEARCH_BREAKER_FAILURES = int(os.getenv("WEB_SEARCH_BREAKER_FAILURES", "3"))
+WEB_SEARCH_BREAKER_COOLDOWN_SECONDS = float(os.getenv("WEB_SEARCH_BREAKER_COOLDOWN_SECONDS", "60"))
+
 
 os.makedirs(CHROMA_DB_DIR_RAG, exist_ok=True)
 os.makedirs(CHROMA_DB_DIR_QGEN, exist_ok=True)
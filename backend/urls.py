@@ -1,13 +1,19 @@
 # backend/urls.py
 
 from django.contrib import admin
-from django.urls import path, include
+from django.urls import path, re_path, include
 from django.conf import settings # For serving media files
 from django.conf.urls.static import static # For serving media files
 
+from doc_ai_api import views
+from doc_ai_api.core import media_cache
+
 urlpatterns = [
     path('admin/', admin.site.urls), # Django admin site
     path('api/', include('doc_ai_api.urls')), # Map /api/ to your app's urls.py
+    # Content-addressed generated media, served with ETag/Cache-Control in every environment
+    re_path(rf"^{settings.MEDIA_URL.lstrip('/')}{media_cache.CACHE_SUBDIR}/(?P<file_name>[0-9a-f]{{64}}\.[a-z0-9]+)$",
+            views.cached_media, name='cached_media'),
 ]
 
 if settings.DEBUG:
@@ -0,0 +1,257 @@
+import json
+import os
+import random
+import threading
+import time
+import urllib.error
+import urllib.request
+import uuid
+from collections import Counter, defaultdict
+from concurrent.futures import ThreadPoolExecutor
+
+from ..core import metrics
+
+
+ENDPOINT_PATHS = {
+    "rag_chat": "/api/rag_chat/",
+    "qgen": "/api/qgen/",
+    "summarize": "/api/summarize/",
+    "ingest_documents": "/api/ingest_documents/",
+}
+DEFAULT_MIX = {"rag_chat": 6, "qgen": 2, "summarize": 2, "ingest_documents": 0}
+REJECTION_STATUSES = (429, 503)
+
+
+class LoadRequest:
+    def __init__(self, endpoint, path, body=b"", content_type="application/json", offset=None):
+        self.endpoint = endpoint
+        self.path = path
+        self.body = body
+        self.content_type = content_type
+        self.offset = offset
+
+
+def parse_mix(spec):
+    if not spec:
+        return dict(DEFAULT_MIX)
+    mix = {}
+    for part in spec.split(","):
+        name, _, weight = part.partition("=")
+        name = name.strip()
+        if name not in ENDPOINT_PATHS:
+            raise ValueError(f"Unknown endpoint '{name}' in mix. Expected one of: {', '.join(ENDPOINT_PATHS)}.")
+        mix[name] = float(weight or 1)
+    return mix
+
+
+def encode_multipart(field_name, file_paths):
+    boundary = uuid.uuid4().hex
+    parts = []
+    for path in file_paths:
+        with open(path, "rb") as f:
+            content = f.read()
+        parts.append(
+            f"--{boundary}\r\nContent-Disposition: form-data; name=\"{field_name}\"; "
+            f"filename=\"{os.path.basename(path)}\"\r\nContent-Type: text/plain\r\n\r\n".encode("utf-8")
+            + content + b"\r\n"
+        )
+    parts.append(f"--{boundary}--\r\n".encode("utf-8"))
+    return b"".join(parts), f"multipart/form-data; boundary={boundary}"
+
+
+def ingest_request(corpus_paths):
+    body, content_type = encode_multipart("files", corpus_paths)
+    return LoadRequest("ingest_documents", ENDPOINT_PATHS["ingest_documents"], body, content_type)
+
+
+class RequestMix:
+    def __init__(self, question_set, weights, corpus_paths, seed=None):
+        self.weights = {name: weight for name, weight in weights.items() if weight > 0}
+        if not self.weights:
+            raise ValueError("Request mix has no endpoint with a positive weight.")
+        self.payloads = {name: question_set.get(name, []) for name in ENDPOINT_PATHS}
+        self.corpus_paths = corpus_paths
+        self._ingest = None
+        self._cursors = Counter()
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+
+    def next_request(self):
+        with self._lock:
+            endpoint = self._random.choices(list(self.weights), weights=list(self.weights.values()))[0]
+            cursor = self._cursors[endpoint]
+            self._cursors[endpoint] += 1
+        if endpoint == "ingest_documents":
+            if self._ingest is None:
+                self._ingest = ingest_request(self.corpus_paths)
+            return self._ingest
+        payloads = self.payloads[endpoint]
+        if not payloads:
+            raise ValueError(f"Question set has no payloads for endpoint '{endpoint}'.")
+        payload = payloads[cursor % len(payloads)]
+        return LoadRequest(endpoint, ENDPOINT_PATHS[endpoint], json.dumps(payload).encode("utf-8"))
+
+
+# Replays a JSONL capture written by RequestCaptureMiddleware (one object per line
+# with ts, path, content_type and body). Multipart uploads are captured without
+# their content, so they are replayed with the bundled corpus files.
+def load_replay_log(path, corpus_paths):
+    path_to_endpoint = {request_path: name for name, request_path in ENDPOINT_PATHS.items()}
+    requests, first_ts, ingest_template = [], None, None
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            if not line.strip():
+                continue
+            entry = json.loads(line)
+            endpoint = path_to_endpoint.get(entry.get("path"))
+            if endpoint is None:
+                continue
+            first_ts = entry["ts"] if first_ts is None else first_ts
+            if endpoint == "ingest_documents":
+                ingest_template = ingest_template or ingest_request(corpus_paths)
+                request = LoadRequest(endpoint, ingest_template.path, ingest_template.body, ingest_template.content_type)
+            else:
+                request = LoadRequest(endpoint, entry["path"], json.dumps(entry.get("body") or {}).encode("utf-8"))
+            request.offset = entry["ts"] - first_ts
+            requests.append(request)
+    return requests
+
+
+class ResultRecorder:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.samples = defaultdict(list)
+
+    def record(self, endpoint, latency, status, error=None):
+        with self._lock:
+            self.samples[endpoint].append((latency, status, error))
+
+
+def send_request(base_url, request, timeout):
+    http_request = urllib.request.Request(
+        base_url.rstrip("/") + request.path,
+        data=request.body,
+        headers={"Content-Type": request.content_type},
+        method="POST",
+    )
+    try:
+        with urllib.request.urlopen(http_request, timeout=timeout) as response:
+            response.read()
+            return response.status, None
+    except urllib.error.HTTPError as e:
+        e.read()
+        return e.code, f"HTTP {e.code}"
+    except Exception as e:
+        return 0, str(e)
+
+
+def _timed_send(base_url, request, timeout, recorder, scheduled_at):
+    status, error = send_request(base_url, request, timeout)
+    # Measured from the scheduled send time so client-side queueing is included.
+    recorder.record(request.endpoint, time.perf_counter() - scheduled_at, status, error)
+
+
+def run_closed_loop(base_url, mix, concurrency, duration=None, total_requests=None, timeout=120.0):
+    recorder = ResultRecorder()
+    deadline = time.perf_counter() + duration if duration else None
+    remaining = [total_requests] if total_requests else None
+    remaining_lock = threading.Lock()
+
+    def worker():
+        while True:
+            if deadline is not None and time.perf_counter() >= deadline:
+                return
+            if remaining is not None:
+                with remaining_lock:
+                    if remaining[0] <= 0:
+                        return
+                    remaining[0] -= 1
+            _timed_send(base_url, mix.next_request(), timeout, recorder, time.perf_counter())
+
+    started = time.perf_counter()
+    threads = [threading.Thread(target=worker, daemon=True) for _ in range(concurrency)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return recorder, time.perf_counter() - started
+
+
+def _dispatch(base_url, scheduled, timeout, max_inflight):
+    recorder = ResultRecorder()
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=max_inflight) as executor:
+        for offset, request in scheduled:
+            send_at = started + offset
+            delay = send_at - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+            executor.submit(_timed_send, base_url, request, timeout, recorder, send_at)
+    return recorder, time.perf_counter() - started
+
+
+def run_open_loop(base_url, mix, rate, duration=None, total_requests=None, poisson=False, timeout=120.0, max_inflight=256, seed=None):
+    rng = random.Random(seed)
+    scheduled, offset = [], 0.0
+    while True:
+        if total_requests is not None and len(scheduled) >= total_requests:
+            break
+        if duration is not None and offset >= duration:
+            break
+        scheduled.append((offset, mix.next_request()))
+        offset += rng.expovariate(rate) if poisson else 1.0 / rate
+    return _dispatch(base_url, scheduled, timeout, max_inflight)
+
+
+def run_replay(base_url, requests, speed=1.0, timeout=120.0, max_inflight=256):
+    scheduled = [(request.offset / speed, request) for request in requests]
+    return _dispatch(base_url, scheduled, timeout, max_inflight)
+
+
+def build_report(recorder, wall_seconds):
+    endpoints = {}
+    all_latencies, all_errors, total = [], 0, 0
+    for endpoint, samples in sorted(recorder.samples.items()):
+        latencies = [latency for latency, _, _ in samples]
+        statuses = Counter(status for _, status, _ in samples)
+        errors = sum(1 for _, status, _ in samples if status == 0 or status >= 400)
+        rejected = sum(statuses.get(status, 0) for status in REJECTION_STATUSES)
+        endpoints[endpoint] = {
+            "requests": len(samples),
+            "errors": errors,
+            "error_rate": errors / len(samples) if samples else 0.0,
+            "rejected": rejected,
+            "throughput_rps": len(samples) / wall_seconds if wall_seconds else None,
+            "latency_seconds": metrics.summarize(latencies),
+            "status_counts": {str(status): count for status, count in sorted(statuses.items())},
+            "sample_errors": sorted({error for _, _, error in samples if error})[:5],
+        }
+        all_latencies.extend(latencies)
+        all_errors += errors
+        total += len(samples)
+    return {
+        "wall_seconds": wall_seconds,
+        "overall": {
+            "requests": total,
+            "errors": all_errors,
+            "error_rate": all_errors / total if total else 0.0,
+            "throughput_rps": total / wall_seconds if wall_seconds else None,
+            "latency_seconds": metrics.summarize(all_latencies),
+        },
+        "endpoints": endpoints,
+    }
+
+
+def format_report(report):
+    lines = [f"{'endpoint':<18} {'reqs':>6} {'err%':>6} {'rej':>5} {'rps':>7} {'p50 s':>8} {'p95 s':>8} {'p99 s':>8}"]
+    rows = list(report["endpoints"].items()) + [("TOTAL", report["overall"])]
+    for name, row in rows:
+        latency = row["latency_seconds"]
+        if not latency.get("count"):
+            continue
+        lines.append(
+            f"{name:<18} {row['requests']:>6} {row['error_rate'] * 100:>5.1f}% {row.get('rejected', 0):>5} "
+            f"{row['throughput_rps'] or 0:>7.2f} {latency['p50']:>8.3f} {latency['p95']:>8.3f} {latency['p99']:>8.3f}"
+        )
+    lines.append(f"\nWall time: {report['wall_seconds']:.1f}s")
+    return "\n".join(lines)
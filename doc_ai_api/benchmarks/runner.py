@@ -0,0 +1,404 @@
+import json
+import logging
+import os
+import shutil
+import tempfile
+import time
+import tracemalloc
+
+from django.conf import settings
+from django.test import RequestFactory
+from django.test.utils import override_settings
+
+from .. import upload_handlers, views
+from ..core import metrics, models, question_bank, sections, web_search
+from ..rag_processing import graph as rag_graph_module
+from . import vector_stores
+
+logger = logging.getLogger(__name__)
+
+BENCHMARK_DIR = os.path.dirname(os.path.abspath(__file__))
+DEFAULT_QUESTION_SET = os.path.join(BENCHMARK_DIR, "questions.json")
+DEFAULT_WEB_CORPUS = os.path.join(BENCHMARK_DIR, "web_corpus.jsonl")
+
+ENDPOINT_VIEWS = {
+    "rag_chat": views.rag_chat,
+    "qgen": views.qgen_questions,
+    "summarize": views.summarize_content,
+}
+
+# Response "source" of the endpoints that can answer from precomputed data
+# instead of calling the LLM (see run_benchmark live_generation).
+LOOKUP_SOURCES = {
+    "qgen": "question_bank",
+    "summarize": "section_notes",
+}
+
+# Metrics compared against a baseline report: (path, direction). "lower" means a
+# larger value is a regression, "higher" means a smaller value is.
+GATED_METRICS = [
+    (("endpoints", "*", "latency_seconds", "p50"), "lower"),
+    (("endpoints", "*", "latency_seconds", "p95"), "lower"),
+    (("endpoints", "*", "llm_calls_per_request", "mean"), "lower"),
+    (("ingest", "chunks_per_second"), "higher"),
+]
+
+
+def load_question_set(path=None):
+    with open(path or DEFAULT_QUESTION_SET, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def _post(view, payload, request_factory):
+    request = request_factory.post("/api/", data=json.dumps(payload), content_type="application/json")
+    response = view(request)
+    try:
+        body = json.loads(response.content)
+    except ValueError:
+        body = {}
+    return response.status_code, body
+
+
+def _counter_delta(before, after, name):
+    return after.get(name, 0) - before.get(name, 0)
+
+
+# Lets background section summaries and question bank top-ups started by a
+# request finish before the next request, so they do not compete with it for
+# LLM slots. Returns the seconds spent waiting.
+def _wait_for_background_work():
+    started = time.perf_counter()
+    sections.wait_for_summaries()
+    question_bank.wait_for_build()
+    return time.perf_counter() - started
+
+
+def _run_ingest(corpus_paths):
+    total_bytes = sum(os.path.getsize(path) for path in corpus_paths)
+    before = metrics.counters()
+    started = time.perf_counter()
+    uploaded_files = [upload_handlers.hashed_file_from_path(path) for path in corpus_paths]
+    try:
+        views.ingest_documents_logic(uploaded_files)
+    finally:
+        for uploaded_file in uploaded_files:
+            uploaded_file.close()
+    elapsed = time.perf_counter() - started
+    chunks = _counter_delta(before, metrics.counters(), "ingest.chunks")
+    return {
+        "files": len(corpus_paths),
+        "bytes": total_bytes,
+        "chunks": chunks,
+        "seconds": elapsed,
+        "chunks_per_second": chunks / elapsed if elapsed else None,
+        "mb_per_second": (total_bytes / 1_000_000) / elapsed if elapsed else None,
+    }
+
+
+# With measure_memory, each request runs under tracemalloc: "peak_kb" is the
+# request's high-water mark above what was allocated before it started, and
+# "allocated_kb" the memory it still held when it returned (for the view, mostly
+# the response). Timing under tracemalloc is several times slower, so latency from
+# a memory run should not be compared with a normal run.
+#
+# LLM calls made at batch priority (background summaries and question bank
+# top-ups a request triggered) are counted as background calls, not against the
+# request. Requests answered from section notes or the question bank are also
+# summarized on their own ("lookup"), apart from the ones that ran the LLM.
+def _run_endpoint(name, payloads, iterations, request_factory, measure_memory=False):
+    view = ENDPOINT_VIEWS[name]
+    latencies, llm_calls, background_llm_calls, retrieval_seconds = [], [], [], []
+    query_rewrites, critique_retries = [], []
+    lookup_latencies, live_latencies = [], []
+    peak_kb, allocated_kb = [], []
+    errors = 0
+    lookup_source = LOOKUP_SOURCES.get(name)
+    for _ in range(iterations):
+        for payload in payloads:
+            before = metrics.counters()
+            retrieval_mark = len(metrics.timings("retrieval"))
+            if measure_memory:
+                tracemalloc.reset_peak()
+                baseline_bytes = tracemalloc.get_traced_memory()[0]
+            started = time.perf_counter()
+            status, body = _post(view, payload, request_factory)
+            latency = time.perf_counter() - started
+            latencies.append(latency)
+            if measure_memory:
+                current_bytes, peak_bytes = tracemalloc.get_traced_memory()
+                peak_kb.append((peak_bytes - baseline_bytes) / 1024)
+                allocated_kb.append((current_bytes - baseline_bytes) / 1024)
+            _wait_for_background_work()
+            after = metrics.counters()
+            background_calls = _counter_delta(before, after, "llm.priority.batch.calls")
+            background_llm_calls.append(background_calls)
+            llm_calls.append(_counter_delta(before, after, "llm.calls") - background_calls)
+            if lookup_source is not None:
+                (lookup_latencies if body.get("source") == lookup_source else live_latencies).append(latency)
+            query_rewrites.append(_counter_delta(before, after, "rag.query_rewrites"))
+            critique_retries.append(_counter_delta(before, after, "rag.retry.attempts"))
+            retrieval_seconds.append(sum(metrics.timings("retrieval")[retrieval_mark:]))
+            if status != 200 or body.get("status") != "success":
+                errors += 1
+                logger.error("%s request failed (%s): %s", name, status, body.get('message'))
+    report = {
+        "requests": len(latencies),
+        "errors": errors,
+        "latency_seconds": metrics.summarize(latencies),
+        "llm_calls_per_request": metrics.summarize(llm_calls),
+        "background_llm_calls_per_request": metrics.summarize(background_llm_calls),
+        "retrieval_seconds_per_request": metrics.summarize(retrieval_seconds),
+        "loops_per_request": {
+            "query_rewrites": metrics.summarize(query_rewrites),
+            "critique_retries": metrics.summarize(critique_retries),
+        },
+    }
+    if lookup_source is not None:
+        report["lookup"] = {
+            "source": lookup_source,
+            "requests": len(lookup_latencies),
+            "latency_seconds": metrics.summarize(lookup_latencies),
+            "live_latency_seconds": metrics.summarize(live_latencies),
+        }
+    if measure_memory:
+        report["memory_kb_per_request"] = {
+            "peak": metrics.summarize(peak_kb),
+            "retained": metrics.summarize(allocated_kb),
+        }
+    return report
+
+
+def run_benchmark(
+    question_set_path=None,
+    iterations=1,
+    llm_latency_ms=0.0,
+    llm_ms_per_token=0.0,
+    embedding_latency_ms=0.0,
+    endpoints=None,
+    vector_store_backend=None,
+    compare_vector_stores=False,
+    vector_store_scale=1,
+    measure_memory=False,
+    quantization_recall=False,
+    live_generation=False,
+):
+    question_set = load_question_set(question_set_path)
+    corpus_paths = [
+        path if os.path.isabs(path) else os.path.join(settings.BASE_DIR, path)
+        for path in question_set["corpus"]
+    ]
+    endpoints = endpoints or list(ENDPOINT_VIEWS)
+
+    workdir = tempfile.mkdtemp(prefix="doc_ai_benchmark_")
+    overrides = {
+        "LLM_BACKEND": "stub",
+        "EMBEDDING_BACKEND": "stub",
+        "STUB_LLM_LATENCY_MS": llm_latency_ms,
+        "STUB_LLM_MS_PER_TOKEN": llm_ms_per_token,
+        "STUB_EMBEDDING_LATENCY_MS": embedding_latency_ms,
+        "MODEL_WARMUP_CALLS": False,
+        "WEB_SEARCH_BACKEND": "local",
+        "WEB_SEARCH_LOCAL_CORPUS": DEFAULT_WEB_CORPUS,
+        "CHROMA_DB_DIR_RAG": os.path.join(workdir, "chroma_db_multi_app"),
+        "MMAP_INDEX_DIR_RAG": os.path.join(workdir, "vector_index_rag"),
+        "RAG_INDEX_ROOT": os.path.join(workdir, "rag_index"),
+        "TRACE_LOG_PATH": os.path.join(workdir, "traces.jsonl"),
+        "VECTOR_STORE_BACKEND": vector_store_backend or settings.VECTOR_STORE_BACKEND,
+        "PDF_TEMP_DIR": os.path.join(workdir, "pdf_temp_files"),
+        "MEDIA_ROOT": os.path.join(workdir, "media"),
+    }
+    if live_generation:
+        # Every qgen and summarize request runs the LLM pipeline instead of a lookup.
+        overrides.update({"SECTION_SUMMARIES": False, "QUESTION_BANK": False})
+
+    try:
+        with override_settings(**overrides):
+            web_search.reset_web_search_service()
+            if not models.initialize_core_models_and_chains():
+                raise RuntimeError("Stub models failed to initialize.")
+            if not rag_graph_module.compile_rag_workflow():
+                raise RuntimeError("RAG workflow failed to compile.")
+            metrics.reset()
+
+            ingest_report = _run_ingest(corpus_paths)
+            # Endpoints are measured once background section summaries and the
+            # question bank are done.
+            started = time.perf_counter()
+            sections.wait_for_summaries()
+            ingest_report["section_summaries_seconds"] = time.perf_counter() - started
+            started = time.perf_counter()
+            question_bank.wait_for_build()
+            ingest_report["question_bank_seconds"] = time.perf_counter() - started
+
+            request_factory = RequestFactory()
+            endpoint_reports = {}
+            if measure_memory:
+                tracemalloc.start()
+            try:
+                for name in endpoints:
+                    endpoint_reports[name] = _run_endpoint(
+                        name, question_set.get(name, []), iterations, request_factory, measure_memory=measure_memory
+                    )
+            finally:
+                if measure_memory:
+                    tracemalloc.stop()
+
+            snapshot = metrics.snapshot()
+
+            vector_store_report = None
+            if compare_vector_stores:
+                vector_store_report = vector_stores.compare_vector_stores(
+                    corpus_paths,
+                    [payload["question"] for payload in question_set.get("rag_chat", [])],
+                    models.embeddings,
+                    workdir,
+                    scale=vector_store_scale,
+                )
+
+            recall_report = None
+            if quantization_recall:
+                recall_report = vector_stores.quantization_recall(
+                    vector_stores.sample_pdf_paths(),
+                    [payload["question"] for payload in question_set.get("rag_chat", [])],
+                    models.embeddings,
+                    os.path.join(workdir, "quantization_recall"),
+                )
+    finally:
+        web_search.reset_web_search_service()
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    return {
+        "generated_at": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+        "config": {
+            "question_set": question_set_path or DEFAULT_QUESTION_SET,
+            "iterations": iterations,
+            "llm_latency_ms": llm_latency_ms,
+            "llm_ms_per_token": llm_ms_per_token,
+            "embedding_latency_ms": embedding_latency_ms,
+            "vector_store_backend": overrides["VECTOR_STORE_BACKEND"],
+            "measure_memory": measure_memory,
+            "live_generation": live_generation,
+        },
+        "ingest": ingest_report,
+        "endpoints": endpoint_reports,
+        "nodes": {
+            name[len("node."):]: summary
+            for name, summary in snapshot["timings"].items()
+            if name.startswith("node.")
+        },
+        "llm_scheduler": {
+            name[len("llm."):]: summary
+            for name, summary in snapshot["timings"].items()
+            if name.startswith(("llm.queue_wait_seconds.", "llm.generation_seconds."))
+        },
+        "retrieval_k": {
+            name[len("retrieval.k."):]: summary
+            for name, summary in snapshot["timings"].items()
+            if name.startswith("retrieval.k.")
+        },
+        "counters": snapshot["counters"],
+        "vector_stores": vector_store_report,
+        "quantization_recall": recall_report,
+    }
+
+
+def _lookup(report, path):
+    value = report
+    for key in path:
+        if not isinstance(value, dict) or key not in value:
+            return None
+        value = value[key]
+    return value
+
+
+def _expand_paths(report, path):
+    if "*" not in path:
+        return [path]
+    idx = path.index("*")
+    container = _lookup(report, path[:idx]) or {}
+    expanded = []
+    for key in container:
+        expanded.extend(_expand_paths(report, path[:idx] + (key,) + path[idx + 1:]))
+    return expanded
+
+
+def compare_to_baseline(report, baseline, max_regression):
+    regressions = []
+    for pattern, direction in GATED_METRICS:
+        for path in _expand_paths(baseline, pattern):
+            base_value = _lookup(baseline, path)
+            current_value = _lookup(report, path)
+            if not isinstance(base_value, (int, float)) or not isinstance(current_value, (int, float)):
+                continue
+            if direction == "lower":
+                limit = base_value * (1 + max_regression)
+                regressed = current_value > limit and current_value - base_value > 1e-6
+            else:
+                limit = base_value * (1 - max_regression)
+                regressed = current_value < limit
+            if regressed:
+                regressions.append({
+                    "metric": ".".join(path),
+                    "baseline": base_value,
+                    "current": current_value,
+                    "limit": limit,
+                })
+    return regressions
+
+
+def format_report(report):
+    lines = []
+    ingest = report["ingest"]
+    lines.append(
+        f"Ingest: {ingest['files']} files, {ingest['chunks']} chunks in {ingest['seconds']:.3f}s "
+        f"({ingest['chunks_per_second'] or 0:.1f} chunks/s, {ingest['mb_per_second'] or 0:.2f} MB/s)"
+    )
+    lines.append("")
+    lines.append(f"{'endpoint':<12} {'reqs':>5} {'errs':>5} {'p50 s':>8} {'p95 s':>8} {'p99 s':>8} {'llm/req':>8} {'retr s':>8} {'rewr/req':>8} {'retry/req':>9}")
+    for name, endpoint in report["endpoints"].items():
+        latency = endpoint["latency_seconds"]
+        if not latency.get("count"):
+            continue
+        lines.append(
+            f"{name:<12} {endpoint['requests']:>5} {endpoint['errors']:>5} {latency['p50']:>8.3f} {latency['p95']:>8.3f} "
+            f"{latency['p99']:>8.3f} {endpoint['llm_calls_per_request']['mean']:>8.2f} "
+            f"{endpoint['retrieval_seconds_per_request']['mean']:>8.4f} "
+            f"{endpoint['loops_per_request']['query_rewrites']['mean']:>8.2f} "
+            f"{endpoint['loops_per_request']['critique_retries']['mean']:>9.2f}"
+        )
+    lookup_rows = [(name, endpoint["lookup"]) for name, endpoint in report["endpoints"].items()
+                   if endpoint.get("lookup") and endpoint["requests"]]
+    if lookup_rows:
+        lines.append("")
+        lines.append(f"{'lookup path':<12} {'source':<14} {'reqs':>5} {'p50 s':>8} {'live reqs':>9} {'live p50 s':>10} {'bg llm/req':>10}")
+        for name, lookup in lookup_rows:
+            live = lookup["live_latency_seconds"]
+            lines.append(
+                f"{name:<12} {lookup['source']:<14} {lookup['requests']:>5} {lookup['latency_seconds'].get('p50', 0):>8.3f} "
+                f"{live.get('count', 0):>9} {live.get('p50', 0):>10.3f} "
+                f"{report['endpoints'][name]['background_llm_calls_per_request']['mean']:>10.2f}"
+            )
+    memory_rows = [(name, endpoint["memory_kb_per_request"]) for name, endpoint in report["endpoints"].items()
+                   if endpoint.get("memory_kb_per_request")]
+    if memory_rows:
+        lines.append("")
+        lines.append(f"{'memory (KB/req)':<16} {'peak p50':>9} {'peak p95':>9} {'retained':>9}")
+        for name, memory in memory_rows:
+            lines.append(
+                f"{name:<16} {memory['peak']['p50']:>9.1f} {memory['peak']['p95']:>9.1f} {memory['retained']['mean']:>9.1f}"
+            )
+    lines.append("")
+    lines.append(f"{'node':<20} {'count':>6} {'mean s':>8} {'p95 s':>8}")
+    for name, summary in sorted(report["nodes"].items()):
+        lines.append(f"{name:<20} {summary['count']:>6} {summary['mean']:>8.3f} {summary['p95']:>8.3f}")
+    if report.get("vector_stores"):
+        lines.append("")
+        lines.append(vector_stores.format_comparison(report["vector_stores"]))
+    recall = report.get("quantization_recall")
+    if recall:
+        lines.append("")
+        lines.append(
+            f"Quantization recall@{recall['k']} vs float32 ({recall['chunks']} chunks from the sample PDFs, "
+            f"{recall['queries']} queries): int8 {recall['mmap-int8']:.3f}, binary {recall['mmap-binary']:.3f}"
+        )
+    return "\n".join(lines)
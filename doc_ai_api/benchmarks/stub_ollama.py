@@ -0,0 +1,149 @@
+import json
+import threading
+import time
+from datetime import datetime, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from ..core.stubs import StubEmbeddings, approximate_tokens, stub_completion
+
+
+# Minimal Ollama-compatible HTTP server (/api/chat, /api/generate, /api/embed,
+# /api/embeddings, /api/tags) answering with the deterministic stub model. A
+# semaphore of `parallel` slots emulates OLLAMA_NUM_PARALLEL so load tests show
+# queueing once the single backend saturates.
+class StubOllamaServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, address, model_name="stub", latency_ms=0.0, ms_per_token=0.0, parallel=1):
+        super().__init__(address, StubOllamaHandler)
+        self.model_name = model_name
+        self.latency_ms = latency_ms
+        self.ms_per_token = ms_per_token
+        self.slots = threading.BoundedSemaphore(max(1, parallel))
+        self.embeddings = StubEmbeddings()
+        self.stats_lock = threading.Lock()
+        self.stats = {"requests": 0, "busy_seconds": 0.0, "queue_seconds": 0.0}
+
+    def generate(self, prompt, options):
+        text = stub_completion(prompt)
+        for token in (options or {}).get("stop") or []:
+            if token and token in text:
+                text = text[: text.index(token)]
+        num_predict = (options or {}).get("num_predict")
+        if num_predict and num_predict > 0:
+            text = text[: num_predict * 4]
+
+        queued_at = time.perf_counter()
+        with self.slots:
+            started = time.perf_counter()
+            delay_ms = self.latency_ms + self.ms_per_token * approximate_tokens(text)
+            if delay_ms > 0:
+                time.sleep(delay_ms / 1000.0)
+            finished = time.perf_counter()
+
+        with self.stats_lock:
+            self.stats["requests"] += 1
+            self.stats["queue_seconds"] += started - queued_at
+            self.stats["busy_seconds"] += finished - started
+        return text, {
+            "total_duration": int((finished - queued_at) * 1e9),
+            "load_duration": 0,
+            "prompt_eval_count": approximate_tokens(prompt),
+            "prompt_eval_duration": 0,
+            "eval_count": approximate_tokens(text),
+            "eval_duration": int((finished - started) * 1e9),
+        }
+
+
+class StubOllamaHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send_json(self, payload, status=200):
+        body = json.dumps(payload).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _send_ndjson(self, lines):
+        body = b"".join(json.dumps(line).encode("utf-8") + b"\n" for line in lines)
+        self.send_response(200)
+        self.send_header("Content-Type", "application/x-ndjson")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _read_json(self):
+        length = int(self.headers.get("Content-Length") or 0)
+        return json.loads(self.rfile.read(length) or b"{}")
+
+    def do_HEAD(self):
+        self.send_response(200)
+        self.send_header("Content-Length", "0")
+        self.end_headers()
+
+    def do_GET(self):
+        if self.path == "/":
+            body = b"Ollama is running"
+            self.send_response(200)
+            self.send_header("Content-Type", "text/plain")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+        elif self.path == "/api/tags":
+            self._send_json({"models": [{"name": self.server.model_name, "model": self.server.model_name}]})
+        elif self.path == "/api/stats":
+            with self.server.stats_lock:
+                self._send_json(dict(self.server.stats))
+        else:
+            self._send_json({"error": "not found"}, status=404)
+
+    def do_POST(self):
+        try:
+            payload = self._read_json()
+        except ValueError:
+            self._send_json({"error": "invalid JSON"}, status=400)
+            return
+
+        created_at = datetime.now(timezone.utc).isoformat()
+        model = payload.get("model") or self.server.model_name
+
+        if self.path == "/api/chat":
+            prompt = "\n".join(str(message.get("content", "")) for message in payload.get("messages", []))
+            text, timings = self.server.generate(prompt, payload.get("options"))
+            final = {"model": model, "created_at": created_at, "message": {"role": "assistant", "content": text},
+                     "done": True, "done_reason": "stop", **timings}
+            if payload.get("stream", True):
+                first = {"model": model, "created_at": created_at, "message": {"role": "assistant", "content": text}, "done": False}
+                final["message"] = {"role": "assistant", "content": ""}
+                self._send_ndjson([first, final])
+            else:
+                self._send_json(final)
+        elif self.path == "/api/generate":
+            text, timings = self.server.generate(payload.get("prompt", ""), payload.get("options"))
+            final = {"model": model, "created_at": created_at, "response": text, "done": True, "done_reason": "stop", **timings}
+            if payload.get("stream", True):
+                self._send_ndjson([{"model": model, "created_at": created_at, "response": text, "done": False},
+                                   {**final, "response": ""}])
+            else:
+                self._send_json(final)
+        elif self.path == "/api/embed":
+            texts = payload.get("input", [])
+            if isinstance(texts, str):
+                texts = [texts]
+            self._send_json({"model": model, "embeddings": self.server.embeddings.embed_documents(texts)})
+        elif self.path == "/api/embeddings":
+            self._send_json({"embedding": self.server.embeddings.embed_query(payload.get("prompt", ""))})
+        else:
+            self._send_json({"error": "not found"}, status=404)
+
+
+def start_stub_ollama(host="127.0.0.1", port=11435, **kwargs):
+    server = StubOllamaServer((host, port), **kwargs)
+    thread = threading.Thread(target=server.serve_forever, name="stub-ollama", daemon=True)
+    thread.start()
+    return server
@@ -0,0 +1,182 @@
+import gc
+import os
+import time
+
+from django.conf import settings
+
+from .. import views
+from ..core import metrics, utils, vectorstores
+
+
+ADD_BATCH_SIZE = 1000
+# The sample chapters shipped as PDFs, for measuring recall on the real corpus.
+SAMPLE_PDFS = ["pdf_temp_files/a.pdf", "pdf_temp_files/dgt.pdf"]
+
+
+def _directory_bytes(directory):
+    total = 0
+    for root, _, files in os.walk(directory):
+        for name in files:
+            total += os.path.getsize(os.path.join(root, name))
+    return total
+
+
+def _drop_chroma_client_cache():
+    # Chroma keeps one client per persist directory for the life of the process;
+    # clearing it makes the reopen below pay the same cost as a fresh worker.
+    try:
+        from chromadb.api.client import SharedSystemClient
+
+        SharedSystemClient.clear_system_cache()
+    except Exception:
+        pass
+
+
+def sample_pdf_paths():
+    return [os.path.join(settings.BASE_DIR, path) for path in SAMPLE_PDFS]
+
+
+def _read_corpus_file(path):
+    if path.lower().endswith(".pdf"):
+        return utils.extract_pdf_text(path)
+    with open(path, "r", encoding="utf-8") as f:
+        return f.read()
+
+
+def load_corpus_chunks(corpus_paths, scale=1):
+    chunks = []
+    for path in corpus_paths:
+        chunks.extend(views.chunk_document(_read_corpus_file(path), os.path.basename(path)))
+    texts = [chunk.page_content for chunk in chunks]
+    metadatas = [chunk.metadata for chunk in chunks]
+    # Larger synthetic corpora repeat the chunks with a copy marker so every row embeds differently.
+    for copy in range(1, scale):
+        texts.extend(f"{chunk.page_content} [copy {copy}]" for chunk in chunks)
+        metadatas.extend({**chunk.metadata, "copy": copy} for chunk in chunks)
+    return texts, metadatas
+
+
+# (report name, backend, quantization). Quantized variants reuse the exact mmap
+# index directory; their "build" time is deriving the codes on first open.
+VARIANTS = [
+    ("chroma", "chroma", None),
+    ("mmap", "mmap", "none"),
+    ("mmap-int8", "mmap", "int8"),
+    ("mmap-binary", "mmap", "binary"),
+]
+REFERENCE_VARIANT = "mmap"
+
+
+def _result_key(document):
+    # Copies made by --vector-store-scale are near-duplicates; any copy of the
+    # right chunk counts as a hit.
+    metadata = document.metadata or {}
+    return metadata.get("source"), metadata.get("start_index")
+
+
+def _benchmark_variant(backend, quantization, directory, embedding_function, texts, metadatas, query_vectors, k, repeats, build):
+    started = time.perf_counter()
+    store = vectorstores.open_vector_store(directory, backend, embedding_function=embedding_function, quantization=quantization)
+    if build:
+        for offset in range(0, len(texts), ADD_BATCH_SIZE):
+            store.add_texts(texts[offset:offset + ADD_BATCH_SIZE], metadatas=metadatas[offset:offset + ADD_BATCH_SIZE])
+    build_seconds = time.perf_counter() - started
+
+    del store
+    gc.collect()
+    if backend == "chroma":
+        _drop_chroma_client_cache()
+
+    started = time.perf_counter()
+    store = vectorstores.open_vector_store(directory, backend, embedding_function=embedding_function, quantization=quantization)
+    store.similarity_search_by_vector(query_vectors[0], k=k)
+    open_seconds = time.perf_counter() - started
+
+    latencies, results = [], []
+    for repeat in range(repeats):
+        for vector in query_vectors:
+            started = time.perf_counter()
+            documents = store.similarity_search_by_vector(vector, k=k)
+            latencies.append(time.perf_counter() - started)
+            if repeat == 0:
+                results.append([_result_key(document) for document in documents])
+
+    report = {
+        "chunks": len(texts),
+        "build_seconds": build_seconds,
+        "open_and_first_query_seconds": open_seconds,
+        "query_latency_seconds": metrics.summarize(latencies),
+        "disk_bytes": _directory_bytes(directory),
+        "index_memory_bytes": store.index_memory_bytes() if hasattr(store, "index_memory_bytes") else None,
+    }
+    return report, results
+
+
+def _recall_at_k(results, reference):
+    hits = sum(len(set(found) & set(expected)) for found, expected in zip(results, reference))
+    total = sum(len(set(expected)) for expected in reference)
+    return hits / total if total else None
+
+
+# Queries for recall measurements: the given questions plus the opening of every
+# n-th chunk, so each query has near neighbours in the corpus.
+def recall_queries(questions, texts, samples=40):
+    step = max(1, len(texts) // samples) if samples else len(texts) + 1
+    return list(questions) + [text[:200] for text in texts[::step][:samples]]
+
+
+# recall@k of the int8 and binary mmap variants against the exact float32 mmap
+# index, built once from corpus_paths in directory.
+def quantization_recall(corpus_paths, questions, embedding_function, directory, k=vectorstores.RETRIEVER_K, samples=40):
+    texts, metadatas = load_corpus_chunks(corpus_paths)
+    query_vectors = embedding_function.embed_documents(recall_queries(questions, texts, samples))
+    results = {}
+    for name, backend, quantization in VARIANTS:
+        if backend != "mmap":
+            continue
+        store = vectorstores.open_vector_store(directory, backend, embedding_function=embedding_function, quantization=quantization)
+        if not len(store):
+            for offset in range(0, len(texts), ADD_BATCH_SIZE):
+                store.add_texts(texts[offset:offset + ADD_BATCH_SIZE], metadatas=metadatas[offset:offset + ADD_BATCH_SIZE])
+        results[name] = [[_result_key(document) for document in store.similarity_search_by_vector(vector, k=k)]
+                         for vector in query_vectors]
+    report = {"chunks": len(texts), "queries": len(query_vectors), "k": k}
+    report.update({name: _recall_at_k(found, results[REFERENCE_VARIANT]) for name, found in results.items()
+                   if name != REFERENCE_VARIANT})
+    return report
+
+
+# Builds the same corpus into each backend and measures build time, cold open
+# (open + first query), top-k query latency, index memory and recall@k against
+# the exact mmap index. Query vectors are computed once up front so only the
+# index is timed, not the embedding model.
+def compare_vector_stores(corpus_paths, questions, embedding_function, workdir, scale=1, k=vectorstores.RETRIEVER_K, repeats=5):
+    texts, metadatas = load_corpus_chunks(corpus_paths, scale)
+    query_vectors = embedding_function.embed_documents(questions)
+    reports, results, built = {}, {}, set()
+    for name, backend, quantization in VARIANTS:
+        directory = os.path.join(workdir, f"vector_store_{backend}")
+        reports[name], results[name] = _benchmark_variant(
+            backend, quantization, directory, embedding_function, texts, metadatas, query_vectors, k, repeats,
+            build=directory not in built,
+        )
+        built.add(directory)
+    for name in reports:
+        reports[name]["recall_at_k"] = _recall_at_k(results[name], results[REFERENCE_VARIANT])
+    return reports
+
+
+def format_comparison(results):
+    lines = [
+        f"{'vector store':<14} {'chunks':>7} {'build s':>8} {'open s':>8} {'q p50 ms':>9} {'q p95 ms':>9} "
+        f"{'index MB':>9} {'disk MB':>8} {'recall':>7}"
+    ]
+    for name, row in results.items():
+        latency = row["query_latency_seconds"]
+        index_mb = f"{row['index_memory_bytes'] / 1e6:>9.2f}" if row.get("index_memory_bytes") is not None else f"{'-':>9}"
+        lines.append(
+            f"{name:<14} {row['chunks']:>7} {row['build_seconds']:>8.3f} {row['open_and_first_query_seconds']:>8.3f} "
+            f"{latency['p50'] * 1000:>9.3f} {latency['p95'] * 1000:>9.3f} {index_mb} {row['disk_bytes'] / 1e6:>8.2f} "
+            f"{row['recall_at_k'] or 0:>7.3f}"
+        )
+    return "\n".join(lines)
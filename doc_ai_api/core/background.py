@@ -0,0 +1,44 @@
+import logging
+import threading
+
+logger = logging.getLogger(__name__)
+
+
+# A background job that runs on at most one daemon thread at a time. Scheduling
+# it while it runs makes it run once more afterwards, so work requested during a
+# run is never lost and bursts of requests collapse into one extra run.
+class RearmingWorker:
+    def __init__(self, name, target):
+        self.name = name
+        self.target = target
+        self._running = threading.Lock()
+        self._pending = threading.Event()
+
+    def _run(self):
+        while True:
+            try:
+                while self._pending.is_set():
+                    self._pending.clear()
+                    self.target()
+            except Exception as e:
+                logger.warning("Background job %s failed: %s", self.name, e)
+            finally:
+                self._running.release()
+            # A request that arrived while the thread was finishing is picked up here.
+            if not self._pending.is_set() or not self._running.acquire(blocking=False):
+                return
+
+    def schedule(self):
+        self._pending.set()
+        if not self._running.acquire(blocking=False):
+            return None
+        thread = threading.Thread(target=self._run, name=self.name, daemon=True)
+        thread.start()
+        return thread
+
+    # Blocks until the job is idle; returns False if timeout expired first.
+    def wait(self, timeout=None):
+        if not self._running.acquire(timeout=-1 if timeout is None else timeout):
+            return False
+        self._running.release()
+        return True
@@ -0,0 +1,225 @@
+import logging
+import math
+import threading
+
+from django.conf import settings as config
+
+from . import metrics
+
+logger = logging.getLogger(__name__)
+
+CONTEXT_SEPARATOR = "\n\n---\n\n"
+# Shortest suffix/prefix match treated as chunk overlap when offsets are unknown.
+MIN_TEXT_OVERLAP = 20
+# Chunks whose offsets are at most this many characters apart (stripped whitespace) are adjacent.
+ADJACENT_GAP = 2
+
+_token_counter = None
+_token_counter_lock = threading.Lock()
+
+
+def _heuristic_token_count(text):
+    # Llama-3 style BPE averages roughly four characters per token on English prose.
+    return math.ceil(len(text) / 4) if text else 0
+
+
+def get_token_counter():
+    global _token_counter
+    if _token_counter is not None:
+        return _token_counter
+    with _token_counter_lock:
+        if _token_counter is None:
+            tokenizer_name = config.CONTEXT_TOKENIZER
+            counter = _heuristic_token_count
+            if tokenizer_name:
+                try:
+                    from transformers import AutoTokenizer
+
+                    tokenizer = AutoTokenizer.from_pretrained(tokenizer_name)
+                    counter = lambda text: len(tokenizer.encode(text, add_special_tokens=False)) if text else 0
+                    logger.info("Using '%s' tokenizer for token budgets.", tokenizer_name)
+                except Exception as e:
+                    logger.warning("Could not load tokenizer '%s': %s. Using character estimate.", tokenizer_name, e)
+            _token_counter = counter
+    return _token_counter
+
+
+def count_tokens(text):
+    return get_token_counter()(text)
+
+
+def token_budget(budget_key):
+    return config.CONTEXT_TOKEN_BUDGETS.get(budget_key, config.CONTEXT_TOKEN_BUDGETS["default"])
+
+
+class PackedChunk:
+    def __init__(self, text, rank, source=None, start=None):
+        self.text = text
+        self.rank = rank
+        self.source = source
+        self.start = start
+
+    @property
+    def text(self):
+        return self._text
+
+    @text.setter
+    def text(self, value):
+        self._text = value
+        self._tokens = None
+
+    # Counted once per merged chunk, however many budgets it is packed for.
+    @property
+    def tokens(self):
+        if self._tokens is None:
+            self._tokens = count_tokens(self._text)
+        return self._tokens
+
+    @property
+    def end(self):
+        return None if self.start is None else self.start + len(self.text)
+
+
+def _as_chunk(item, rank):
+    if isinstance(item, str):
+        return PackedChunk(item.strip(), rank)
+    metadata = getattr(item, "metadata", None) or {}
+    start = metadata.get("start_index")
+    return PackedChunk(
+        item.page_content.strip(),
+        rank,
+        source=metadata.get("source"),
+        start=start if isinstance(start, int) and start >= 0 else None,
+    )
+
+
+def _text_overlap(left, right):
+    # Length of the longest suffix of `left` that is a prefix of `right`.
+    probe = right[:MIN_TEXT_OVERLAP]
+    if len(probe) < MIN_TEXT_OVERLAP:
+        return 0
+    search_from = max(0, len(left) - len(right))
+    pos = left.find(probe, search_from)
+    while pos != -1:
+        if right.startswith(left[pos:]):
+            return len(left) - pos
+        pos = left.find(probe, pos + 1)
+    return 0
+
+
+def _merge_by_offsets(chunks):
+    chunks = sorted(chunks, key=lambda chunk: chunk.start)
+    merged = [chunks[0]]
+    for chunk in chunks[1:]:
+        current = merged[-1]
+        if chunk.start <= current.end + ADJACENT_GAP:
+            overlap = current.end - chunk.start
+            if overlap >= len(chunk.text):
+                current.rank = min(current.rank, chunk.rank)
+                continue
+            joiner = "" if overlap >= 0 else "\n"
+            current.text = current.text + joiner + chunk.text[max(overlap, 0):]
+            current.rank = min(current.rank, chunk.rank)
+        else:
+            merged.append(chunk)
+    return merged
+
+
+def _merge_by_text(chunks):
+    merged = list(chunks)
+    changed = True
+    while changed:
+        changed = False
+        for i, left in enumerate(merged):
+            for j, right in enumerate(merged):
+                if i == j:
+                    continue
+                if right.text in left.text:
+                    left.rank = min(left.rank, right.rank)
+                    del merged[j]
+                    changed = True
+                    break
+                overlap = _text_overlap(left.text, right.text)
+                if overlap:
+                    left.text = left.text + right.text[overlap:]
+                    left.rank = min(left.rank, right.rank)
+                    del merged[j]
+                    changed = True
+                    break
+            if changed:
+                break
+    return merged
+
+
+def merge_chunks(chunks):
+    by_source = {}
+    for chunk in chunks:
+        by_source.setdefault(chunk.source, []).append(chunk)
+
+    merged = []
+    for source, group in by_source.items():
+        with_offsets = [chunk for chunk in group if chunk.start is not None]
+        without_offsets = [chunk for chunk in group if chunk.start is None]
+        if with_offsets:
+            merged.extend(_merge_by_offsets(with_offsets))
+        if without_offsets:
+            merged.extend(_merge_by_text(without_offsets))
+    return sorted(merged, key=lambda chunk: chunk.rank)
+
+
+def _truncate_to_tokens(text, max_tokens):
+    if count_tokens(text) <= max_tokens:
+        return text
+    low, high = 0, len(text)
+    while low < high:
+        mid = (low + high + 1) // 2
+        if count_tokens(text[:mid]) <= max_tokens:
+            low = mid
+        else:
+            high = mid - 1
+    cut = text[:low]
+    return cut[: cut.rfind(" ")] if " " in cut else cut
+
+
+# Merges retrieved chunks (Documents or strings, most relevant first): overlapping
+# or adjacent chunks from the same source become one. The result does not depend
+# on the budget, so callers packing the same chunks for several budgets can merge
+# once and call pack_merged for each.
+def merge_items(items):
+    chunks = [_as_chunk(item, rank) for rank, item in enumerate(items or [])]
+    chunks = [chunk for chunk in chunks if chunk.text]
+    merged = merge_chunks(chunks)
+    metrics.incr("context.chunks_merged", len(chunks) - len(merged))
+    return merged
+
+
+# Adds merged chunks in relevance order while they fit the budget. The chunks are
+# only read, never modified.
+def pack_merged(merged, budget_key="default", max_tokens=None, separator=CONTEXT_SEPARATOR):
+    if not merged:
+        return ""
+    max_tokens = max_tokens if max_tokens is not None else token_budget(budget_key)
+
+    separator_tokens = count_tokens(separator)
+    packed, used_tokens, dropped = [], 0, 0
+    for chunk in merged:
+        cost = chunk.tokens + (separator_tokens if packed else 0)
+        if used_tokens + cost <= max_tokens:
+            packed.append(chunk.text)
+            used_tokens += cost
+        elif not packed:
+            packed.append(_truncate_to_tokens(chunk.text, max_tokens))
+            used_tokens = count_tokens(packed[0])
+        else:
+            dropped += 1
+
+    metrics.observe(f"context.tokens.{budget_key}", used_tokens)
+    metrics.incr("context.chunks_dropped", dropped)
+    return separator.join(packed)
+
+
+# Packs retrieved chunks into one context string within the budget_key budget.
+def pack_context(items, budget_key="default", max_tokens=None, separator=CONTEXT_SEPARATOR):
+    if not items:
+        return ""
+    return pack_merged(merge_items(items), budget_key, max_tokens=max_tokens, separator=separator)
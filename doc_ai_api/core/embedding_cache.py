@@ -0,0 +1,58 @@
+import threading
+from collections import OrderedDict
+
+from langchain_core.embeddings import Embeddings
+
+from . import metrics
+
+
+# Wraps the embedding model with an LRU cache of query vectors. Document
+# embedding (ingest) passes straight through; repeated or primed queries skip the
+# model entirely. `prime` embeds a batch of queries in one embed_documents call,
+# which is how the batch endpoint shares work across its questions.
+class CachedQueryEmbeddings(Embeddings):
+    def __init__(self, embeddings, max_entries=1024):
+        self.embeddings = embeddings
+        self.max_entries = max_entries
+        self._cache = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _get(self, text):
+        with self._lock:
+            vector = self._cache.get(text)
+            if vector is not None:
+                self._cache.move_to_end(text)
+            return vector
+
+    def _put(self, text, vector):
+        with self._lock:
+            self._cache[text] = vector
+            self._cache.move_to_end(text)
+            while len(self._cache) > self.max_entries:
+                self._cache.popitem(last=False)
+
+    def embed_documents(self, texts):
+        return self.embeddings.embed_documents(texts)
+
+    def embed_query(self, text):
+        vector = self._get(text)
+        if vector is not None:
+            metrics.incr("embedding.query_cache.hits")
+            return vector
+        metrics.incr("embedding.query_cache.misses")
+        vector = self.embeddings.embed_query(text)
+        self._put(text, vector)
+        return vector
+
+    def prime(self, texts):
+        missing = list(dict.fromkeys(text for text in texts if self._get(text) is None))
+        if not missing:
+            return 0
+        for text, vector in zip(missing, self.embeddings.embed_documents(missing)):
+            self._put(text, vector)
+        metrics.incr("embedding.query_cache.primed", len(missing))
+        return len(missing)
+
+    def clear(self):
+        with self._lock:
+            self._cache.clear()
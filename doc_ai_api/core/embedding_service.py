@@ -0,0 +1,239 @@
+import json
+import logging
+import os
+import socket
+import socketserver
+import struct
+import threading
+import time
+from concurrent.futures import Future
+
+import numpy as np
+from langchain_core.embeddings import Embeddings
+
+from . import metrics
+
+logger = logging.getLogger(__name__)
+
+
+# Shared embedding model for all worker processes on a host. `manage.py
+# embedding_server` loads the model once and serves it over a Unix socket; each
+# worker talks to it through RemoteEmbeddings instead of loading its own copy.
+#
+# Wire format (one persistent connection per client thread):
+#   request:  4-byte big-endian length + JSON {"texts": [...]}
+#   response: 4-byte big-endian length + JSON {"count", "dim"} or {"error"},
+#             followed by count * dim float32 values for a successful request.
+_LENGTH = struct.Struct(">I")
+
+
+def _send_message(sock, payload, body=b""):
+    data = json.dumps(payload).encode("utf-8")
+    sock.sendall(_LENGTH.pack(len(data)) + data + body)
+
+
+def _recv_exact(sock, size):
+    buffer = bytearray()
+    while len(buffer) < size:
+        chunk = sock.recv(min(size - len(buffer), 1024 * 1024))
+        if not chunk:
+            raise ConnectionError("Embedding service closed the connection.")
+        buffer.extend(chunk)
+    return bytes(buffer)
+
+
+def _recv_message(sock):
+    (size,) = _LENGTH.unpack(_recv_exact(sock, _LENGTH.size))
+    return json.loads(_recv_exact(sock, size))
+
+
+# Coalesces concurrent embedding requests into one model call. The first request
+# to arrive opens a window of max_wait_ms; everything queued before it closes (up
+# to max_batch_size texts) is embedded together and the vectors are split back
+# out per request. Queries are embedded with embed_documents so they can batch,
+# which gives the same vectors for HuggingFaceEmbeddings and the stub model.
+class MicroBatcher:
+    def __init__(self, embeddings, max_batch_size=64, max_wait_ms=5.0):
+        self.embeddings = embeddings
+        self.max_batch_size = max(1, max_batch_size)
+        self.max_wait = max(0.0, max_wait_ms) / 1000.0
+        self._pending = []
+        self._condition = threading.Condition()
+        self._closed = False
+        self._thread = threading.Thread(target=self._run, name="embedding-batcher", daemon=True)
+        self._thread.start()
+
+    def submit(self, texts):
+        future = Future()
+        with self._condition:
+            if self._closed:
+                raise RuntimeError("MicroBatcher is closed.")
+            self._pending.append((list(texts), future))
+            self._condition.notify()
+        return future
+
+    def embed(self, texts):
+        return self.submit(texts).result()
+
+    def close(self):
+        with self._condition:
+            self._closed = True
+            self._condition.notify()
+        self._thread.join(timeout=5)
+
+    def _take_batch(self):
+        with self._condition:
+            while not self._pending and not self._closed:
+                self._condition.wait()
+            if not self._pending:
+                return []
+            deadline = time.monotonic() + self.max_wait
+            while not self._closed:
+                if sum(len(texts) for texts, _ in self._pending) >= self.max_batch_size:
+                    break
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                self._condition.wait(remaining)
+            # Always take at least one request; an oversized request runs on its own.
+            batch, size = [], 0
+            while self._pending and (not batch or size + len(self._pending[0][0]) <= self.max_batch_size):
+                texts, future = self._pending.pop(0)
+                batch.append((texts, future))
+                size += len(texts)
+            return batch
+
+    def _run(self):
+        while True:
+            batch = self._take_batch()
+            if not batch:
+                return
+            texts = [text for request_texts, _ in batch for text in request_texts]
+            metrics.incr("embedding.service.batches")
+            metrics.observe("embedding.service.batch_size", len(texts))
+            metrics.observe("embedding.service.batch_requests", len(batch))
+            try:
+                with metrics.timer("embedding.service.model_seconds"):
+                    vectors = np.asarray(self.embeddings.embed_documents(texts), dtype=np.float32) if texts else None
+            except Exception as e:
+                for _, future in batch:
+                    future.set_exception(e)
+                continue
+            offset = 0
+            for request_texts, future in batch:
+                future.set_result(vectors[offset:offset + len(request_texts)] if vectors is not None else np.zeros((0, 0), np.float32))
+                offset += len(request_texts)
+
+
+class _EmbeddingRequestHandler(socketserver.BaseRequestHandler):
+    def handle(self):
+        while True:
+            try:
+                request = _recv_message(self.request)
+            except (ConnectionError, OSError):
+                return
+            try:
+                vectors = self.server.batcher.embed(request.get("texts") or [])
+            except Exception as e:
+                _send_message(self.request, {"error": f"{type(e).__name__}: {e}"})
+                continue
+            count, dim = vectors.shape if vectors.size else (0, 0)
+            _send_message(self.request, {"count": count, "dim": dim}, np.ascontiguousarray(vectors).tobytes())
+
+
+class EmbeddingServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+    # Every worker thread connects on its first request; the default backlog of 5
+    # refuses (EAGAIN) a burst of them.
+    request_queue_size = 256
+
+    def __init__(self, socket_path, embeddings, max_batch_size=64, max_wait_ms=5.0):
+        if os.path.exists(socket_path):
+            os.remove(socket_path)  # Stale socket from a previous run.
+        self.socket_path = socket_path
+        self.batcher = MicroBatcher(embeddings, max_batch_size=max_batch_size, max_wait_ms=max_wait_ms)
+        super().__init__(socket_path, _EmbeddingRequestHandler)
+
+    def server_close(self):
+        super().server_close()
+        self.batcher.close()
+        if os.path.exists(self.socket_path):
+            os.remove(self.socket_path)
+
+
+# Embeddings client for the shared server. Each thread keeps its own connection.
+# If the server is unreachable and a fallback factory is given, the worker loads
+# the model locally (once) and keeps serving; the server is retried after
+# retry_seconds so workers move back to it when it comes up.
+class RemoteEmbeddings(Embeddings):
+    def __init__(self, socket_path, timeout_seconds=30.0, fallback_factory=None, retry_seconds=10.0):
+        self.socket_path = socket_path
+        self.timeout_seconds = timeout_seconds
+        self.fallback_factory = fallback_factory
+        self.retry_seconds = retry_seconds
+        self._local = threading.local()
+        self._fallback = None
+        self._fallback_lock = threading.Lock()
+        self._unavailable_until = 0.0
+
+    def _connection(self):
+        sock = getattr(self._local, "sock", None)
+        if sock is None:
+            sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            sock.settimeout(self.timeout_seconds)
+            try:
+                sock.connect(self.socket_path)
+            except OSError:
+                sock.close()
+                raise
+            self._local.sock = sock
+        return sock
+
+    def _drop_connection(self):
+        sock = getattr(self._local, "sock", None)
+        self._local.sock = None
+        if sock is not None:
+            sock.close()
+
+    def _remote_embed(self, texts):
+        sock = self._connection()
+        try:
+            _send_message(sock, {"texts": texts})
+            header = _recv_message(sock)
+            if "error" in header:
+                raise RuntimeError(f"Embedding service error: {header['error']}")
+            count, dim = header["count"], header["dim"]
+            body = _recv_exact(sock, count * dim * 4)
+        except (OSError, ConnectionError, ValueError):
+            self._drop_connection()
+            raise
+        return np.frombuffer(body, dtype=np.float32).reshape(count, dim).tolist()
+
+    def _fallback_embeddings(self):
+        with self._fallback_lock:
+            if self._fallback is None:
+                logger.info("Loading a local embedding model as fallback for %s.", self.socket_path)
+                self._fallback = self.fallback_factory()
+            return self._fallback
+
+    def embed_documents(self, texts):
+        texts = list(texts)
+        if not texts:
+            return []
+        if time.monotonic() >= self._unavailable_until:
+            try:
+                vectors = self._remote_embed(texts)
+                metrics.incr("embedding.remote.requests")
+                return vectors
+            except (OSError, ConnectionError) as e:
+                if self.fallback_factory is None:
+                    raise
+                self._unavailable_until = time.monotonic() + self.retry_seconds
+                logger.warning("%s unavailable (%s); using local model for %.0fs.", self.socket_path, e, self.retry_seconds)
+        elif self.fallback_factory is None:
+            raise ConnectionError(f"Embedding service at {self.socket_path} is unavailable.")
+        metrics.incr("embedding.remote.fallbacks")
+        return self._fallback_embeddings().embed_documents(texts)
+
+    def embed_query(self, text):
+        return self.embed_documents([text])[0]
@@ -0,0 +1,189 @@
+import hashlib
+import json
+import logging
+import os
+import time
+import zipfile
+
+import numpy as np
+from django.conf import settings
+
+from . import index_store, ingest_registry, sections, vectorstores
+
+logger = logging.getLogger(__name__)
+
+
+# Portable snapshot of the live RAG index: chunk text, metadata and embeddings in
+# a single zip, independent of the backend and of absolute paths. A new node can
+# import it instead of re-embedding the corpus.
+#
+#   manifest.json       format version, embedding model id, count, dim, checksums
+#   chunks.jsonl        {"id", "text", "metadata"} per chunk, in row order
+#   embeddings.f32      row-major float32 matrix (count x dim), same order
+#   ingest_manifest.json  content hashes of ingested files (dedupe registry)
+#   sections.json       numbered sections detected at ingest (section notes, question bank)
+FORMAT_VERSION = 1
+MANIFEST_MEMBER = "manifest.json"
+CHUNKS_MEMBER = "chunks.jsonl"
+EMBEDDINGS_MEMBER = "embeddings.f32"
+REGISTRY_MEMBER = ingest_registry.REGISTRY_FILE
+SECTIONS_MEMBER = sections.SECTIONS_FILE
+BATCH_SIZE = 1000
+READ_SIZE = 1024 * 1024
+
+
+class SnapshotError(Exception):
+    pass
+
+
+def embedding_model_id():
+    if settings.EMBEDDING_BACKEND == "stub":
+        return "stub"
+    return f"{settings.EMBEDDING_BACKEND}:{settings.EMBEDDING_MODEL}"
+
+
+class _HashingWriter:
+    def __init__(self, stream):
+        self.stream = stream
+        self.hasher = hashlib.sha256()
+
+    def write(self, data):
+        self.hasher.update(data)
+        self.stream.write(data)
+
+
+def export_snapshot(path, backend=None):
+    backend = backend or settings.VECTOR_STORE_BACKEND
+    version = index_store.current_version(backend)
+    directory = vectorstores.rag_store_directory(backend)
+    if not vectorstores.has_persisted_store(directory):
+        raise SnapshotError("No RAG index is live; nothing to export.")
+    store = vectorstores.open_vector_store(directory, backend)
+
+    # Zip members are written one at a time, so chunks and embeddings take one pass
+    # each. Published index versions are never modified, so both passes agree.
+    count, dim = 0, None
+    tmp_path = f"{path}.tmp"
+    try:
+        with zipfile.ZipFile(tmp_path, "w", compression=zipfile.ZIP_DEFLATED, allowZip64=True) as archive:
+            with archive.open(CHUNKS_MEMBER, "w", force_zip64=True) as stream:
+                chunks_out = _HashingWriter(stream)
+                for ids, texts, metadatas, _ in vectorstores.iter_records(store, backend, BATCH_SIZE):
+                    chunks_out.write("".join(
+                        json.dumps({"id": doc_id, "text": text, "metadata": metadata}) + "\n"
+                        for doc_id, text, metadata in zip(ids, texts, metadatas)
+                    ).encode("utf-8"))
+                    count += len(ids)
+            with archive.open(EMBEDDINGS_MEMBER, "w", force_zip64=True) as stream:
+                embeddings_out = _HashingWriter(stream)
+                for ids, _, _, vectors in vectorstores.iter_records(store, backend, BATCH_SIZE):
+                    if not ids:
+                        continue
+                    vectors = np.ascontiguousarray(vectors, dtype=np.float32)
+                    dim = dim or int(vectors.shape[1])
+                    embeddings_out.write(vectors.tobytes())
+
+            registry = ingest_registry.load(directory)
+            archive.writestr(REGISTRY_MEMBER, json.dumps(registry, indent=2))
+            archive.writestr(SECTIONS_MEMBER, json.dumps(sections.load(directory)))
+            manifest = {
+                "format_version": FORMAT_VERSION,
+                "created_at": time.time(),
+                "embedding_model": embedding_model_id(),
+                "source_backend": backend,
+                "source_version": version,
+                "count": count,
+                "dim": dim,
+                "checksums": {
+                    CHUNKS_MEMBER: chunks_out.hasher.hexdigest(),
+                    EMBEDDINGS_MEMBER: embeddings_out.hasher.hexdigest(),
+                },
+            }
+            archive.writestr(MANIFEST_MEMBER, json.dumps(manifest, indent=2))
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+    os.replace(tmp_path, path)
+    logger.info("Exported %s chunks (%s, dim %s) to %s.", count, manifest['embedding_model'], dim, path)
+    return manifest
+
+
+def read_manifest(archive):
+    try:
+        manifest = json.loads(archive.read(MANIFEST_MEMBER))
+    except KeyError:
+        raise SnapshotError(f"Not an index snapshot: {MANIFEST_MEMBER} is missing.")
+    if manifest.get("format_version") != FORMAT_VERSION:
+        raise SnapshotError(
+            f"Unsupported snapshot format version {manifest.get('format_version')} (expected {FORMAT_VERSION})."
+        )
+    return manifest
+
+
+def inspect_snapshot(path):
+    with zipfile.ZipFile(path, "r") as archive:
+        return read_manifest(archive)
+
+
+def _verify_checksums(archive, manifest):
+    for member, expected in manifest["checksums"].items():
+        hasher = hashlib.sha256()
+        with archive.open(member) as stream:
+            for block in iter(lambda: stream.read(READ_SIZE), b""):
+                hasher.update(block)
+        if hasher.hexdigest() != expected:
+            raise SnapshotError(f"Checksum mismatch for {member}; the snapshot is corrupt.")
+
+
+def _read_batches(archive, manifest):
+    dim, row_bytes = manifest["dim"], manifest["dim"] * 4
+    with archive.open(CHUNKS_MEMBER) as chunks_stream, archive.open(EMBEDDINGS_MEMBER) as embeddings_stream:
+        lines = (line for line in chunks_stream)
+        while True:
+            rows = [json.loads(line) for _, line in zip(range(BATCH_SIZE), lines)]
+            if not rows:
+                return
+            data = embeddings_stream.read(row_bytes * len(rows))
+            if len(data) != row_bytes * len(rows):
+                raise SnapshotError(f"{EMBEDDINGS_MEMBER} is shorter than {CHUNKS_MEMBER}.")
+            yield (
+                [row["id"] for row in rows],
+                [row["text"] for row in rows],
+                [row.get("metadata") or {} for row in rows],
+                np.frombuffer(data, dtype=np.float32).reshape(len(rows), dim),
+            )
+
+
+# Verifies the snapshot, loads it into a new index version (no embedding calls)
+# and makes that version live. The previous version stays available for rollback.
+def import_snapshot(path, backend=None, allow_model_mismatch=False):
+    backend = backend or settings.VECTOR_STORE_BACKEND
+    with zipfile.ZipFile(path, "r") as archive:
+        manifest = read_manifest(archive)
+        if manifest["embedding_model"] != embedding_model_id() and not allow_model_mismatch:
+            raise SnapshotError(
+                f"Snapshot was embedded with '{manifest['embedding_model']}' but this node uses "
+                f"'{embedding_model_id()}'. Queries would not match the stored vectors."
+            )
+        _verify_checksums(archive, manifest)
+
+        imported = 0
+        with index_store.build_version(copy_current=False, backend=backend) as build_dir:
+            store = vectorstores.open_vector_store(build_dir, backend)
+            if manifest["count"]:
+                for ids, texts, metadatas, vectors in _read_batches(archive, manifest):
+                    vectorstores.add_records(store, ids, texts, metadatas, vectors, backend=backend)
+                    imported += len(ids)
+            if imported != manifest["count"]:
+                raise SnapshotError(f"Snapshot holds {imported} chunks but its manifest declares {manifest['count']}.")
+            registry = json.loads(archive.read(REGISTRY_MEMBER)) if REGISTRY_MEMBER in archive.namelist() else {}
+            if registry:
+                with open(os.path.join(build_dir, REGISTRY_MEMBER), "w", encoding="utf-8") as f:
+                    json.dump(registry, f, indent=2)
+            imported_sections = json.loads(archive.read(SECTIONS_MEMBER)) if SECTIONS_MEMBER in archive.namelist() else []
+            if imported_sections:
+                sections.record(imported_sections, build_dir)
+            del store
+    logger.info("Imported %s chunks from %s as version %s.", imported, path, index_store.current_version(backend))
+    return manifest
@@ -0,0 +1,224 @@
+import json
+import logging
+import os
+import shutil
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+
+from django.conf import settings
+
+try:
+    import fcntl
+except ImportError:  # Windows: builds are still serialized within the process.
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+
+# Blue-green layout for the RAG index, one tree per vector store backend:
+#
+#   RAG_INDEX_ROOT/<backend>/CURRENT            {"current": <version>, "history": [...]}
+#   RAG_INDEX_ROOT/<backend>/versions/<version>/  one complete index per version
+#
+# Builds always write into a fresh version directory (optionally seeded with a
+# copy of the live one) and go live by atomically replacing CURRENT, so readers
+# never see a half-built or deleted index. Previous versions stay on disk for
+# rollback until garbage collection. Before the first versioned build, the
+# legacy fixed directory (CHROMA_DB_DIR_RAG / MMAP_INDEX_DIR_RAG) is served.
+POINTER_FILE = "CURRENT"
+VERSIONS_DIR = "versions"
+BUILDING_MARKER = ".building"
+LOCK_FILE = ".lock"
+MAX_HISTORY = 20
+STALE_BUILD_SECONDS = 3600
+
+_locks_guard = threading.Lock()
+_thread_locks = {}
+
+
+def _backend(backend):
+    return backend or settings.VECTOR_STORE_BACKEND
+
+
+def index_root(backend=None):
+    return os.path.join(settings.RAG_INDEX_ROOT, _backend(backend))
+
+
+def legacy_directory(backend=None):
+    return settings.MMAP_INDEX_DIR_RAG if _backend(backend) == "mmap" else settings.CHROMA_DB_DIR_RAG
+
+
+def version_directory(version, backend=None):
+    return os.path.join(index_root(backend), VERSIONS_DIR, version)
+
+
+def read_pointer(backend=None):
+    try:
+        with open(os.path.join(index_root(backend), POINTER_FILE), "r", encoding="utf-8") as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return None
+
+
+def _write_pointer(pointer, backend=None):
+    path = os.path.join(index_root(backend), POINTER_FILE)
+    tmp_path = f"{path}.{uuid.uuid4().hex}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(pointer, f)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+
+
+def current_version(backend=None):
+    pointer = read_pointer(backend)
+    if pointer is not None:
+        return pointer.get("current")
+    legacy = legacy_directory(backend)
+    return "legacy" if os.path.isdir(legacy) and os.listdir(legacy) else None
+
+
+def current_directory(backend=None):
+    version = current_version(backend)
+    if version is None:
+        return None
+    if version == "legacy":
+        return legacy_directory(backend)
+    return version_directory(version, backend)
+
+
+def list_versions(backend=None):
+    versions_dir = os.path.join(index_root(backend), VERSIONS_DIR)
+    if not os.path.isdir(versions_dir):
+        return []
+    return sorted(
+        name for name in os.listdir(versions_dir)
+        if not os.path.exists(os.path.join(versions_dir, name, BUILDING_MARKER))
+    )
+
+
+# Exclusive lock across threads and processes, held on the lock file at path.
+@contextmanager
+def file_lock(path):
+    with _locks_guard:
+        thread_lock = _thread_locks.setdefault(path, threading.Lock())
+    with thread_lock:
+        if fcntl is None:
+            yield
+            return
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        with open(path, "w") as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+
+def _exclusive(backend):
+    return file_lock(os.path.join(index_root(backend), LOCK_FILE))
+
+
+def _set_current(version, backend):
+    pointer = read_pointer(backend) or {"current": None, "history": []}
+    previous = pointer.get("current")
+    history = [v for v in pointer.get("history", []) if v not in (version, previous)]
+    if previous and previous != version and previous != "legacy":
+        history.insert(0, previous)
+    _write_pointer({"current": version, "history": history[:MAX_HISTORY], "updated_at": time.time()}, backend)
+
+
+# Yields a new version directory to build into; the version goes live only if
+# the block completes. With copy_current, the live index is copied in first so
+# the build can append to it (incremental ingest).
+@contextmanager
+def build_version(copy_current=True, backend=None):
+    with _exclusive(backend):
+        now = time.time()
+        version = f"v{time.strftime('%Y%m%d-%H%M%S', time.localtime(now))}.{int(now * 1000) % 1000:03d}-{uuid.uuid4().hex[:6]}"
+        directory = version_directory(version, backend)
+        live_directory = current_directory(backend)
+        # The marker goes in first so garbage collection never takes a build in progress.
+        os.makedirs(directory)
+        with open(os.path.join(directory, BUILDING_MARKER), "w") as f:
+            f.write(str(time.time()))
+        try:
+            if copy_current and live_directory and os.path.isdir(live_directory):
+                shutil.copytree(live_directory, directory, dirs_exist_ok=True, ignore=shutil.ignore_patterns(BUILDING_MARKER))
+            yield directory
+        except BaseException:
+            shutil.rmtree(directory, ignore_errors=True)
+            raise
+        os.remove(os.path.join(directory, BUILDING_MARKER))
+        _set_current(version, backend)
+        logger.info("Version %s is now live.", version)
+    schedule_garbage_collection(backend)
+
+
+def activate(version, backend=None):
+    if version not in list_versions(backend):
+        raise ValueError(f"Index version '{version}' does not exist or is incomplete.")
+    with _exclusive(backend):
+        _set_current(version, backend)
+    logger.info("Activated version %s.", version)
+
+
+def deactivate(backend=None):
+    with _exclusive(backend):
+        _set_current(None, backend)
+    logger.info("No index version is live.")
+    schedule_garbage_collection(backend)
+
+
+def rollback(backend=None):
+    pointer = read_pointer(backend) or {}
+    available = set(list_versions(backend))
+    for version in pointer.get("history", []):
+        if version in available:
+            activate(version, backend)
+            return version
+    raise ValueError("No previous index version is available to roll back to.")
+
+
+def collect_garbage(backend=None, keep=None):
+    from . import vectorstores
+
+    keep = settings.RAG_INDEX_KEEP_VERSIONS if keep is None else keep
+    with _exclusive(backend):
+        pointer = read_pointer(backend) or {}
+        protected = {pointer.get("current")} | set(pointer.get("history", [])[:keep])
+        versions_dir = os.path.join(index_root(backend), VERSIONS_DIR)
+        if not os.path.isdir(versions_dir):
+            return []
+        removed = []
+        for name in os.listdir(versions_dir):
+            directory = os.path.join(versions_dir, name)
+            marker = os.path.join(directory, BUILDING_MARKER)
+            if os.path.exists(marker):
+                # A build from a process without flock, unless abandoned long ago.
+                if time.time() - os.path.getmtime(marker) < STALE_BUILD_SECONDS:
+                    continue
+            elif name in protected:
+                continue
+            vectorstores.release_directory(directory)
+            shutil.rmtree(directory, ignore_errors=True)
+            removed.append(name)
+        if removed:
+            logger.info("Garbage-collected %s old index version(s): %s.", len(removed), ', '.join(sorted(removed)))
+        return removed
+
+
+def schedule_garbage_collection(backend=None):
+    backend = _backend(backend)
+
+    def run():
+        try:
+            collect_garbage(backend)
+        except Exception as e:
+            logger.warning("Garbage collection failed: %s", e)
+
+    thread = threading.Thread(target=run, name="rag-index-gc", daemon=True)
+    thread.start()
+    return thread
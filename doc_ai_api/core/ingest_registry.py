@@ -0,0 +1,55 @@
+import json
+import logging
+import os
+import threading
+import time
+
+from . import vectorstores
+
+logger = logging.getLogger(__name__)
+
+
+# Content hashes of every file ingested into the current RAG index, stored inside
+# the index version so clearing or rolling back the index carries them along.
+# Re-uploading an already ingested file (same SHA-256, any name) is skipped
+# instead of duplicating chunks.
+REGISTRY_FILE = "ingest_manifest.json"
+
+_lock = threading.Lock()
+
+
+def registry_path(directory=None):
+    directory = directory or vectorstores.rag_store_directory()
+    return os.path.join(directory, REGISTRY_FILE) if directory else None
+
+
+def load(directory=None):
+    path = registry_path(directory)
+    if path is None:
+        return {}
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return {}
+    except ValueError as e:
+        logger.warning("Could not parse %s: %s. Starting empty.", path, e)
+        return {}
+
+
+def is_ingested(sha256, directory=None):
+    return sha256 in load(directory)
+
+
+def record(entries, directory=None):
+    with _lock:
+        registry = load(directory)
+        now = time.time()
+        for sha256, file_name, chunk_count in entries:
+            registry[sha256] = {"file_name": file_name, "chunks": chunk_count, "ingested_at": now}
+        path = registry_path(directory)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(registry, f, indent=2)
+        os.replace(tmp_path, path)
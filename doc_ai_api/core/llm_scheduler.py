@@ -0,0 +1,229 @@
+import contextvars
+import functools
+import heapq
+import itertools
+import math
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, List, Optional
+
+from django.conf import settings
+from django.http import JsonResponse
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.outputs import ChatGeneration, ChatResult
+
+from . import metrics, tracing
+
+
+# Every chain shares one local Ollama model, so LLM calls go through a scheduler
+# with a fixed number of slots (LLM_MAX_CONCURRENCY, normally Ollama's
+# OLLAMA_NUM_PARALLEL). Waiting calls are served strictly by priority class, then
+# in arrival order, so interactive chat is never stuck behind summarize map calls
+# or batch jobs. Requests are admitted per class: once LLM_ADMISSION_LIMITS[class]
+# requests of a class are admitted and not finished, new ones are refused with
+# 429 and a Retry-After estimate instead of queueing without bound.
+PRIORITIES = ("interactive", "standard", "batch")
+DEFAULT_PRIORITY = "standard"
+
+_current_priority = contextvars.ContextVar("llm_priority", default=DEFAULT_PRIORITY)
+
+
+class LLMScheduler:
+    def __init__(self, max_concurrency, admission_limits):
+        self.max_concurrency = max(1, max_concurrency)
+        self.admission_limits = dict(admission_limits)
+        self._lock = threading.Lock()
+        self._active = 0
+        self._waiting = []  # heap of (rank, seq, priority, event)
+        self._waiting_by_priority = {priority: 0 for priority in PRIORITIES}
+        self._admitted = {priority: 0 for priority in PRIORITIES}
+        self._sequence = itertools.count()
+
+    def _grant_next(self):
+        while self._waiting and self._active < self.max_concurrency:
+            _, _, priority, event = heapq.heappop(self._waiting)
+            self._waiting_by_priority[priority] -= 1
+            self._active += 1
+            event.set()
+
+    @contextmanager
+    def slot(self, priority=None):
+        priority = priority or _current_priority.get()
+        queued_at = time.perf_counter()
+        with self._lock:
+            if self._active < self.max_concurrency and not self._waiting:
+                self._active += 1
+                event = None
+            else:
+                event = threading.Event()
+                heapq.heappush(self._waiting, (PRIORITIES.index(priority), next(self._sequence), priority, event))
+                self._waiting_by_priority[priority] += 1
+        if event is not None:
+            event.wait()
+        started = time.perf_counter()
+        metrics.observe(f"llm.queue_wait_seconds.{priority}", started - queued_at)
+        try:
+            yield started - queued_at
+        finally:
+            metrics.observe(f"llm.generation_seconds.{priority}", time.perf_counter() - started)
+            with self._lock:
+                self._active -= 1
+                self._grant_next()
+
+    # Retry-After estimate: one generation (at the recent average) for every
+    # request in flight at or above this priority, spread over the slots.
+    def retry_after_seconds(self, priority):
+        rank = PRIORITIES.index(priority)
+        with self._lock:
+            ahead = sum(count for name, count in self._admitted.items() if PRIORITIES.index(name) <= rank)
+        generation = metrics.timings(f"llm.generation_seconds.{priority}")[-50:]
+        average = sum(generation) / len(generation) if generation else 5.0
+        return max(1, math.ceil(ahead * average / self.max_concurrency))
+
+    def try_admit(self, priority):
+        limit = self.admission_limits.get(priority)
+        with self._lock:
+            if limit is not None and self._admitted[priority] >= limit:
+                return False
+            self._admitted[priority] += 1
+            return True
+
+    def release(self, priority):
+        with self._lock:
+            self._admitted[priority] -= 1
+
+    def stats(self):
+        with self._lock:
+            return {
+                "max_concurrency": self.max_concurrency,
+                "active": self._active,
+                "waiting": dict(self._waiting_by_priority),
+                "admitted": dict(self._admitted),
+                "admission_limits": dict(self.admission_limits),
+            }
+
+
+_scheduler = None
+_scheduler_lock = threading.Lock()
+
+
+def get_scheduler():
+    global _scheduler
+    with _scheduler_lock:
+        if _scheduler is None:
+            _scheduler = LLMScheduler(settings.LLM_MAX_CONCURRENCY, settings.LLM_ADMISSION_LIMITS)
+        return _scheduler
+
+
+@contextmanager
+def priority(name):
+    if name not in PRIORITIES:
+        raise ValueError(f"Unknown LLM priority '{name}'. Expected one of: {', '.join(PRIORITIES)}.")
+    token = _current_priority.set(name)
+    try:
+        yield
+    finally:
+        _current_priority.reset(token)
+
+
+def _output_tokens(message):
+    usage = getattr(message, "usage_metadata", None) or {}
+    info = getattr(message, "response_metadata", None) or {}
+    return usage.get("output_tokens") or info.get("eval_count") or 0
+
+
+# Chat model wrapper that takes a scheduler slot around each generation. It is
+# installed as models.llm, so every chain built on it is scheduled. It also counts
+# calls and generated tokens per chain (the "llm_chain" run metadata) and calls
+# per priority. The inner
+# model is called through its public invoke(); callbacks stay on this wrapper's
+# run, so each generation is reported once.
+class ScheduledChatModel(BaseChatModel):
+    inner: BaseChatModel
+    scheduler: Any
+
+    @property
+    def _llm_type(self) -> str:
+        return f"scheduled-{self.inner._llm_type}"
+
+    def _generate(self, messages: List[Any], stop: Optional[List[str]] = None, run_manager=None, **kwargs: Any):
+        chain = ((run_manager.metadata if run_manager is not None else None) or {}).get("llm_chain", "direct")
+        with tracing.span(f"llm.{chain}", priority=_current_priority.get()) as llm_span:
+            with self.scheduler.slot() as queue_wait:
+                message = self.inner.invoke(messages, stop=stop, **kwargs)
+            tokens = _output_tokens(message)
+            llm_span.set(queue_wait_ms=round(queue_wait * 1000.0, 3), output_tokens=tokens)
+        metrics.incr(f"llm.chain.{chain}.calls")
+        metrics.incr(f"llm.priority.{_current_priority.get()}.calls")
+        metrics.incr(f"llm.chain.{chain}.output_tokens", tokens)
+        metrics.observe(f"llm.output_tokens.{chain}", tokens)
+        return ChatResult(generations=[ChatGeneration(message=message)])
+
+
+def saturated_response(priority):
+    retry_after = get_scheduler().retry_after_seconds(priority)
+    response = JsonResponse({
+        'status': 'error',
+        'message': f'The LLM is saturated with {priority} requests. Please retry in about {retry_after}s.',
+    }, status=429)
+    response['Retry-After'] = str(retry_after)
+    return response
+
+
+# Streamed body that releases the request's admission once, when the stream is
+# exhausted or closed (Django closes it with the response, even if the client
+# went away before the first chunk).
+class _ReleasingStream:
+    def __init__(self, chunks, release):
+        self._chunks = chunks
+        self._release = release
+        self._released = threading.Event()
+
+    def __iter__(self):
+        try:
+            yield from self._chunks
+        finally:
+            self.close()
+
+    def close(self):
+        if self._released.is_set():
+            return
+        self._released.set()
+        try:
+            close = getattr(self._chunks, "close", None)
+            if close is not None:
+                close()
+        finally:
+            self._release()
+
+
+# View decorator: refuses the request with 429 + Retry-After when its priority
+# class is at its limit, otherwise runs the view at that priority. A streaming
+# response holds its admission until the stream is closed.
+def scheduled(priority_name):
+    def decorator(view):
+        @functools.wraps(view)
+        def wrapper(request, *args, **kwargs):
+            if request.method != "POST":
+                return view(request, *args, **kwargs)
+            scheduler = get_scheduler()
+            if not scheduler.try_admit(priority_name):
+                metrics.incr(f"llm.scheduler.rejected.{priority_name}")
+                return saturated_response(priority_name)
+            release = functools.partial(scheduler.release, priority_name)
+            try:
+                with priority(priority_name):
+                    response = view(request, *args, **kwargs)
+            except BaseException:
+                release()
+                raise
+            if response.streaming:
+                response.streaming_content = _ReleasingStream(response.streaming_content, release)
+            else:
+                release()
+            return response
+
+        return wrapper
+
+    return decorator
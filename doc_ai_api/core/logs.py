@@ -0,0 +1,96 @@
+import atexit
+import copy
+import json
+import logging
+import logging.handlers
+import queue
+import sys
+import time
+
+
+# Structured, non-blocking logging. Application code logs through
+# logging.getLogger(__name__); AsyncQueueHandler (installed by settings.LOGGING)
+# only interpolates the message and truncates it on the calling thread, then hands
+# the record to a bounded queue. A listener thread formats (JSON or text) and writes
+# it, so a slow stdout never stalls a request. When the queue is full, records are
+# dropped and counted rather than blocking.
+_RECORD_ATTRIBUTES = set(vars(logging.LogRecord("", 0, "", 0, "", None, None))) | {"message", "asctime"}
+
+_handlers = []
+
+
+def truncate(text, limit):
+    text = str(text)
+    if not limit or len(text) <= limit:
+        return text
+    return f"{text[:limit]}... [{len(text) - limit} more chars]"
+
+
+class JsonFormatter(logging.Formatter):
+    def format(self, record):
+        entry = {
+            "ts": round(record.created, 3),
+            "time": time.strftime("%Y-%m-%dT%H:%M:%S", time.localtime(record.created)),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+            "thread": record.threadName,
+        }
+        # Fields passed with extra={...} become top-level keys.
+        for key, value in vars(record).items():
+            if key not in _RECORD_ATTRIBUTES and not key.startswith("_"):
+                entry[key] = value
+        if record.exc_text:
+            entry["exc"] = record.exc_text
+        return json.dumps(entry, default=str)
+
+
+class AsyncQueueHandler(logging.handlers.QueueHandler):
+    def __init__(self, format="json", max_message_chars=2000, queue_size=10000, stream=None):
+        super().__init__(queue.Queue(maxsize=queue_size))
+        target = logging.StreamHandler(stream or sys.stderr)
+        if format == "json":
+            target.setFormatter(JsonFormatter())
+        else:
+            target.setFormatter(logging.Formatter("%(asctime)s %(levelname)s %(name)s: %(message)s"))
+        self.max_message_chars = max_message_chars
+        self.dropped = 0
+        self._listener = logging.handlers.QueueListener(self.queue, target)
+        self._listener.start()
+        atexit.register(self._stop)
+        _handlers.append(self)
+
+    # Unlike QueueHandler.prepare, this does not run the formatter: the message is
+    # merged and truncated here, and the traceback (which holds live frames) is
+    # rendered to text; everything else happens on the listener thread.
+    def prepare(self, record):
+        record = copy.copy(record)
+        record.msg = truncate(record.getMessage(), self.max_message_chars)
+        record.args = None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+    def _stop(self):
+        if self._listener._thread is not None:
+            self._listener.stop()
+
+    def close(self):
+        self._stop()
+        if self in _handlers:
+            _handlers.remove(self)
+        super().close()
+
+
+def stats():
+    return {
+        "queued": sum(handler.queue.qsize() for handler in _handlers),
+        "dropped": sum(handler.dropped for handler in _handlers),
+    }
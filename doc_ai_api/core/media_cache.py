@@ -0,0 +1,132 @@
+import hashlib
+import json
+import logging
+import os
+import threading
+import uuid
+from contextlib import contextmanager
+
+from django.conf import settings
+
+from . import metrics
+
+logger = logging.getLogger(__name__)
+
+
+# Content-addressed cache for generated media. A file is named after the SHA-256
+# of its input text and render parameters (including the font file), so an
+# identical render is served from disk instead of re-rendered, two different
+# texts never overwrite each other, and a file's content never changes under its
+# URL. A hit refreshes the file's mtime; after each new file, the least recently
+# used ones are evicted until the cache is within MEDIA_CACHE_MAX_BYTES.
+CACHE_SUBDIR = "generated"
+
+_lock = threading.Lock()
+_key_locks = {}  # key -> [lock, threads holding or waiting for it]
+_font_hashes = {}
+
+
+def cache_directory():
+    return os.path.join(settings.MEDIA_ROOT, CACHE_SUBDIR)
+
+
+def url_for(file_name):
+    return f"{settings.MEDIA_URL}{CACHE_SUBDIR}/{file_name}"
+
+
+def _file_hash(path):
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return None
+    key = (path, stat.st_mtime_ns, stat.st_size)
+    with _lock:
+        cached = _font_hashes.get(key)
+    if cached is None:
+        with open(path, "rb") as f:
+            cached = hashlib.sha256(f.read()).hexdigest()
+        with _lock:
+            _font_hashes[key] = cached
+    return cached
+
+
+def cache_key(text, params, font_path=None):
+    payload = {"text": text, "params": params, "font": _file_hash(font_path) if font_path else None}
+    return hashlib.sha256(json.dumps(payload, sort_keys=True, default=str).encode("utf-8")).hexdigest()
+
+
+# Per-key lock, dropped from _key_locks once no thread holds or waits for it, so
+# a late caller never gets a fresh lock while another thread is still rendering.
+@contextmanager
+def _key_lock(key):
+    with _lock:
+        entry = _key_locks.setdefault(key, [threading.Lock(), 0])
+        entry[1] += 1
+    try:
+        with entry[0]:
+            yield
+    finally:
+        with _lock:
+            entry[1] -= 1
+            if not entry[1]:
+                del _key_locks[key]
+
+
+# Returns the URL of the cached file for key, calling render(path) to create it on
+# a miss; render returns False on failure. Concurrent requests for the same key
+# render once.
+def get_or_render(key, extension, render):
+    file_name = f"{key}.{extension}"
+    directory = cache_directory()
+    path = os.path.join(directory, file_name)
+    with _key_lock(key):
+        if os.path.exists(path):
+            os.utime(path)
+            metrics.incr("media_cache.hits")
+            return url_for(file_name)
+        os.makedirs(directory, exist_ok=True)
+        tmp_path = os.path.join(directory, f".{key}.{uuid.uuid4().hex}.tmp.{extension}")
+        try:
+            if not render(tmp_path):
+                return None
+            os.replace(tmp_path, path)
+        finally:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+    metrics.incr("media_cache.misses")
+    evict()
+    return url_for(file_name)
+
+
+def evict(max_bytes=None):
+    max_bytes = settings.MEDIA_CACHE_MAX_BYTES if max_bytes is None else max_bytes
+    directory = cache_directory()
+    entries = []
+    with os.scandir(directory) as scan:
+        for entry in scan:
+            if entry.is_file() and not entry.name.startswith("."):
+                stat = entry.stat()
+                entries.append((stat.st_mtime, stat.st_size, entry.path))
+    total = sum(size for _, size, _ in entries)
+    removed = 0
+    for _, size, path in sorted(entries):
+        if total <= max_bytes:
+            break
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            continue
+        total -= size
+        removed += 1
+    if removed:
+        metrics.incr("media_cache.evictions", removed)
+        logger.info("Evicted %s cached media file(s); %s bytes remain.", removed, total)
+    return removed
+
+
+def stats():
+    directory = cache_directory()
+    if not os.path.isdir(directory):
+        return {"files": 0, "bytes": 0, "max_bytes": settings.MEDIA_CACHE_MAX_BYTES}
+    sizes = [entry.stat().st_size for entry in os.scandir(directory) if entry.is_file() and not entry.name.startswith(".")]
+    return {"files": len(sizes), "bytes": sum(sizes), "max_bytes": settings.MEDIA_CACHE_MAX_BYTES}
@@ -0,0 +1,92 @@
+import functools
+import threading
+import time
+from collections import defaultdict, deque
+from contextlib import contextmanager
+
+
+# In-process counters and timing samples. Timings keep the most recent
+# MAX_SAMPLES observations per name so long-running workers stay bounded.
+MAX_SAMPLES = 5000
+
+_lock = threading.Lock()
+_counters = defaultdict(int)
+_timings = defaultdict(lambda: deque(maxlen=MAX_SAMPLES))
+
+
+def incr(name, value=1):
+    with _lock:
+        _counters[name] += value
+
+
+def observe(name, value):
+    with _lock:
+        _timings[name].append(value)
+
+
+@contextmanager
+def timer(name):
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        observe(name, time.perf_counter() - started)
+
+
+def timed_node(node_name, node_fn):
+    @functools.wraps(node_fn)
+    def wrapper(state):
+        with timer(f"node.{node_name}"):
+            return node_fn(state)
+
+    return wrapper
+
+
+def percentile(values, pct):
+    if not values:
+        return None
+    ordered = sorted(values)
+    rank = (len(ordered) - 1) * pct / 100.0
+    low = int(rank)
+    high = min(low + 1, len(ordered) - 1)
+    return ordered[low] + (ordered[high] - ordered[low]) * (rank - low)
+
+
+def summarize(values):
+    values = list(values)
+    if not values:
+        return {"count": 0}
+    return {
+        "count": len(values),
+        "mean": sum(values) / len(values),
+        "p50": percentile(values, 50),
+        "p95": percentile(values, 95),
+        "p99": percentile(values, 99),
+        "max": max(values),
+    }
+
+
+def counters():
+    with _lock:
+        return dict(_counters)
+
+
+def timings(name):
+    with _lock:
+        return list(_timings.get(name, ()))
+
+
+def snapshot():
+    with _lock:
+        counter_copy = dict(_counters)
+        timing_copy = {name: list(values) for name, values in _timings.items()}
+    return {
+        "counters": counter_copy,
+        "timings": {name: summarize(values) for name, values in timing_copy.items()},
+    }
+
+
+def reset():
+    with _lock:
+        _counters.clear()
+        _timings.clear()
@@ -1,4 +1,6 @@
-import traceback
+import json
+import logging
+import re
 from langchain_core.output_parsers import StrOutputParser
 from langchain_core.prompts import PromptTemplate
 
@@ -9,8 +11,11 @@ from langchain.agents import Tool
 
 from django.conf import settings as config
 
-from . import utils 
+from . import web_search as web_search_module
+from .embedding_cache import CachedQueryEmbeddings
+from .llm_scheduler import ScheduledChatModel, get_scheduler
 
+logger = logging.getLogger(__name__)
 
 llm = None
 embeddings = None
@@ -24,6 +29,8 @@ critique_chain = None
 summarization_chain = None
 web_search_tool = None 
 
+LLM_TEMPERATURE = 0.1
+
 
 
 def get_string_content(output):
@@ -32,26 +39,114 @@ def get_string_content(output):
     elif isinstance(output, str):
         return output
     else:
-        print(f"Warning: Unexpected output type received: {type(output)}. Attempting str conversion.")
+        logger.warning("Unexpected output type received: %s. Attempting str conversion.", type(output))
         return str(output)
 
 
+# Tolerant parsing for single-label chains: accepts quotes, punctuation, case,
+# "-"/" " for "_", a JSON string or object from format-constrained decoding, and
+# explanations around the label. Returns the earliest label found, or None.
+def parse_label(output, labels):
+    text = get_string_content(output).strip()
+    try:
+        parsed = json.loads(text)
+        if isinstance(parsed, dict):
+            parsed = next(iter(parsed.values()), "")
+        text = str(parsed)
+    except ValueError:
+        pass
+    normalized = f" {re.sub(r'[^a-z0-9]+', ' ', text.lower())} "
+    found = []
+    for label in labels:
+        position = normalized.find(f" {re.sub(r'[^a-z0-9]+', ' ', label.lower()).strip()} ")
+        if position != -1:
+            found.append((position, label))
+    return min(found)[1] if found else None
+
+
+def build_llm():
+    if config.LLM_BACKEND == "stub":
+        from .stubs import StubChatModel
+        return StubChatModel(latency_ms=config.STUB_LLM_LATENCY_MS, ms_per_token=config.STUB_LLM_MS_PER_TOKEN)
+    return ChatOllama(model=config.LLM_MODEL, temperature=LLM_TEMPERATURE, base_url=config.OLLAMA_BASE_URL)
+
+
+def build_local_embeddings():
+    if config.EMBEDDING_BACKEND == "stub":
+        from .stubs import StubEmbeddings
+        return StubEmbeddings(latency_ms=config.STUB_EMBEDDING_LATENCY_MS)
+    return HuggingFaceEmbeddings(model_name=config.EMBEDDING_MODEL)
+
+
+def build_embeddings():
+    if config.EMBEDDING_SERVICE_SOCKET:
+        # Workers share the model loaded by `manage.py embedding_server`.
+        from .embedding_service import RemoteEmbeddings
+        base_embeddings = RemoteEmbeddings(
+            config.EMBEDDING_SERVICE_SOCKET,
+            timeout_seconds=config.EMBEDDING_SERVICE_TIMEOUT_SECONDS,
+            fallback_factory=build_local_embeddings if config.EMBEDDING_SERVICE_FALLBACK else None,
+        )
+    else:
+        base_embeddings = build_local_embeddings()
+    if config.QUERY_EMBEDDING_CACHE_SIZE > 0:
+        return CachedQueryEmbeddings(base_embeddings, max_entries=config.QUERY_EMBEDDING_CACHE_SIZE)
+    return base_embeddings
+
+
+# ChatOllama fields that it sends as Ollama options when no `options` are bound.
+OLLAMA_OPTION_FIELDS = (
+    "mirostat", "mirostat_eta", "mirostat_tau", "num_ctx", "num_gpu", "num_thread", "num_predict",
+    "repeat_last_n", "repeat_penalty", "temperature", "seed", "stop", "tfs_z", "top_k", "top_p",
+)
+
+
+# The options a model would send on its own. Binding `options=` replaces them
+# wholesale, so build_chain starts from these.
+def model_options(model):
+    model = getattr(model, "inner", model)
+    if not isinstance(model, ChatOllama):
+        return {}
+    return {field: getattr(model, field) for field in OLLAMA_OPTION_FIELDS if getattr(model, field, None) is not None}
+
+
+# Binds the per-chain decoding limits from CHAIN_GENERATION_OPTIONS (num_predict,
+# stop, format) on top of the model's own options and tags the chain's LLM calls
+# so tokens are counted per chain.
+def build_chain(prompt, chain_name):
+    chain_llm = llm
+    options = config.CHAIN_GENERATION_OPTIONS.get(chain_name)
+    if options:
+        bound = {"options": {
+            "temperature": LLM_TEMPERATURE,
+            **model_options(llm),
+            **{k: v for k, v in options.items() if k != "format"},
+        }}
+        if options.get("format"):
+            bound["format"] = options["format"]
+        chain_llm = llm.bind(**bound)
+    return (prompt | chain_llm | StrOutputParser()).with_config(metadata={"llm_chain": chain_name})
+
+
 def initialize_core_models_and_chains():
     global llm, embeddings, document_grader_chain, query_rewriter_chain, rag_chain, question_generator_chain, \
            query_classifier_chain, context_summarizer_chain, critique_chain, summarization_chain, web_search_tool
 
-    print("--- Initializing Core Models and Chains ---")
+    logger.info("Initializing Core Models and Chains")
     try:
         
-        llm = ChatOllama(model=config.LLM_MODEL, temperature=0.1)
-        test_llm_response_obj = llm.invoke("Quick self-introduction in one sentence.")
-        test_llm_response_str = get_string_content(test_llm_response_obj)
-        print(f"LLM ({config.LLM_MODEL}) Test response: {test_llm_response_str}")
+        llm = ScheduledChatModel(inner=build_llm(), scheduler=get_scheduler())
+        if config.MODEL_WARMUP_CALLS:
+            test_llm_response_obj = llm.invoke("Quick self-introduction in one sentence.")
+            test_llm_response_str = get_string_content(test_llm_response_obj)
+            logger.info("LLM (%s: %s) Test response: %s", config.LLM_BACKEND, config.LLM_MODEL, test_llm_response_str)
 
         
-        embeddings = HuggingFaceEmbeddings(model_name=config.EMBEDDING_MODEL)
-        embeddings.embed_query("test embedding functionality")  
-        print(f"Embedding Model ({config.EMBEDDING_MODEL}) initialized.")
+        embeddings = build_embeddings()
+        if config.MODEL_WARMUP_CALLS:
+            embeddings.embed_query("test embedding functionality")  
+        via = f" via {config.EMBEDDING_SERVICE_SOCKET}" if config.EMBEDDING_SERVICE_SOCKET else ""
+        logger.info("Embedding Model (%s: %s%s) initialized.", config.EMBEDDING_BACKEND, config.EMBEDDING_MODEL, via)
         
         grade_prompt = PromptTemplate(
             template="""You are a grader assessing the collective relevance of a set of retrieved documents to a user question.
@@ -66,8 +161,8 @@ def initialize_core_models_and_chains():
             """,
             input_variables=["documents", "question"],
         )
-        document_grader_chain = grade_prompt | llm | StrOutputParser()
-        print("RAG: Document grader chain created.")
+        document_grader_chain = build_chain(grade_prompt, "document_grader")
+        logger.info("RAG: Document grader chain created.")
 
         rewrite_prompt = PromptTemplate(
             template="""You are a query optimization assistant. Based on the user's original question,
@@ -79,8 +174,8 @@ def initialize_core_models_and_chains():
             Rephrased question:""",
             input_variables=["question"],
         )
-        query_rewriter_chain = rewrite_prompt | llm | StrOutputParser()
-        print("RAG: Query rewriter chain created.")
+        query_rewriter_chain = build_chain(rewrite_prompt, "query_rewriter")
+        logger.info("RAG: Query rewriter chain created.")
 
         rag_prompt = PromptTemplate(
             template="""You are an assistant for question-answering tasks based on provided technical documents.
@@ -93,8 +188,8 @@ def initialize_core_models_and_chains():
             Answer:""",
             input_variables=["question", "context"],
         )
-        rag_chain = rag_prompt | llm | StrOutputParser()
-        print("RAG: Generation chain created.")
+        rag_chain = build_chain(rag_prompt, "rag")
+        logger.info("RAG: Generation chain created.")
 
         
         query_classifier_prompt = PromptTemplate( 
@@ -109,8 +204,8 @@ def initialize_core_models_and_chains():
             Classification:""",
             input_variables=["question"],
         )
-        query_classifier_chain = query_classifier_prompt | llm | StrOutputParser()
-        print("RAG: Query classifier chain created.")
+        query_classifier_chain = build_chain(query_classifier_prompt, "query_classifier")
+        logger.info("RAG: Query classifier chain created.")
 
         context_summarizer_prompt = PromptTemplate( 
             template="""You are a highly skilled summarization assistant. Summarize the following document excerpts.
@@ -125,8 +220,8 @@ def initialize_core_models_and_chains():
             Concise Summary:""",
             input_variables=["question", "documents"],
         )
-        context_summarizer_chain = context_summarizer_prompt | llm | StrOutputParser()
-        print("RAG: Context summarizer chain created.")
+        context_summarizer_chain = build_chain(context_summarizer_prompt, "context_summarizer")
+        logger.info("RAG: Context summarizer chain created.")
 
         critique_prompt = PromptTemplate( 
             template="""You are an impartial assistant critiquing a generated answer based *only* on the original question and the retrieved context.
@@ -149,8 +244,8 @@ def initialize_core_models_and_chains():
             Critique Result:""",
             input_variables=["question", "context", "generation"],
         )
-        critique_chain = critique_prompt | llm | StrOutputParser()
-        print("RAG: Critique chain created.")
+        critique_chain = build_chain(critique_prompt, "critique")
+        logger.info("RAG: Critique chain created.")
 
         
         question_generation_prompt = PromptTemplate(
@@ -173,8 +268,8 @@ def initialize_core_models_and_chains():
             """,
             input_variables=["context", "topic", "num_questions", "difficulty"],
         )
-        question_generator_chain = question_generation_prompt | llm | StrOutputParser()
-        print("QGen: Question generator chain created.")
+        question_generator_chain = build_chain(question_generation_prompt, "question_generator")
+        logger.info("QGen: Question generator chain created.")
 
         
         summarization_prompt = PromptTemplate(
@@ -189,41 +284,42 @@ def initialize_core_models_and_chains():
             """,
             input_variables=["context", "topic"],
         )
-        summarization_chain = summarization_prompt | llm | StrOutputParser()
-        print("Summarization: Summarization chain created.")
+        summarization_chain = build_chain(summarization_prompt, "summarization")
+        logger.info("Summarization: Summarization chain created.")
 
        
         
         try:
-            
-            
-            web_search_tool = Tool(
-                name="GoogleCustomSearch",
-                description="Searches Google using a custom search engine for current events or general knowledge.",
-                func=utils.google_custom_search_tool_wrapper 
-            )
-            print("Google Custom Search Tool (via .env) initialized successfully.")
+            web_search_service = web_search_module.get_web_search_service()
+            if web_search_service is not None:
+                web_search_tool = Tool(
+                    name="WebSearch",
+                    description="Searches the web (or the configured offline corpus) for current events or general knowledge.",
+                    func=web_search_service.run
+                )
+                logger.info("Web Search Tool initialized with '%s' backend.", web_search_service.backend.name)
+            else:
+                web_search_tool = None
         except Exception as e:
             
             
-            print(f"WARNING: Could not initialize Google Custom Search Tool object. Error: {e}")
+            logger.warning("Could not initialize Web Search Tool object. Error: %s", e)
             web_search_tool = None
 
         if web_search_tool is None:
-            print("WARNING: No web search tool initialized. External search functionality will be disabled.")
+            logger.warning("No web search tool initialized. External search functionality will be disabled.")
 
 
         return True
 
     except Exception as e:
-        print(f"FATAL ERROR: Could not initialize core models or build chains: {e}")
-        print(traceback.format_exc())
+        logger.exception("Could not initialize core models or build chains: %s", e)
         
         if "Failed to connect to ollama" in str(e) or "pull" in str(e) or "model" in str(e):
-             print("\n--- Ollama Connection/Model Error ---")
-             print("Please ensure Ollama is running and the specified model is pulled.")
-             print("Run 'ollama serve' in a separate terminal and 'ollama pull your_model_name'.")
-             print("-------------------------------------\n")
+             logger.error(
+                 "Ollama connection/model error. Please ensure Ollama is running ('ollama serve') and the model is pulled ('ollama pull %s').",
+                 config.LLM_MODEL,
+             )
 
         llm = None
         embeddings = None
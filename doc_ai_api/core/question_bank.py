@@ -0,0 +1,184 @@
+import logging
+import os
+import re
+import time
+
+from django.conf import settings
+from langchain_core.documents import Document
+
+from . import background, context_packing, index_store, llm_scheduler, metrics, models, sections, shared_json
+
+logger = logging.getLogger(__name__)
+
+
+# Question bank: after ingestion, questions are generated in the background for
+# every live section and difficulty band (QUESTION_BANK_BANDS) at batch priority.
+# They are stored in BANK_FILE under RAG_INDEX_ROOT, keyed by the section's text
+# hash like the section summaries.
+#
+# A qgen request whose topic matches a section takes the band's next questions
+# after a served cursor, so repeated requests get different questions. The cursor
+# lives in STATE_FILE next to the bank and is shared by every server process.
+# When the questions left would not cover another request of the same size plus
+# QUESTION_BANK_MIN_STOCK, a top-up is recorded there too and the builder is
+# woken. Once a band is full or generation stops producing new questions
+# (exhausted, retried after QUESTION_BANK_EXHAUSTED_TTL), serving starts over
+# from the beginning of the band. Only one process builds at a time (BUILD_LOCK).
+BANK_FILE = "question_bank.json"
+STATE_FILE = "question_bank_state.json"
+BUILD_LOCK = "question_bank.build.lock"
+
+_QUESTION_LINE = re.compile(r"^\s*(?:\d+[.)]|[-*•])\s*(.+?)\s*$")
+
+
+def _bank_path():
+    return os.path.join(settings.RAG_INDEX_ROOT, BANK_FILE)
+
+
+def _state_path():
+    return os.path.join(settings.RAG_INDEX_ROOT, STATE_FILE)
+
+
+# {section sha256: {band: [question, ...]}}
+_bank = shared_json.SharedJSONFile(_bank_path)
+# {"<section sha256>:<band>": {"served": int, "exhausted_at": float | None, "top_up": bool}}
+_state = shared_json.SharedJSONFile(_state_path)
+
+
+def band_for(difficulty):
+    for band, (low, high) in settings.QUESTION_BANK_BANDS.items():
+        if low <= difficulty <= high:
+            return band
+    return None
+
+
+# Numbered or bulleted items of a generated list. Prose, headings ("1. Recall
+# questions:") and fragments too short to be a question are dropped.
+def parse_questions(text):
+    questions = []
+    for line in text.splitlines():
+        match = _QUESTION_LINE.match(line)
+        if match and len(match.group(1)) > 10 and not match.group(1).endswith(":"):
+            questions.append(match.group(1))
+    return questions
+
+
+def _normalized(question):
+    return " ".join(re.findall(r"\w+", question.lower()))
+
+
+def _state_key(section, band):
+    return f"{section['sha256']}:{band}"
+
+
+def _is_exhausted(entry):
+    exhausted_at = entry.get("exhausted_at")
+    return exhausted_at is not None and time.time() - exhausted_at < settings.QUESTION_BANK_EXHAUSTED_TTL
+
+
+def stock(section, band):
+    return list(_bank.read().get(section["sha256"], {}).get(band, []))
+
+
+# Generates one batch for section/band and adds the questions not already in the
+# band. Successive batches start a quarter of the section further on, so they
+# draw on different text and long sections are covered past the first budget.
+def _generate(section, band):
+    existing = stock(section, band)
+    lines = section["text"].splitlines() or [section["text"]]
+    batch = len(existing) // max(1, settings.QUESTION_BANK_BATCH)
+    offset = batch * max(1, len(lines) // 4) % len(lines)
+    text = "\n".join(lines[offset:] + lines[:offset])
+    context = context_packing.pack_context([Document(page_content=text, metadata={"source": section["source"]})], "qgen")
+    low, high = settings.QUESTION_BANK_BANDS[band]
+    started = time.perf_counter()
+    with llm_scheduler.priority("batch"):
+        raw_questions_output = models.question_generator_chain.invoke({
+            "context": context, "topic": section["title"],
+            "num_questions": settings.QUESTION_BANK_BATCH, "difficulty": (low + high) // 2,
+        })
+    metrics.observe("question_bank.batch_seconds", time.perf_counter() - started)
+
+    generated = parse_questions(models.get_string_content(raw_questions_output))
+
+    def add(bank):
+        questions = bank.setdefault(section["sha256"], {}).setdefault(band, [])
+        seen = {_normalized(question) for question in questions}
+        added = []
+        for question in generated:
+            if _normalized(question) not in seen and len(questions) + len(added) < settings.QUESTION_BANK_MAX_PER_BAND:
+                seen.add(_normalized(question))
+                added.append(question)
+        questions.extend(added)
+        return len(added)
+
+    added = _bank.update(add)
+
+    def record(state):
+        entry = state.setdefault(_state_key(section, band), {"served": 0})
+        entry["top_up"] = False
+        entry["exhausted_at"] = None if added else time.time()
+
+    _state.update(record)
+    metrics.incr("question_bank.questions_generated", added)
+    return added
+
+
+# Fills empty bands of every live section and tops up the bands requests ran low
+# on. Another process building at the same time is waited for.
+def build_pending():
+    if models.question_generator_chain is None:
+        return 0
+    generated = 0
+    with index_store.file_lock(os.path.join(settings.RAG_INDEX_ROOT, BUILD_LOCK)):
+        for section in sections.load():
+            for band in settings.QUESTION_BANK_BANDS:
+                entry = _state.read().get(_state_key(section, band), {})
+                if (not stock(section, band) or entry.get("top_up")) and not _is_exhausted(entry):
+                    generated += _generate(section, band)
+    if generated:
+        logger.info("Added %s questions to the question bank.", generated)
+    return generated
+
+
+_build_worker = background.RearmingWorker("question-bank", build_pending)
+
+
+def schedule_build():
+    if not settings.QUESTION_BANK:
+        return None
+    return _build_worker.schedule()
+
+
+def wait_for_build(timeout=None):
+    return _build_worker.wait(timeout)
+
+
+# Returns the band's next count questions for section at difficulty, or None when
+# the band does not have enough stock (a top-up is then requested).
+def draw(section, difficulty, count):
+    band = band_for(difficulty)
+    if band is None:
+        return None
+    questions = stock(section, band)
+
+    def take(state):
+        entry = state.setdefault(_state_key(section, band), {"served": 0})
+        served = min(entry.get("served", 0), len(questions))
+        exhausted = _is_exhausted(entry)
+        if len(questions) - served < count and len(questions) >= count and (
+                len(questions) >= settings.QUESTION_BANK_MAX_PER_BAND or exhausted):
+            served = 0
+            metrics.incr("question_bank.rotations")
+        picked = questions[served:served + count] if len(questions) - served >= count else None
+        entry["served"] = served + len(picked or [])
+        low = len(questions) - entry["served"] < count + settings.QUESTION_BANK_MIN_STOCK
+        top_up = low and len(questions) < settings.QUESTION_BANK_MAX_PER_BAND and not exhausted
+        if top_up:
+            entry["top_up"] = True
+        return picked, top_up
+
+    picked, top_up = _state.update(take)
+    if top_up:
+        schedule_build()
+    return picked
@@ -0,0 +1,284 @@
+import hashlib
+import json
+import logging
+import os
+import re
+import string
+import threading
+import time
+
+from django.conf import settings
+from langchain_core.documents import Document
+
+from . import background, context_packing, index_store, llm_scheduler, metrics, models, shared_json, utils
+
+logger = logging.getLogger(__name__)
+
+
+# Section index built at ingest time. Numbered headings ("8.4  STRESS-STRAIN
+# CURVE", "9.6.5 Capillary Rise") split each file into sections; a section runs
+# until the next heading of the same or a higher level, so it includes its
+# subsections. The index is stored as SECTIONS_FILE inside the index version,
+# next to the ingest registry, so it is carried along and rolled back with it.
+#
+# Section summaries are generated in the background at batch priority and kept
+# in SUMMARIES_FILE under RAG_INDEX_ROOT, keyed by the SHA-256 of the section
+# text: published versions stay immutable, and a section that is unchanged
+# across versions is summarized once. Every server process reads that file, and
+# only one at a time summarizes (SUMMARIES_BUILD_LOCK); the others wait for it
+# and then find little or nothing left to do.
+SECTIONS_FILE = "sections.json"
+SUMMARIES_FILE = "section_summaries.json"
+SUMMARIES_BUILD_LOCK = "section_summaries.build.lock"
+# Shortest body (characters) for a heading to count as a section.
+MIN_SECTION_CHARS = 80
+
+_HEADING = re.compile(r"^\s*(\d{1,2}(?:\.\d{1,2}){1,2})\s+(\S.{0,80}?)\s*$")
+# OCR sometimes glues an upper-case heading to the end of the previous line.
+_GLUED_HEADING = re.compile(r"^(.*?[.!?])\s*(\d{1,2}(?:\.\d{1,2}){1,2})\s{2,}([A-Z][A-Z’'\- ]{3,}?)\s*$")
+_SECTION_NUMBER = re.compile(r"\b\d{1,2}(?:\.\d{1,2}){1,2}\b")
+# Upper-case end matter closes the last section; the title-case table of contents
+# ("Summary", "Exercises") does not.
+_END_MATTER = {"SUMMARY", "POINTS TO PONDER", "EXERCISES", "ADDITIONAL EXERCISES", "APPENDIX"}
+_CONNECTORS = {"and", "of", "the", "in", "on", "for", "with", "to", "a", "an"}
+_STOPWORDS = _CONNECTORS | {"about", "what", "is", "are", "explain", "summarize", "summary", "notes", "section"}
+
+_lock = threading.Lock()
+_sections_cache = {}
+
+
+def _number(text):
+    return tuple(int(part) for part in text.split("."))
+
+
+def _is_title(text):
+    words = text.split()
+    return 0 < len(words) <= 8 and text[-1] not in ".?!,;:" and text[0].isupper()
+
+
+def _heading_at(lines, index):
+    match = _HEADING.match(lines[index])
+    if match and _is_title(match.group(2)):
+        return None, match.group(1), match.group(2)
+    match = _GLUED_HEADING.match(lines[index])
+    if match:
+        return match.group(1), match.group(2), match.group(3)
+    return None
+
+
+def _display_title(title):
+    title = " ".join(title.split())
+    if not title.isupper():
+        return title
+    words = string.capwords(title.lower()).split()
+    return " ".join(words[:1] + [word.lower() if word.lower() in _CONNECTORS else word for word in words[1:]])
+
+
+# Candidate headings in a table of contents sit on consecutive lines; real
+# headings are separated by body text.
+def _candidates(lines):
+    found = []
+    for index in range(len(lines)):
+        heading = _heading_at(lines, index)
+        if heading is None:
+            continue
+        prefix, number, title = heading
+        following = lines[index + 1].strip() if index + 1 < len(lines) else ""
+        # Titles wrapped onto a second line: "8.6 APPLICATIONS OF ELASTIC" / "BEHAVIOUR OF MATERIALS".
+        wrapped = following and _is_title(following) and len(following.split()) <= 5 and not _HEADING.match(following) and (
+            (title.isupper() and following.isupper()) or title.split()[-1].lower() in _CONNECTORS
+        )
+        found.append({"line": index, "prefix": prefix, "number": number, "title": f"{title} {following}" if wrapped else title,
+                      "body_start": index + (2 if wrapped else 1)})
+    listed = set()
+    for previous, current in zip(found, found[1:]):
+        if current["line"] - previous["line"] <= 2:
+            listed.update((previous["line"], current["line"]))
+    return [candidate for candidate in found if candidate["line"] not in listed]
+
+
+def _body_lines(lines, start, end, headings):
+    body = []
+    for index in range(start, end):
+        heading = headings.get(index)
+        if heading is not None and heading["prefix"]:
+            body.extend([heading["prefix"], f"{heading['number']} {heading['title']}"])
+        else:
+            body.append(lines[index])
+    # A heading glued to the end of a line leaves that line's text to the section before it.
+    if end in headings and headings[end]["prefix"]:
+        body.append(headings[end]["prefix"])
+    return body
+
+
+# Returns the sections of one document in reading order. Headings that do not
+# continue the numbering (exercise questions such as "8.1 A steel wire ...",
+# out-of-order OCR) or have almost no body are treated as body text.
+def detect_sections(text, source):
+    lines = text.splitlines()
+    candidates = _candidates(lines)
+    end_lines = [index for index, line in enumerate(lines) if line.strip() in _END_MATTER]
+    boundaries = sorted([candidate["line"] for candidate in candidates] + end_lines + [len(lines)])
+
+    accepted = []
+    for candidate in candidates:
+        next_boundary = next(line for line in boundaries if line > candidate["line"])
+        body = "\n".join(lines[candidate["body_start"]:next_boundary]).strip()
+        if len(body) < MIN_SECTION_CHARS:
+            continue
+        if accepted and _number(candidate["number"]) <= _number(accepted[-1]["number"]):
+            continue
+        accepted.append(candidate)
+
+    headings = {candidate["line"]: candidate for candidate in accepted}
+    sections = []
+    for position, candidate in enumerate(accepted):
+        level = len(_number(candidate["number"]))
+        end = next((later["line"] for later in accepted[position + 1:] if len(_number(later["number"])) <= level), len(lines))
+        end = min([end] + [line for line in end_lines if line > candidate["line"]])
+        body_lines = _body_lines(lines, candidate["body_start"], end, headings)
+        section_text = utils.clean_text("\n".join(body_lines)).strip()
+        sections.append({
+            "id": f"{source}#{candidate['number']}",
+            "number": candidate["number"],
+            "title": _display_title(candidate["title"]),
+            "source": source,
+            "text": section_text,
+            "sha256": hashlib.sha256(section_text.encode("utf-8")).hexdigest(),
+        })
+    return sections
+
+
+def sections_path(directory=None):
+    directory = directory or index_store.current_directory()
+    return os.path.join(directory, SECTIONS_FILE) if directory else None
+
+
+# Sections of the index version in directory (default: the live one). Published
+# versions never change, so each one is read once.
+def load(directory=None):
+    path = sections_path(directory)
+    if path is None:
+        return []
+    with _lock:
+        cached = _sections_cache.get(path)
+    if cached is not None:
+        return cached
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            loaded = json.load(f)
+    except FileNotFoundError:
+        loaded = []
+    except ValueError as e:
+        logger.warning("Could not parse %s: %s. Starting empty.", path, e)
+        loaded = []
+    if directory is not None and os.path.exists(os.path.join(directory, index_store.BUILDING_MARKER)):
+        return loaded
+    with _lock:
+        _sections_cache[path] = loaded
+    return loaded
+
+
+# Adds new_sections to the index being built in directory. Sections from a file
+# with the same name replace the earlier ones.
+def record(new_sections, directory):
+    sources = {section["source"] for section in new_sections}
+    merged = [section for section in load(directory) if section["source"] not in sources] + list(new_sections)
+    path = sections_path(directory)
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(merged, f)
+    os.replace(tmp_path, path)
+
+
+def _summaries_path():
+    return os.path.join(settings.RAG_INDEX_ROOT, SUMMARIES_FILE)
+
+
+_summaries = shared_json.SharedJSONFile(_summaries_path)
+
+
+def summary_for(section):
+    entry = _summaries.read().get(section["sha256"])
+    return entry["summary"] if entry else None
+
+
+def _store_summary(section, summary):
+    entry = {"summary": summary, "title": section["title"], "model": settings.LLM_MODEL, "generated_at": time.time()}
+
+    def add(summaries):
+        summaries[section["sha256"]] = entry
+
+    _summaries.update(add)
+
+
+# Summarizes every live section without a stored summary. Sections longer than
+# the "summarize" budget are summarized from their opening part, as much as the
+# live endpoint would pack.
+def summarize_pending():
+    if models.summarization_chain is None:
+        return 0
+    generated = 0
+    with index_store.file_lock(os.path.join(settings.RAG_INDEX_ROOT, SUMMARIES_BUILD_LOCK)):
+        for section in load():
+            if summary_for(section) is not None:
+                continue
+            context = context_packing.pack_context(
+                [Document(page_content=section["text"], metadata={"source": section["source"]})], "summarize"
+            )
+            started = time.perf_counter()
+            with llm_scheduler.priority("batch"):
+                raw_summary_output = models.summarization_chain.invoke({"context": context, "topic": section["title"]})
+            _store_summary(section, models.get_string_content(raw_summary_output))
+            metrics.observe("sections.summary_seconds", time.perf_counter() - started)
+            metrics.incr("sections.summaries_generated")
+            generated += 1
+    if generated:
+        logger.info("Generated %s section summaries.", generated)
+    return generated
+
+
+_summary_worker = background.RearmingWorker("section-summaries", summarize_pending)
+
+
+# Starts (or re-arms) the background worker that summarizes new sections.
+def schedule_summaries():
+    if not settings.SECTION_SUMMARIES:
+        return None
+    return _summary_worker.schedule()
+
+
+def wait_for_summaries(timeout=None):
+    return _summary_worker.wait(timeout)
+
+
+def _tokens(text):
+    words = re.findall(r"[a-z0-9]+", text.lower().replace("’", "'").replace("'s", ""))
+    return {word[:-1] if len(word) > 3 and word.endswith("s") and not word.endswith("ss") else word
+            for word in words if word not in _STOPWORDS}
+
+
+# Finds the live section a summarize topic refers to: by section number ("8.4"),
+# otherwise by the Dice overlap of topic and title words, if it reaches
+# SECTION_MATCH_THRESHOLD. Ties go to the broader section.
+def match_section(topic, directory=None):
+    live_sections = load(directory)
+    if not live_sections or not topic:
+        return None
+    numbers = set(_SECTION_NUMBER.findall(topic))
+    for section in live_sections:
+        if section["number"] in numbers:
+            return section
+    topic_tokens = _tokens(topic)
+    if not topic_tokens:
+        return None
+    best, best_key = None, None
+    for section in live_sections:
+        title_tokens = _tokens(section["title"])
+        if not title_tokens:
+            continue
+        score = 2 * len(topic_tokens & title_tokens) / (len(topic_tokens) + len(title_tokens))
+        key = (score, -len(_number(section["number"])))
+        if score >= settings.SECTION_MATCH_THRESHOLD and (best_key is None or key > best_key):
+            best, best_key = section, key
+    return best
@@ -0,0 +1,66 @@
+import json
+import logging
+import os
+import threading
+import uuid
+
+from . import index_store
+
+logger = logging.getLogger(__name__)
+
+
+# A JSON object in a file shared by every server process. Reads are cached and
+# reloaded when the file is replaced (another process wrote it); updates re-read
+# the file and write it back under an exclusive lock on "<file>.lock", so
+# concurrent writers merge instead of overwriting each other's entries.
+class SharedJSONFile:
+    def __init__(self, path_fn):
+        self.path_fn = path_fn
+        self._lock = threading.Lock()
+        self._cached = None  # (path, stat signature, data)
+
+    @staticmethod
+    def _signature(path):
+        try:
+            stat = os.stat(path)
+        except FileNotFoundError:
+            return None
+        return stat.st_ino, stat.st_mtime_ns, stat.st_size
+
+    @staticmethod
+    def _read_file(path):
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return {}
+        except ValueError as e:
+            logger.warning("Could not parse %s: %s. Starting empty.", path, e)
+            return {}
+
+    # The current contents. Callers must not modify the returned object.
+    def read(self):
+        path = self.path_fn()
+        signature = self._signature(path)
+        with self._lock:
+            if self._cached is not None and self._cached[:2] == (path, signature):
+                return self._cached[2]
+        data = self._read_file(path)
+        with self._lock:
+            self._cached = (path, signature, data)
+        return data
+
+    # Calls change(data) on the latest contents and writes them back; returns
+    # what change returned.
+    def update(self, change):
+        path = self.path_fn()
+        with index_store.file_lock(f"{path}.lock"):
+            data = self._read_file(path)
+            result = change(data)
+            tmp_path = f"{path}.{uuid.uuid4().hex}.tmp"
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump(data, f, indent=2)
+            os.replace(tmp_path, path)
+            with self._lock:
+                self._cached = (path, self._signature(path), data)
+        return result
@@ -0,0 +1,124 @@
+import functools
+import json
+import threading
+
+from django.conf import settings
+from django.http import HttpResponse
+
+from . import index_store, metrics, tracing
+
+
+# Request coalescing: while a request is running, identical requests (same
+# endpoint, same normalized JSON body, same live index version) wait for its
+# result instead of running the LLM pipeline again. Nothing is cached once the
+# first request finishes; only requests that overlap in time share work.
+#
+# Body fields that do not change the answer (NON_SEMANTIC_FIELDS) are left out
+# of the key, and per-request headers (PER_REQUEST_HEADERS) are not shared:
+# tracing.traced wraps this decorator, so each caller gets its own trace id and
+# debug trace after the shared result is returned.
+NON_SEMANTIC_FIELDS = frozenset({"debug"})
+PER_REQUEST_HEADERS = frozenset({"x-trace-id"})
+
+class SingleFlight:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls = {}
+
+    # Returns (result, shared). The leader runs fn; waiters get its result or
+    # re-raise its exception.
+    def do(self, key, fn):
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = {"done": threading.Event(), "result": None, "error": None, "waiters": 0}
+            else:
+                call["waiters"] += 1
+        if not leader:
+            call["done"].wait()
+            if call["error"] is not None:
+                raise call["error"]
+            return call["result"], True
+        try:
+            call["result"] = fn()
+        except BaseException as e:
+            call["error"] = e
+            raise
+        finally:
+            with self._lock:
+                self._calls.pop(key, None)
+            call["done"].set()
+        return call["result"], False
+
+    def in_flight(self):
+        with self._lock:
+            return {key: call["waiters"] for key, call in self._calls.items()}
+
+
+_group = SingleFlight()
+
+
+def _normalize(value):
+    if isinstance(value, str):
+        return " ".join(value.split())
+    if isinstance(value, dict):
+        return {k: _normalize(v) for k, v in value.items()}
+    if isinstance(value, list):
+        return [_normalize(v) for v in value]
+    return value
+
+
+def request_key(endpoint, body):
+    try:
+        data = json.loads(body or b"{}")
+    except ValueError:
+        return None
+    if isinstance(data, dict):
+        data = {k: v for k, v in data.items() if k not in NON_SEMANTIC_FIELDS}
+    normalized = json.dumps(_normalize(data), sort_keys=True, separators=(",", ":"))
+    return endpoint, normalized, index_store.current_version()
+
+
+def _frozen(response):
+    headers = {name: value for name, value in response.items() if name.lower() not in PER_REQUEST_HEADERS}
+    return response.status_code, response.content, headers
+
+
+def _thaw(frozen):
+    status, content, headers = frozen
+    response = HttpResponse(content, status=status)
+    for name, value in headers.items():
+        response[name] = value
+    return response
+
+
+# View decorator for JSON POST endpoints. Each caller gets its own copy of the
+# shared response so middleware never sees one response object twice.
+def coalesce_requests(endpoint):
+    def decorator(view):
+        @functools.wraps(view)
+        def wrapper(request, *args, **kwargs):
+            if not settings.REQUEST_COALESCING or request.method != "POST":
+                return view(request, *args, **kwargs)
+            key = request_key(endpoint, request.body)
+            if key is None:
+                return view(request, *args, **kwargs)
+            frozen, shared = _group.do(key, lambda: _frozen(view(request, *args, **kwargs)))
+            metrics.incr(f"coalesce.{endpoint}.{'shared' if shared else 'executed'}")
+            tracing.annotate(coalesced=shared)
+            return _thaw(frozen)
+
+        return wrapper
+
+    return decorator
+
+
+# Per endpoint: requests currently running and duplicates waiting on them.
+def stats():
+    report = {}
+    for (endpoint, _, _), waiters in _group.in_flight().items():
+        entry = report.setdefault(endpoint, {"running": 0, "waiting": 0})
+        entry["running"] += 1
+        entry["waiting"] += waiters
+    return report
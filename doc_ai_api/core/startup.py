@@ -0,0 +1,159 @@
+import logging
+import os
+import sys
+import threading
+import time
+
+from django.conf import settings
+
+from . import models
+from . import question_bank
+from . import sections
+from . import vectorstores
+
+logger = logging.getLogger(__name__)
+
+
+# Components reported by the readiness endpoint. "vectorstore" may legitimately be
+# "empty" (nothing ingested yet) and still count as warm.
+COMPONENTS = ("llm", "embeddings", "chains", "vectorstore", "rag_graph")
+READY_STATES = ("ready", "empty")
+
+_status_lock = threading.Lock()
+_component_status = {name: {"state": "pending", "detail": None, "updated_at": None} for name in COMPONENTS}
+_startup_lock = threading.Lock()
+_warmup_thread = None
+_started_at = time.time()
+
+
+def set_component_status(name, state, detail=None):
+    with _status_lock:
+        _component_status[name] = {"state": state, "detail": detail, "updated_at": time.time()}
+
+
+def component_status():
+    with _status_lock:
+        return {name: dict(status) for name, status in _component_status.items()}
+
+
+def is_ready():
+    return all(status["state"] in READY_STATES for status in component_status().values())
+
+
+def is_warming():
+    return _warmup_thread is not None and _warmup_thread.is_alive()
+
+
+def readiness_report():
+    components = component_status()
+    return {
+        "ready": all(status["state"] in READY_STATES for status in components.values()),
+        "warming": is_warming(),
+        "uptime_seconds": round(time.time() - _started_at, 3),
+        "components": components,
+    }
+
+
+# Server entry points (argv[0] basename) that serve requests from this process.
+SERVER_ENTRY_POINTS = ("gunicorn", "uvicorn", "daphne", "hypercorn", "uwsgi", "waitress-serve")
+
+
+def should_run_startup():
+    if settings.DOC_AI_RUN_STARTUP is not None:
+        return settings.DOC_AI_RUN_STARTUP in ("1", "true", "yes", "on")
+    argv = sys.argv
+    if not argv:
+        return False
+    program = os.path.basename(argv[0])
+    if program.endswith(".py"):
+        program = program[:-3]
+    if program == "__main__":  # python -m gunicorn
+        program = os.path.basename(os.path.dirname(argv[0]))
+    if program in SERVER_ENTRY_POINTS:
+        return True
+    # manage.py / django-admin: only runserver serves requests. The autoreloader
+    # parent of `runserver` only watches files; the child (RUN_MAIN=true) serves.
+    # Other management commands initialize what they need themselves.
+    if len(argv) < 2 or argv[1] != "runserver":
+        return False
+    if "--noreload" in argv:
+        return True
+    return os.environ.get("RUN_MAIN") == "true"
+
+
+def load_persisted_retriever():
+    backend = settings.VECTOR_STORE_BACKEND
+    store_dir = vectorstores.rag_store_directory()
+    if not vectorstores.has_persisted_store(store_dir):
+        logger.info("No live %s index version found under %s or it's empty. Retriever will be None initially.", backend, settings.RAG_INDEX_ROOT)
+        vectorstores.load_current_retriever()
+        set_component_status("vectorstore", "empty")
+        return False
+
+    set_component_status("vectorstore", "loading")
+    try:
+        logger.info("Loading existing %s vector store from %s on startup...", backend, store_dir)
+        vectorstores.load_current_retriever()
+        logger.info("Existing vector store loaded and retriever created on startup.")
+        set_component_status("vectorstore", "ready")
+        return True
+    except Exception as e:
+        from ..rag_processing import graph
+
+        logger.error("Error loading existing vector store on startup: %s", e)
+        graph.retriever_rag = None
+        set_component_status("vectorstore", "failed", str(e))
+        return False
+
+
+def run_startup():
+    from ..rag_processing import graph
+
+    with _startup_lock:
+        started = time.perf_counter()
+        for name in ("llm", "embeddings", "chains"):
+            set_component_status(name, "loading")
+
+        models_initialized_successfully = models.initialize_core_models_and_chains()
+
+        set_component_status("llm", "ready" if models.llm is not None else "failed")
+        set_component_status("embeddings", "ready" if models.embeddings is not None else "failed")
+        set_component_status("chains", "ready" if models_initialized_successfully else "failed")
+
+        if not models_initialized_successfully:
+            logger.warning("Skipping RAG graph compilation due to model initialization failure.")
+            set_component_status("vectorstore", "failed", "model initialization failed")
+            set_component_status("rag_graph", "failed", "model initialization failed")
+            return False
+
+        load_persisted_retriever()
+        # Resumes section summaries and question bank builds an earlier process did not finish.
+        sections.schedule_summaries()
+        question_bank.schedule_build()
+
+        set_component_status("rag_graph", "loading")
+        if graph.compile_rag_workflow(render_diagram=settings.RAG_RENDER_WORKFLOW_GRAPH):
+            set_component_status("rag_graph", "ready")
+        else:
+            set_component_status("rag_graph", "failed")
+
+        logger.info("Startup sequence finished in %.2fs.", time.perf_counter() - started)
+        return is_ready()
+
+
+def _warmup_worker():
+    try:
+        run_startup()
+        logger.info("Django app 'doc_ai_api' background warmup finished.")
+    except Exception as e:
+        logger.exception("Background warmup crashed: %s", e)
+
+
+def start_background_warmup():
+    global _warmup_thread
+    if _warmup_thread is not None and _warmup_thread.is_alive():
+        return _warmup_thread
+
+    _warmup_thread = threading.Thread(target=_warmup_worker, name="doc-ai-warmup", daemon=True)
+    _warmup_thread.start()
+    return _warmup_thread
@@ -0,0 +1,167 @@
+import hashlib
+import math
+import re
+import time
+from typing import Any, List, Optional
+
+from langchain_core.embeddings import Embeddings
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import AIMessage
+from langchain_core.outputs import ChatGeneration, ChatResult
+
+from . import metrics
+
+
+# Deterministic offline stand-ins for Ollama and HuggingFace, used by the benchmark
+# suite and by LLM_BACKEND/EMBEDDING_BACKEND="stub". Responses are derived from the
+# prompt text so the graph takes realistic routes without a model.
+
+_WORD_RE = re.compile(r"[a-z0-9]+")
+_SENTENCE_RE = re.compile(r"(?<=[.!?])\s+")
+_WEB_HINTS = ("nobel", "prize", "cost", "price", "weather", "news", "latest", "today", "current", "who won", "stock")
+_STOPWORDS = frozenset(
+    "a an and are as at be by for from how in is it its of on or that the this to was what when where which who why with "
+    "main mentioned does do explain describe".split()
+)
+
+
+def _words(text):
+    return [w for w in _WORD_RE.findall(text.lower()) if w not in _STOPWORDS and len(w) > 2]
+
+
+def _section(prompt, start_marker, end_markers):
+    start = prompt.find(start_marker)
+    if start == -1:
+        return ""
+    start += len(start_marker)
+    end = len(prompt)
+    for marker in end_markers:
+        idx = prompt.find(marker, start)
+        if idx != -1:
+            end = min(end, idx)
+    return prompt[start:end].strip()
+
+
+def _first_sentences(text, count):
+    sentences = [s.strip() for s in _SENTENCE_RE.split(" ".join(text.split())) if len(s.strip()) > 20]
+    return sentences[:count]
+
+
+def approximate_tokens(text):
+    return max(1, len(text) // 4)
+
+
+def stub_completion(prompt):
+    if "query classification assistant" in prompt:
+        question = _section(prompt, "User question:", ["Classification:"]).lower()
+        return "requires_web_search" if any(hint in question for hint in _WEB_HINTS) else "document_based"
+
+    if "grader assessing" in prompt:
+        question = set(_words(_section(prompt, "User question:", [])))
+        documents = set(_words(_section(prompt, "Retrieved documents:", ["User question:"])))
+        return "yes" if question & documents else "no"
+
+    if "query optimization assistant" in prompt:
+        question = _section(prompt, "Original question:", ["Rephrased question:"])
+        return f"Explain the concept and definition of {question.rstrip('?')}"
+
+    if "critiquing a generated answer" in prompt:
+        generation = _section(prompt, "Generated Answer:", ["---"])
+        return "PASS" if len(generation) > 40 else "FAIL"
+
+    if "summarization assistant" in prompt:
+        excerpts = _section(prompt, "Document Excerpts:", ["Concise Summary:"])
+        return " ".join(_first_sentences(excerpts, 4)) or "No relevant information."
+
+    if "study assistant" in prompt:
+        topic = _section(prompt, 'especially related to the topic: "', ['".'])
+        count_match = re.search(r"Generate (\d+) distinct questions", prompt)
+        count = int(count_match.group(1)) if count_match else 3
+        excerpt = _section(prompt, "Text Excerpt:", ["Study Questions"])
+        facts = _first_sentences(excerpt, count) or [topic]
+        return "\n".join(
+            f"{i + 1}. Based on the text, explain: {facts[i % len(facts)][:120]}" for i in range(count)
+        )
+
+    if "concise and informative summary" in prompt:
+        excerpts = _section(prompt, "Text Excerpts:", ["Summary Notes"])
+        return "\n".join(f"- {sentence}" for sentence in _first_sentences(excerpts, 6)) or "- No content."
+
+    if "Context:" in prompt and "Question:" in prompt:
+        context = _section(prompt, "Context:", ["Answer:"])
+        sentences = _first_sentences(context, 3)
+        if sentences:
+            return " ".join(sentences)
+        return "I don't have enough information from the provided text."
+
+    return "I am a deterministic stub model used for offline testing and benchmarks."
+
+
+def simulate_latency(latency_ms, ms_per_token, output_text):
+    delay_ms = latency_ms + ms_per_token * approximate_tokens(output_text)
+    if delay_ms > 0:
+        time.sleep(delay_ms / 1000.0)
+
+
+class StubChatModel(BaseChatModel):
+    latency_ms: float = 0.0
+    ms_per_token: float = 0.0
+
+    @property
+    def _llm_type(self) -> str:
+        return "stub-chat"
+
+    def _generate(
+        self,
+        messages: List[Any],
+        stop: Optional[List[str]] = None,
+        run_manager: Any = None,
+        **kwargs: Any,
+    ) -> ChatResult:
+        prompt = "\n".join(str(message.content) for message in messages)
+        text = stub_completion(prompt)
+        # Honours the same per-call limits as Ollama's options.
+        options = kwargs.get("options") or {}
+        for token in stop or options.get("stop") or []:
+            if token and token in text:
+                text = text[: text.index(token)]
+        if options.get("num_predict", 0) > 0:
+            text = text[: options["num_predict"] * 4]
+        simulate_latency(self.latency_ms, self.ms_per_token, text)
+        metrics.incr("llm.calls")
+        usage = {
+            "input_tokens": approximate_tokens(prompt),
+            "output_tokens": approximate_tokens(text),
+            "total_tokens": approximate_tokens(prompt) + approximate_tokens(text),
+        }
+        message = AIMessage(content=text, usage_metadata=usage)
+        return ChatResult(generations=[ChatGeneration(message=message)])
+
+
+class StubEmbeddings(Embeddings):
+    # Signed feature hashing of unigrams and bigrams: similar texts get similar
+    # vectors, so retrieval quality is meaningful in benchmarks.
+    def __init__(self, dimensions=384, latency_ms=0.0):
+        self.dimensions = dimensions
+        self.latency_ms = latency_ms
+
+    def _embed(self, text):
+        vector = [0.0] * self.dimensions
+        words = _WORD_RE.findall(text.lower())
+        features = words + [f"{a} {b}" for a, b in zip(words, words[1:])]
+        for feature in features:
+            digest = hashlib.md5(feature.encode("utf-8")).digest()
+            bucket = int.from_bytes(digest[:4], "little") % self.dimensions
+            vector[bucket] += 1.0 if digest[4] & 1 else -1.0
+        norm = math.sqrt(sum(v * v for v in vector)) or 1.0
+        return [v / norm for v in vector]
+
+    def embed_documents(self, texts):
+        if self.latency_ms > 0:
+            time.sleep(self.latency_ms / 1000.0)
+        metrics.incr("embedding.calls")
+        metrics.incr("embedding.texts", len(texts))
+        return [self._embed(text) for text in texts]
+
+    def embed_query(self, text):
+        return self.embed_documents([text])[0]
@@ -0,0 +1,201 @@
+import contextvars
+import functools
+import json
+import logging
+import logging.handlers
+import os
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+
+# Per-request tracing. A trace is a flat list of spans (graph nodes, chain calls,
+# retrieval, web search) with parent links, start offsets and attributes, enough
+# to draw a waterfall of where a slow request spent its time. The active trace
+# and span live in context variables, so LangGraph branches and batch workers
+# (which copy the context) attach their spans to the right request. Outside a
+# traced request, span() does nothing.
+_current_trace = contextvars.ContextVar("trace", default=None)
+_current_span = contextvars.ContextVar("trace_span", default=None)
+
+_writer_lock = threading.Lock()
+_writer = None
+
+
+class Trace:
+    def __init__(self, name, attributes=None):
+        self.trace_id = uuid.uuid4().hex
+        self.name = name
+        self.attributes = dict(attributes or {})
+        self.started_at = time.time()
+        self._started = time.perf_counter()
+        self.duration_ms = None
+        self.spans = []
+        self._lock = threading.Lock()
+
+    def offset_ms(self):
+        return (time.perf_counter() - self._started) * 1000.0
+
+    def add_span(self, span):
+        with self._lock:
+            self.spans.append(span)
+
+    def to_dict(self):
+        with self._lock:
+            spans = sorted(self.spans, key=lambda span: span["start_ms"])
+        return {
+            "trace_id": self.trace_id,
+            "name": self.name,
+            "started_at": self.started_at,
+            "duration_ms": round(self.duration_ms, 3) if self.duration_ms is not None else None,
+            "attributes": self.attributes,
+            "spans": spans,
+        }
+
+
+class _Span:
+    def __init__(self, trace, name, attributes):
+        self.trace = trace
+        self.record = {
+            "id": uuid.uuid4().hex[:12],
+            "parent": _current_span.get(),
+            "name": name,
+            "start_ms": round(trace.offset_ms(), 3),
+            "duration_ms": None,
+            "attributes": dict(attributes),
+        }
+
+    def set(self, **attributes):
+        self.record["attributes"].update(attributes)
+
+
+class _NoopSpan:
+    def set(self, **attributes):
+        pass
+
+
+_NOOP_SPAN = _NoopSpan()
+
+
+@contextmanager
+def span(name, **attributes):
+    trace = _current_trace.get()
+    if trace is None:
+        yield _NOOP_SPAN
+        return
+    current = _Span(trace, name, attributes)
+    token = _current_span.set(current.record["id"])
+    try:
+        yield current
+    except BaseException as e:
+        current.record["error"] = f"{type(e).__name__}: {e}"
+        raise
+    finally:
+        _current_span.reset(token)
+        current.record["duration_ms"] = round(trace.offset_ms() - current.record["start_ms"], 3)
+        trace.add_span(current.record)
+
+
+# Adds attributes to the request's root (e.g. coalesced=True).
+def annotate(**attributes):
+    trace = _current_trace.get()
+    if trace is not None:
+        trace.attributes.update(attributes)
+
+
+def _trace_writer():
+    global _writer
+    with _writer_lock:
+        if _writer is None:
+            path = settings.TRACE_LOG_PATH
+            os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+            handler = logging.handlers.RotatingFileHandler(
+                path, maxBytes=settings.TRACE_LOG_MAX_BYTES, backupCount=settings.TRACE_LOG_BACKUPS, encoding="utf-8"
+            )
+            handler.setFormatter(logging.Formatter("%(message)s"))
+            _writer = logging.getLogger("doc_ai_api.traces")
+            _writer.propagate = False
+            _writer.setLevel(logging.INFO)
+            _writer.addHandler(handler)
+        return _writer
+
+
+def _write(trace_dict):
+    if not settings.TRACE_LOG_PATH or trace_dict["duration_ms"] < settings.TRACE_LOG_MIN_DURATION_MS:
+        return
+    try:
+        _trace_writer().info(json.dumps(trace_dict, default=str))
+    except OSError as e:
+        logger.warning("Could not write trace to %s: %s", settings.TRACE_LOG_PATH, e)
+
+
+@contextmanager
+def start_trace(name, **attributes):
+    trace = Trace(name, attributes)
+    trace_token = _current_trace.set(trace)
+    span_token = _current_span.set(None)
+    try:
+        yield trace
+    finally:
+        _current_span.reset(span_token)
+        _current_trace.reset(trace_token)
+        trace.duration_ms = trace.offset_ms()
+
+
+def _wants_debug(request):
+    if request.content_type != "application/json":
+        return False
+    try:
+        return json.loads(request.body or b"{}").get("debug") is True
+    except (ValueError, AttributeError):
+        return False
+
+
+# View decorator: traces the request, appends the trace to TRACE_LOG_PATH and,
+# when the JSON body has "debug": true, returns it inline under "trace".
+def traced(endpoint):
+    def decorator(view):
+        @functools.wraps(view)
+        def wrapper(request, *args, **kwargs):
+            if not settings.TRACING_ENABLED or request.method != "POST":
+                return view(request, *args, **kwargs)
+            with start_trace(endpoint) as trace:
+                response = view(request, *args, **kwargs)
+            trace.attributes["status"] = response.status_code
+            trace_dict = trace.to_dict()
+            _write(trace_dict)
+            response["X-Trace-Id"] = trace.trace_id
+            if _wants_debug(request) and not response.streaming and response.get("Content-Type", "").startswith("application/json"):
+                payload = json.loads(response.content)
+                payload["trace"] = trace_dict
+                response.content = json.dumps(payload, default=str)
+            return response
+
+        return wrapper
+
+    return decorator
+
+
+# Graph node wrapper: one span per node execution, tagged with the attempt
+# number on the way in and with list sizes and short labels it changed.
+def traced_node(node_name, node_fn):
+    @functools.wraps(node_fn)
+    def wrapper(state):
+        with span(f"node.{node_name}", attempt=state.get("attempt_count")) as node_span:
+            result = node_fn(state)
+            if isinstance(result, dict):
+                for key, value in result.items():
+                    if key in state and state[key] is value:
+                        continue
+                    if isinstance(value, list):
+                        node_span.set(**{f"{key}_count": len(value)})
+                    elif isinstance(value, (bool, int)) or (isinstance(value, str) and len(value) <= 40):
+                        node_span.set(**{key: value})
+            return result
+
+    return wrapper
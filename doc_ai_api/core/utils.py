@@ -1,5 +1,5 @@
+import logging
 import os
-import traceback
 from PyPDF2 import PdfReader
 from django.conf import settings as config
 
@@ -7,8 +7,8 @@ from PIL import Image, ImageDraw, ImageFont
 import textwrap
 
 import json
-from dotenv import load_dotenv  
-from googleapiclient.discovery import build  
+
+logger = logging.getLogger(__name__)
 
 
 # Simple cleaning for this specific task(To be impoved upon)
@@ -56,6 +56,17 @@ def clean_text(text):
 
 
 
+def extract_pdf_text(pdf_path):
+    text = ""
+    with open(pdf_path, "rb") as f:
+        reader = PdfReader(f)
+        for page in reader.pages:
+            page_text = page.extract_text()
+            if page_text:
+                text += page_text + "\n"
+    return text
+
+
 def convert_pdf_to_text_util(pdf_file):
     if pdf_file is None:
         return "Please upload a PDF file.", None
@@ -67,17 +78,11 @@ def convert_pdf_to_text_util(pdf_file):
         base_name, _ = os.path.splitext(file_name)
         output_text_path = os.path.join(config.PDF_TEMP_DIR, f"{base_name}.txt")
 
-        print(f"Converting PDF: {pdf_path} to {output_text_path}")
-        text = ""
-        with open(pdf_path, "rb") as f:
-            reader = PdfReader(f)
-            for page in reader.pages:
-                page_text = page.extract_text()
-                if page_text:
-                    text += page_text + "\n"
+        logger.info("Converting PDF: %s to %s", pdf_path, output_text_path)
+        text = extract_pdf_text(pdf_path)
 
         if not text.strip():
-            print("Extracted text is empty or only whitespace.")
+            logger.warning("Extracted text is empty or only whitespace.")
             return (
                 "Error: Could not extract text from the PDF. It might be an image-based PDF without OCR.",
                 None,
@@ -86,15 +91,14 @@ def convert_pdf_to_text_util(pdf_file):
         with open(output_text_path, "w", encoding="utf-8") as f:
             f.write(text)
 
-        print(f"Successfully converted PDF to text: {output_text_path}")
+        logger.info("Successfully converted PDF to text: %s", output_text_path)
         return (
             f"Successfully converted '{file_name}' to text. Text file saved temporarily as '{os.path.basename(output_text_path)}'.",
             output_text_path,
         )
 
     except Exception as e:
-        error_message = f"Error during PDF conversion: {e}\n{traceback.format_exc()}"
-        print(error_message)
+        logger.exception("Error during PDF conversion: %s", e)
         return f"An error occurred during conversion: {e}", None
 
 
@@ -112,20 +116,16 @@ def render_text_with_custom_handwriting(
 ):
     
     if not os.path.exists(custom_font_path):
-        print(f"Error: Custom font file not found at '{custom_font_path}'.")
-        print("Please ensure CUSTOM_HANDWRITING_FONT_PATH in config.py is correct.")
+        logger.error("Custom font file not found at '%s'. Please ensure CUSTOM_HANDWRITING_FONT_PATH is correct.", custom_font_path)
         return False
 
     try:
         font = ImageFont.truetype(custom_font_path, font_size)
     except IOError:
-        print(f"Error: Could not load font from '{custom_font_path}'.")
-        print(
-            "Please ensure the font file exists and the path is correct, and it's a valid TTF file."
-        )
+        logger.error("Could not load font from '%s'. Please ensure it is a valid TTF file.", custom_font_path)
         return False
     except Exception as e:
-        print(f"An unexpected error occurred loading font: {e}")
+        logger.error("An unexpected error occurred loading font: %s", e)
         return False
 
     avg_char_width_estimate = font_size * 0.55
@@ -141,7 +141,7 @@ def render_text_with_custom_handwriting(
             )
 
     if not wrapped_lines:
-        print("No text to render for handwriting.")
+        logger.info("No text to render for handwriting.")
         return False
 
     line_height = int(font_size * line_spacing_factor)
@@ -165,47 +165,8 @@ def render_text_with_custom_handwriting(
 
     try:
         img.save(output_image_path)
-        print(
-            f"Text rendered to image successfully! Output saved to: '{output_image_path}'"
-        )
+        logger.info("Text rendered to image successfully! Output saved to: '%s'", output_image_path)
         return True
     except Exception as e:
-        print(f"Error saving image: {e}")
+        logger.error("Error saving image: %s", e)
         return False
-
-
-def _google_custom_search_raw(query: str, num_results: int = 5):
-    load_dotenv()  
-
-    api_key = os.getenv("GOOGLE_API_KEY")
-    cse_id = os.getenv("GOOGLE_CSE_ID")
-
-    if not api_key or not cse_id:
-        return "Error: GOOGLE_API_KEY or GOOGLE_CSE_ID not found in .env file. Google Custom Search is disabled."
-
-    try:
-        service = build("customsearch", "v1", developerKey=api_key)
-
-        res = service.cse().list(q=query, cx=cse_id, num=num_results).execute()
-
-        if "items" in res and res["items"]:
-            formatted_results = []
-            for i, item in enumerate(res["items"]):
-                title = item.get("title", "N/A")
-                link = item.get("link", "N/A")
-                snippet = item.get("snippet", "N/A")
-                formatted_results.append(
-                    f"Title: {title}\nLink: {link}\nSnippet: {snippet}"
-                )
-            return "\n\n---\n\n".join(formatted_results)
-        else:
-            return "No relevant search results found."
-
-    except Exception as e:
-        return f"An error occurred during Google Custom Search: {e}. Ensure API key and CSE ID are correct and billing is enabled."
-
-
-def google_custom_search_tool_wrapper(query: str) -> str:
-    return _google_custom_search_raw(
-        query, num_results=5
-    )  
@@ -0,0 +1,292 @@
+import json
+import os
+import threading
+import uuid
+
+import numpy as np
+from langchain_core.documents import Document
+from langchain_core.vectorstores import VectorStore
+
+
+MANIFEST_FILE = "manifest.json"
+EMBEDDINGS_FILE = "embeddings.f32"
+METADATA_FILE = "meta.jsonl"
+FORMAT_VERSION = 1
+QUANTIZATIONS = ("none", "int8", "binary")
+CODE_FILES = {"int8": "codes.int8", "binary": "codes.binary"}
+INT8_SCALES_FILE = "scales.f32"
+DEFAULT_RESCORE_MULTIPLIER = 10
+# Rows per block when scanning codes, so int8 -> float32 temporaries stay small.
+BLOCK_ROWS = 4096
+
+
+def _normalize(matrix):
+    matrix = np.asarray(matrix, dtype=np.float32)
+    norms = np.linalg.norm(matrix, axis=-1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return matrix / norms
+
+
+def _int8_codes(vectors):
+    # Symmetric per-row scale: each row's largest component maps to +/-127.
+    scales = np.abs(vectors).max(axis=1) / 127.0
+    scales[scales == 0] = 1.0
+    codes = np.clip(np.rint(vectors / scales[:, None]), -127, 127).astype(np.int8)
+    return codes, scales.astype(np.float32)
+
+
+def _binary_codes(vectors):
+    return np.packbits(vectors > 0, axis=1)
+
+
+def _write_json_atomic(path, payload):
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(payload, f)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+
+
+# Exact-search vector store over a memory-mapped float32 matrix of L2-normalized
+# embeddings (one row per chunk) plus a JSONL file of chunk text and metadata.
+# Adds are append-only: rows are appended to both files first and the manifest's
+# row count is rewritten last, so a crash mid-add leaves the previous index intact.
+# Opening only maps the matrix, so load time does not grow with the corpus.
+#
+# With quantization="int8" or "binary", compact codes of every row are held in
+# RAM and scanned first; only the best k * rescore_multiplier rows are then read
+# from the full-precision matrix on disk and rescored exactly. Codes are derived
+# data: they are appended alongside new rows and rebuilt on open if missing.
+class MmapVectorStore(VectorStore):
+    def __init__(self, persist_directory, embedding_function, quantization="none",
+                 rescore_multiplier=DEFAULT_RESCORE_MULTIPLIER):
+        if quantization not in QUANTIZATIONS:
+            raise ValueError(f"Unknown quantization '{quantization}'. Expected one of: {', '.join(QUANTIZATIONS)}.")
+        self.persist_directory = persist_directory
+        self.embedding_function = embedding_function
+        self.quantization = quantization
+        self.rescore_multiplier = max(1, rescore_multiplier)
+        self._write_lock = threading.Lock()
+        os.makedirs(persist_directory, exist_ok=True)
+        self._load()
+
+    @property
+    def embeddings(self):
+        return self.embedding_function
+
+    def _path(self, name):
+        return os.path.join(self.persist_directory, name)
+
+    def _read_manifest(self):
+        try:
+            with open(self._path(MANIFEST_FILE), "r", encoding="utf-8") as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return {"format_version": FORMAT_VERSION, "dim": None, "count": 0, "metadata_bytes": 0}
+
+    def _load(self):
+        manifest = self._read_manifest()
+        count, dim = manifest["count"], manifest["dim"]
+        if count:
+            matrix = np.memmap(self._path(EMBEDDINGS_FILE), dtype=np.float32, mode="r", shape=(count, dim))
+        else:
+            matrix = np.zeros((0, dim or 0), dtype=np.float32)
+
+        records = []
+        if count:
+            # Lines are parsed lazily in _to_document; only top-k hits are ever decoded.
+            with open(self._path(METADATA_FILE), "rb") as f:
+                records = f.read(manifest.get("metadata_bytes") or -1).splitlines()[:count]
+        codes = self._load_codes(matrix) if count and self.quantization != "none" else None
+        # Swapped as one tuple so concurrent searches always see a consistent index.
+        self._index = (manifest, matrix, records, codes)
+
+    def _encode(self, vectors):
+        if self.quantization == "int8":
+            return _int8_codes(vectors)
+        return _binary_codes(vectors), None
+
+    def _code_width(self, dim):
+        return dim if self.quantization == "int8" else (dim + 7) // 8
+
+    def _load_codes(self, matrix):
+        count, dim = matrix.shape
+        codes_path = self._path(CODE_FILES[self.quantization])
+        scales_path = self._path(INT8_SCALES_FILE)
+        width = self._code_width(dim)
+        expected = count * width
+        if not os.path.exists(codes_path) or os.path.getsize(codes_path) < expected or (
+            self.quantization == "int8" and (not os.path.exists(scales_path) or os.path.getsize(scales_path) < count * 4)
+        ):
+            self._write_codes(matrix)
+        dtype = np.int8 if self.quantization == "int8" else np.uint8
+        # Read into RAM (not mapped): the codes are the resident part of the index.
+        codes = np.fromfile(codes_path, dtype=dtype, count=expected).reshape(count, width)
+        scales = np.fromfile(scales_path, dtype=np.float32, count=count) if self.quantization == "int8" else None
+        return codes, scales
+
+    def _write_codes(self, matrix, append=False):
+        mode = "ab" if append else "wb"
+        with open(self._path(CODE_FILES[self.quantization]), mode) as codes_file:
+            scales_file = open(self._path(INT8_SCALES_FILE), mode) if self.quantization == "int8" else None
+            try:
+                for offset in range(0, len(matrix), BLOCK_ROWS):
+                    codes, scales = self._encode(np.asarray(matrix[offset:offset + BLOCK_ROWS]))
+                    codes_file.write(codes.tobytes())
+                    if scales_file is not None:
+                        scales_file.write(scales.tobytes())
+            finally:
+                if scales_file is not None:
+                    scales_file.close()
+
+    def index_memory_bytes(self):
+        _, matrix, _, codes = self._index
+        if codes is None:
+            return matrix.nbytes
+        return codes[0].nbytes + (codes[1].nbytes if codes[1] is not None else 0)
+
+    def __len__(self):
+        return self._index[0]["count"]
+
+    def _truncate_to_manifest(self, manifest):
+        # Drops rows left behind by an add that crashed before updating the manifest.
+        count, dim = manifest["count"], manifest["dim"] or 0
+        sizes = [(EMBEDDINGS_FILE, count * dim * 4), (METADATA_FILE, manifest.get("metadata_bytes", 0))]
+        if self.quantization != "none":
+            sizes.append((CODE_FILES[self.quantization], count * self._code_width(dim)))
+            if self.quantization == "int8":
+                sizes.append((INT8_SCALES_FILE, count * 4))
+        for name, size in sizes:
+            path = self._path(name)
+            if os.path.exists(path) and os.path.getsize(path) != size:
+                with open(path, "r+b") as f:
+                    f.truncate(size)
+
+    def add_texts(self, texts, metadatas=None, ids=None, **kwargs):
+        texts = list(texts)
+        if not texts:
+            return []
+        return self.add_embeddings(texts, self.embedding_function.embed_documents(texts), metadatas=metadatas, ids=ids)
+
+    # Appends rows whose embeddings were computed elsewhere (e.g. a snapshot import).
+    def add_embeddings(self, texts, embeddings, metadatas=None, ids=None):
+        texts = list(texts)
+        if not texts:
+            return []
+        metadatas = list(metadatas) if metadatas is not None else [{} for _ in texts]
+        ids = list(ids) if ids is not None else [uuid.uuid4().hex for _ in texts]
+        vectors = _normalize(embeddings)
+
+        with self._write_lock:
+            manifest = self._read_manifest()
+            if manifest["dim"] is not None and manifest["dim"] != vectors.shape[1]:
+                raise ValueError(
+                    f"Embedding dimension {vectors.shape[1]} does not match index dimension {manifest['dim']} "
+                    f"at {self.persist_directory}."
+                )
+            self._truncate_to_manifest(manifest)
+
+            with open(self._path(EMBEDDINGS_FILE), "ab") as f:
+                f.write(vectors.tobytes())
+                f.flush()
+                os.fsync(f.fileno())
+            metadata_lines = "".join(
+                json.dumps({"id": doc_id, "text": text, "metadata": metadata or {}}) + "\n"
+                for doc_id, text, metadata in zip(ids, texts, metadatas)
+            ).encode("utf-8")
+            with open(self._path(METADATA_FILE), "ab") as f:
+                f.write(metadata_lines)
+                f.flush()
+                os.fsync(f.fileno())
+            if self.quantization != "none" and self._index[3] is not None:
+                self._write_codes(vectors, append=True)
+
+            manifest.update(
+                dim=int(vectors.shape[1]),
+                count=manifest["count"] + len(texts),
+                metadata_bytes=manifest.get("metadata_bytes", 0) + len(metadata_lines),
+            )
+            _write_json_atomic(self._path(MANIFEST_FILE), manifest)
+            self._load()
+        return ids
+
+    # Yields (ids, texts, metadatas, vectors) in insertion order, batch_size rows at a time.
+    def iter_records(self, batch_size=1000):
+        manifest, matrix, records, _ = self._index
+        for offset in range(0, manifest["count"], batch_size):
+            rows = [json.loads(line) for line in records[offset:offset + batch_size]]
+            yield (
+                [row["id"] for row in rows],
+                [row["text"] for row in rows],
+                [row.get("metadata") or {} for row in rows],
+                np.asarray(matrix[offset:offset + len(rows)]),
+            )
+
+    @staticmethod
+    def _best_rows(scores, k):
+        if k < len(scores):
+            return np.argpartition(-scores, k - 1)[:k]
+        return np.arange(len(scores))
+
+    def _approximate_scores(self, codes, query):
+        code_matrix, scales = codes
+        scores = np.empty(len(code_matrix), dtype=np.float32)
+        if self.quantization == "int8":
+            for offset in range(0, len(code_matrix), BLOCK_ROWS):
+                block = code_matrix[offset:offset + BLOCK_ROWS].astype(np.float32)
+                scores[offset:offset + BLOCK_ROWS] = (block @ query) * scales[offset:offset + BLOCK_ROWS]
+            return scores
+        # Asymmetric scoring: the full-precision query against +/-1 sign codes,
+        # i.e. 2 * (query . bits) - sum(query). Ranks better than Hamming distance.
+        dim = len(query)
+        query_sum = query.sum()
+        for offset in range(0, len(code_matrix), BLOCK_ROWS):
+            bits = np.unpackbits(code_matrix[offset:offset + BLOCK_ROWS], axis=1, count=dim).astype(np.float32)
+            scores[offset:offset + BLOCK_ROWS] = 2.0 * (bits @ query) - query_sum
+        return scores
+
+    def _top_k(self, query_vector, k):
+        _, matrix, records, codes = self._index
+        if not records or k <= 0:
+            return []
+        query = _normalize(query_vector).reshape(-1)
+        k = min(k, len(records))
+        if codes is None:
+            rows = np.arange(len(records))
+            scores = matrix @ query
+        else:
+            rows = self._best_rows(self._approximate_scores(codes, query), k * self.rescore_multiplier)
+            rows.sort()
+            scores = np.asarray(matrix[rows]) @ query
+        top = self._best_rows(scores, k)
+        top = top[np.argsort(-scores[top], kind="stable")]
+        return [(int(rows[i]), float(scores[i])) for i in top]
+
+    def _to_document(self, row):
+        record = json.loads(self._index[2][row])
+        return Document(page_content=record["text"], metadata=dict(record["metadata"]), id=record["id"])
+
+    def similarity_search_with_score_by_vector(self, embedding, k=4, **kwargs):
+        return [(self._to_document(row), score) for row, score in self._top_k(embedding, k)]
+
+    def similarity_search_by_vector(self, embedding, k=4, **kwargs):
+        return [document for document, _ in self.similarity_search_with_score_by_vector(embedding, k)]
+
+    def similarity_search_with_score(self, query, k=4, **kwargs):
+        return self.similarity_search_with_score_by_vector(self.embedding_function.embed_query(query), k)
+
+    def similarity_search(self, query, k=4, **kwargs):
+        return [document for document, _ in self.similarity_search_with_score(query, k)]
+
+    def _select_relevance_score_fn(self):
+        # Scores are cosine similarities of normalized vectors.
+        return lambda score: max(0.0, score)
+
+    @classmethod
+    def from_texts(cls, texts, embedding, metadatas=None, ids=None, persist_directory=None, **kwargs):
+        if persist_directory is None:
+            raise ValueError("MmapVectorStore requires a persist_directory.")
+        store = cls(persist_directory, embedding)
+        store.add_texts(texts, metadatas=metadatas, ids=ids)
+        return store
@@ -0,0 +1,142 @@
+import logging
+import os
+
+import numpy as np
+from django.conf import settings
+
+from . import index_store, models
+
+logger = logging.getLogger(__name__)
+
+
+# Vector store backends for the RAG index, selected by VECTOR_STORE_BACKEND:
+# "chroma" (persistent Chroma client) or "mmap" (MmapVectorStore, exact search
+# over a memory-mapped matrix). Everything that opens, resets or queries the RAG
+# index goes through here so the backends stay interchangeable. Which on-disk
+# directory is live is decided by index_store.
+BACKENDS = ("chroma", "mmap")
+RETRIEVER_K = 3
+
+_loaded_version = None
+
+
+def rag_store_directory(backend=None):
+    return index_store.current_directory(backend)
+
+
+def has_persisted_store(directory=None, backend=None):
+    directory = directory or rag_store_directory(backend)
+    return bool(directory) and os.path.isdir(directory) and bool(os.listdir(directory))
+
+
+def open_vector_store(directory=None, backend=None, embedding_function=None, quantization=None):
+    backend = backend or settings.VECTOR_STORE_BACKEND
+    directory = directory or rag_store_directory(backend)
+    embedding_function = embedding_function or models.embeddings
+    if backend == "mmap":
+        from .vector_index import MmapVectorStore
+
+        return MmapVectorStore(
+            directory,
+            embedding_function,
+            quantization=quantization or settings.VECTOR_INDEX_QUANTIZATION,
+            rescore_multiplier=settings.VECTOR_INDEX_RESCORE_MULTIPLIER,
+        )
+    if backend == "chroma":
+        from langchain_community.vectorstores import Chroma
+
+        return Chroma(persist_directory=directory, embedding_function=embedding_function)
+    raise ValueError(f"Unknown VECTOR_STORE_BACKEND '{backend}'. Expected one of: {', '.join(BACKENDS)}.")
+
+
+# Stops and forgets the Chroma client cached for directory. Chroma keeps one
+# system (SQLite connection plus segment handles) per persist directory for the
+# life of the process, so it must be dropped before the directory is deleted.
+# The mmap backend needs nothing here: open maps stay valid after unlink.
+def release_directory(directory):
+    try:
+        from chromadb.api.client import SharedSystemClient
+    except ImportError:
+        return
+    target = os.path.abspath(directory)
+    for identifier, system in list(SharedSystemClient._identifier_to_system.items()):
+        if os.path.abspath(identifier) != target:
+            continue
+        SharedSystemClient._identifier_to_system.pop(identifier, None)
+        SharedSystemClient._identifier_to_refcount.pop(identifier, None)
+        try:
+            system.stop()
+        except Exception as e:
+            logger.warning("Could not close the Chroma client for %s: %s", directory, e)
+
+
+def build_retriever(store, k=RETRIEVER_K):
+    return store.as_retriever(search_kwargs={"k": k})
+
+
+# The k nearest chunks with their cosine similarity, most similar first. The mmap
+# backend scores by cosine already; Chroma returns squared L2 distances, which
+# for normalized embeddings (the stub and sentence-transformers models) are
+# 2 - 2 * cosine.
+def similarity_search_with_similarity(store, query, k):
+    from .vector_index import MmapVectorStore
+
+    if isinstance(store, MmapVectorStore):
+        return store.similarity_search_with_score(query, k=k)
+    return [(document, 1.0 - distance / 2.0) for document, distance in store.similarity_search_with_score(query, k=k)]
+
+
+# Points the RAG graph at the live index version (or at nothing). Returns True if
+# a retriever is loaded.
+def load_current_retriever():
+    global _loaded_version
+    from ..rag_processing import graph
+
+    version = index_store.current_version()
+    directory = index_store.current_directory()
+    if not has_persisted_store(directory):
+        graph.retriever_rag = None
+        _loaded_version = version
+        return False
+    graph.retriever_rag = build_retriever(open_vector_store(directory))
+    _loaded_version = version
+    logger.info("Serving index version '%s' from %s.", version, directory)
+    return True
+
+
+# Cheap per-request check so every worker picks up a version switched by another
+# process (ingest, rollback or snapshot import).
+def sync_retriever():
+    if index_store.current_version() != _loaded_version:
+        load_current_retriever()
+
+
+# Backend-neutral access to stored rows (ids, texts, metadatas, embedding matrix),
+# used to move an index between nodes or backends without re-embedding.
+def iter_records(store, backend=None, batch_size=1000):
+    backend = backend or settings.VECTOR_STORE_BACKEND
+    if backend == "mmap":
+        yield from store.iter_records(batch_size)
+        return
+    collection = store._collection
+    for offset in range(0, collection.count(), batch_size):
+        batch = collection.get(include=["documents", "metadatas", "embeddings"], limit=batch_size, offset=offset)
+        yield (
+            batch["ids"],
+            batch["documents"],
+            [metadata or {} for metadata in batch["metadatas"]],
+            np.asarray(batch["embeddings"], dtype=np.float32),
+        )
+
+
+def add_records(store, ids, texts, metadatas, embeddings, backend=None):
+    backend = backend or settings.VECTOR_STORE_BACKEND
+    if backend == "mmap":
+        return store.add_embeddings(texts, embeddings, metadatas=metadatas, ids=ids)
+    store._collection.upsert(
+        ids=list(ids),
+        documents=list(texts),
+        metadatas=[metadata or None for metadata in metadatas],
+        embeddings=np.asarray(embeddings, dtype=np.float32),
+    )
+    return ids
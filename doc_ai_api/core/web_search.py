@@ -0,0 +1,396 @@
+import abc
+import json
+import logging
+import math
+import os
+import re
+import threading
+import time
+from collections import Counter, OrderedDict
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeoutError
+
+from django.conf import settings as config
+
+from . import tracing
+
+logger = logging.getLogger(__name__)
+
+
+class WebSearchError(Exception):
+    pass
+
+
+class WebSearchUnavailable(WebSearchError):
+    pass
+
+
+class WebSearchTimeout(WebSearchError):
+    pass
+
+
+def format_search_results(results):
+    if not results:
+        return "No relevant search results found."
+    formatted_results = []
+    for item in results:
+        formatted_results.append(
+            f"Title: {item.get('title', 'N/A')}\nLink: {item.get('link', 'N/A')}\nSnippet: {item.get('snippet', 'N/A')}"
+        )
+    return "\n\n---\n\n".join(formatted_results)
+
+
+class SearchBackend(abc.ABC):
+    name = "base"
+
+    def is_configured(self):
+        return True
+
+    # Returns up to num_results {"title", "link", "snippet"} dicts.
+    @abc.abstractmethod
+    def search(self, query, num_results):
+        pass
+
+
+class GoogleCustomSearchBackend(SearchBackend):
+    name = "google"
+
+    def __init__(self, api_key, cse_id, timeout_seconds):
+        self.api_key = api_key
+        self.cse_id = cse_id
+        self.timeout_seconds = timeout_seconds
+        # httplib2 connections are not thread-safe, so each pool thread keeps its own client.
+        self._local = threading.local()
+
+    def is_configured(self):
+        return bool(self.api_key and self.cse_id)
+
+    def _service(self):
+        service = getattr(self._local, "service", None)
+        if service is None:
+            import httplib2
+            from googleapiclient.discovery import build
+
+            http = httplib2.Http(timeout=self.timeout_seconds)
+            service = build("customsearch", "v1", developerKey=self.api_key, http=http, cache_discovery=False)
+            self._local.service = service
+        return service
+
+    def search(self, query, num_results):
+        try:
+            res = self._service().cse().list(q=query, cx=self.cse_id, num=num_results).execute()
+        except Exception:
+            # Drop the client so a broken connection is not reused.
+            self._local.service = None
+            raise
+        return [
+            {
+                "title": item.get("title", "N/A"),
+                "link": item.get("link", "N/A"),
+                "snippet": item.get("snippet", "N/A"),
+            }
+            for item in res.get("items") or []
+        ]
+
+
+_TOKEN_RE = re.compile(r"[a-z0-9]+")
+_STOPWORDS = frozenset(
+    "a an and are as at be by for from how in is it of on or that the this to was what when where which who why with".split()
+)
+
+
+def _tokenize(text):
+    return [token for token in _TOKEN_RE.findall(text.lower()) if token not in _STOPWORDS]
+
+
+# Offline backend over a JSONL file ({title, link, snippet|text} per line) or a
+# directory of .txt/.md files (one entry per paragraph), ranked with BM25.
+class LocalCorpusBackend(SearchBackend):
+    name = "local"
+
+    def __init__(self, corpus_path, k1=1.5, b=0.75):
+        self.corpus_path = corpus_path
+        self.k1 = k1
+        self.b = b
+        self._entries = None
+        self._postings = None
+        self._doc_lengths = None
+        self._avg_length = 0.0
+        self._load_lock = threading.Lock()
+
+    def is_configured(self):
+        return bool(self.corpus_path) and os.path.exists(self.corpus_path)
+
+    def _read_entries(self):
+        entries = []
+        if os.path.isdir(self.corpus_path):
+            for root, _, files in os.walk(self.corpus_path):
+                for file_name in sorted(files):
+                    if not file_name.endswith((".txt", ".md")):
+                        continue
+                    file_path = os.path.join(root, file_name)
+                    rel_path = os.path.relpath(file_path, self.corpus_path)
+                    with open(file_path, "r", encoding="utf-8") as f:
+                        paragraphs = [p.strip() for p in re.split(r"\n\s*\n", f.read()) if p.strip()]
+                    for i, paragraph in enumerate(paragraphs):
+                        entries.append({
+                            "title": f"{rel_path}: {paragraph.splitlines()[0][:80]}",
+                            "link": f"local://{rel_path}#p{i + 1}",
+                            "text": paragraph,
+                        })
+        else:
+            with open(self.corpus_path, "r", encoding="utf-8") as f:
+                for line in f:
+                    if line.strip():
+                        entries.append(json.loads(line))
+        return entries
+
+    def _ensure_loaded(self):
+        if self._entries is not None:
+            return
+        with self._load_lock:
+            if self._entries is not None:
+                return
+            entries = self._read_entries()
+            postings = {}
+            doc_lengths = []
+            for doc_idx, entry in enumerate(entries):
+                tokens = _tokenize(f"{entry.get('title', '')} {entry.get('text') or entry.get('snippet', '')}")
+                doc_lengths.append(len(tokens))
+                for token, tf in Counter(tokens).items():
+                    postings.setdefault(token, []).append((doc_idx, tf))
+            self._postings = postings
+            self._doc_lengths = doc_lengths
+            self._avg_length = (sum(doc_lengths) / len(doc_lengths)) if doc_lengths else 0.0
+            self._entries = entries
+            logger.info("Web search (local): Indexed %s entries from %s.", len(entries), self.corpus_path)
+
+    def search(self, query, num_results):
+        self._ensure_loaded()
+        total_docs = len(self._entries)
+        if not total_docs:
+            return []
+
+        scores = {}
+        for token in set(_tokenize(query)):
+            postings = self._postings.get(token)
+            if not postings:
+                continue
+            idf = math.log(1 + (total_docs - len(postings) + 0.5) / (len(postings) + 0.5))
+            for doc_idx, tf in postings:
+                norm = self.k1 * (1 - self.b + self.b * self._doc_lengths[doc_idx] / (self._avg_length or 1))
+                scores[doc_idx] = scores.get(doc_idx, 0.0) + idf * tf * (self.k1 + 1) / (tf + norm)
+
+        ranked = sorted(scores.items(), key=lambda item: item[1], reverse=True)[:num_results]
+        results = []
+        for doc_idx, _ in ranked:
+            entry = self._entries[doc_idx]
+            results.append({
+                "title": entry.get("title", "N/A"),
+                "link": entry.get("link", "N/A"),
+                "snippet": entry.get("snippet") or (entry.get("text") or "")[:500],
+            })
+        return results
+
+
+class TTLCache:
+    def __init__(self, ttl_seconds, max_entries):
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            item = self._data.get(key)
+            if item is None:
+                return None
+            expires_at, value = item
+            if expires_at < time.monotonic():
+                del self._data[key]
+                return None
+            self._data.move_to_end(key)
+            return value
+
+    def set(self, key, value):
+        if self.ttl_seconds <= 0 or self.max_entries <= 0:
+            return
+        with self._lock:
+            self._data[key] = (time.monotonic() + self.ttl_seconds, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_entries:
+                self._data.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self):
+        return len(self._data)
+
+
+class CircuitBreaker:
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(self, failure_threshold, cooldown_seconds):
+        self.failure_threshold = failure_threshold
+        self.cooldown_seconds = cooldown_seconds
+        self.state = self.CLOSED
+        self.consecutive_failures = 0
+        self.opened_at = None
+        self._trial_in_flight = False
+        self._lock = threading.Lock()
+
+    def allow(self):
+        with self._lock:
+            if self.state == self.CLOSED:
+                return True
+            if self.state == self.OPEN and time.monotonic() - self.opened_at >= self.cooldown_seconds:
+                self.state = self.HALF_OPEN
+                self._trial_in_flight = False
+            if self.state == self.HALF_OPEN and not self._trial_in_flight:
+                self._trial_in_flight = True
+                return True
+            return False
+
+    def record_success(self):
+        with self._lock:
+            self.state = self.CLOSED
+            self.consecutive_failures = 0
+            self._trial_in_flight = False
+
+    def record_failure(self):
+        with self._lock:
+            self.consecutive_failures += 1
+            self._trial_in_flight = False
+            if self.state == self.HALF_OPEN or self.consecutive_failures >= self.failure_threshold:
+                self.state = self.OPEN
+                self.opened_at = time.monotonic()
+
+    def retry_after_seconds(self):
+        if self.state != self.OPEN:
+            return 0
+        return max(0.0, self.cooldown_seconds - (time.monotonic() - self.opened_at))
+
+
+class WebSearchService:
+    def __init__(self, backend, timeout_seconds, cache, breaker, num_results=5, max_workers=4):
+        self.backend = backend
+        self.timeout_seconds = timeout_seconds
+        self.cache = cache
+        self.breaker = breaker
+        self.num_results = num_results
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="web-search")
+        self._stats = Counter()
+        self._stats_lock = threading.Lock()
+
+    def _count(self, name):
+        with self._stats_lock:
+            self._stats[name] += 1
+
+    def stats(self):
+        with self._stats_lock:
+            counts = dict(self._stats)
+        return {
+            "backend": self.backend.name,
+            "breaker_state": self.breaker.state,
+            "cache_entries": len(self.cache),
+            **counts,
+        }
+
+    def search(self, query, num_results=None):
+        with tracing.span("web_search", backend=self.backend.name) as search_span:
+            results, cache_hit = self._search(query, num_results)
+            search_span.set(cache_hit=cache_hit, results=len(results))
+            return results
+
+    def _search(self, query, num_results):
+        num_results = num_results or self.num_results
+        cache_key = (" ".join(query.lower().split()), num_results)
+        cached = self.cache.get(cache_key)
+        if cached is not None:
+            self._count("cache_hits")
+            return cached, True
+        self._count("cache_misses")
+
+        if not self.breaker.allow():
+            self._count("breaker_rejections")
+            raise WebSearchUnavailable(
+                f"Web search temporarily disabled after repeated failures; retry in {self.breaker.retry_after_seconds():.0f}s."
+            )
+
+        started = time.perf_counter()
+        future = self._executor.submit(self.backend.search, query, num_results)
+        try:
+            results = future.result(timeout=self.timeout_seconds)
+        except FutureTimeoutError:
+            future.cancel()
+            self.breaker.record_failure()
+            self._count("timeouts")
+            raise WebSearchTimeout(f"Web search timed out after {self.timeout_seconds}s.")
+        except Exception as e:
+            self.breaker.record_failure()
+            self._count("errors")
+            raise WebSearchError(f"Web search backend '{self.backend.name}' failed: {e}") from e
+
+        self.breaker.record_success()
+        self._count("backend_calls")
+        logger.info("Web search (%s): %s results in %.2fs.", self.backend.name, len(results), time.perf_counter() - started)
+        self.cache.set(cache_key, results)
+        return results, False
+
+    def run(self, query):
+        return format_search_results(self.search(query))
+
+
+def build_web_search_backend():
+    backend_name = config.WEB_SEARCH_BACKEND
+    if backend_name == "google":
+        return GoogleCustomSearchBackend(
+            api_key=config.GOOGLE_API_KEY,
+            cse_id=config.GOOGLE_CSE_ID,
+            timeout_seconds=config.WEB_SEARCH_TIMEOUT_SECONDS,
+        )
+    if backend_name == "local":
+        return LocalCorpusBackend(config.WEB_SEARCH_LOCAL_CORPUS)
+    if backend_name in ("none", "", None):
+        return None
+    raise ValueError(f"Unknown WEB_SEARCH_BACKEND '{backend_name}'. Expected 'google', 'local' or 'none'.")
+
+
+_service = None
+_service_lock = threading.Lock()
+
+
+def get_web_search_service():
+    global _service
+    if _service is not None:
+        return _service
+    with _service_lock:
+        if _service is None:
+            backend = build_web_search_backend()
+            if backend is None:
+                logger.warning("Web search disabled (WEB_SEARCH_BACKEND=none).")
+                return None
+            if not backend.is_configured():
+                logger.warning("Web search backend '%s' is not configured (missing API keys or corpus). Web search disabled.", backend.name)
+                return None
+            _service = WebSearchService(
+                backend=backend,
+                timeout_seconds=config.WEB_SEARCH_TIMEOUT_SECONDS,
+                cache=TTLCache(config.WEB_SEARCH_CACHE_TTL_SECONDS, config.WEB_SEARCH_CACHE_MAX_ENTRIES),
+                breaker=CircuitBreaker(config.WEB_SEARCH_BREAKER_FAILURES, config.WEB_SEARCH_BREAKER_COOLDOWN_SECONDS),
+                num_results=config.WEB_SEARCH_NUM_RESULTS,
+            )
+    return _service
+
+
+def current_web_search_service():
+    return _service
+
+
+def reset_web_search_service():
+    global _service
+    with _service_lock:
+        _service = None
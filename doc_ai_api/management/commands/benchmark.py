@@ -0,0 +1,71 @@
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+
+from ...benchmarks import runner
+
+
+class Command(BaseCommand):
+    help = (
+        "Run the offline end-to-end benchmark (ingest, rag_chat, qgen, summarize) against the bundled "
+        "physics chapters using deterministic stub LLM and embedding backends."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--questions", default=None, help="Question set JSON (default: bundled benchmarks/questions.json).")
+        parser.add_argument("--iterations", type=int, default=1, help="Times to replay the question set per endpoint.")
+        parser.add_argument("--endpoints", nargs="+", choices=sorted(runner.ENDPOINT_VIEWS), default=None)
+        parser.add_argument("--llm-latency-ms", type=float, default=0.0, help="Simulated fixed latency per LLM call.")
+        parser.add_argument("--llm-ms-per-token", type=float, default=0.0, help="Simulated generation time per output token.")
+        parser.add_argument("--embedding-latency-ms", type=float, default=0.0, help="Simulated latency per embedding call.")
+        parser.add_argument("--vector-store", choices=["chroma", "mmap"], default=None,
+                            help="Vector store backend for the endpoint runs (default: VECTOR_STORE_BACKEND).")
+        parser.add_argument("--compare-vector-stores", action="store_true",
+                            help="Also compare build time, cold open and query latency of every vector store backend.")
+        parser.add_argument("--vector-store-scale", type=int, default=1,
+                            help="Replicate the corpus this many times for the vector store comparison.")
+        parser.add_argument("--quantization-recall", action="store_true",
+                            help="Report recall@k of the int8 and binary mmap indexes against float32 on the sample PDFs.")
+        parser.add_argument("--live-generation", action="store_true",
+                            help="Disable section notes and the question bank so qgen and summarize always call the LLM.")
+        parser.add_argument("--measure-memory", action="store_true",
+                            help="Record per-request peak and retained memory with tracemalloc (slows the run).")
+        parser.add_argument("--output", default=None, help="Write the JSON report to this path.")
+        parser.add_argument("--baseline", default=None, help="Baseline JSON report to gate regressions against.")
+        parser.add_argument("--max-regression", type=float, default=0.2, help="Allowed relative regression vs the baseline (0.2 = 20%%).")
+
+    def handle(self, *args, **options):
+        report = runner.run_benchmark(
+            question_set_path=options["questions"],
+            iterations=options["iterations"],
+            llm_latency_ms=options["llm_latency_ms"],
+            llm_ms_per_token=options["llm_ms_per_token"],
+            embedding_latency_ms=options["embedding_latency_ms"],
+            endpoints=options["endpoints"],
+            vector_store_backend=options["vector_store"],
+            compare_vector_stores=options["compare_vector_stores"],
+            vector_store_scale=options["vector_store_scale"],
+            measure_memory=options["measure_memory"],
+            quantization_recall=options["quantization_recall"],
+            live_generation=options["live_generation"],
+        )
+
+        self.stdout.write(runner.format_report(report))
+
+        if options["output"]:
+            with open(options["output"], "w", encoding="utf-8") as f:
+                json.dump(report, f, indent=2)
+            self.stdout.write(f"\nReport written to {options['output']}")
+
+        if options["baseline"]:
+            with open(options["baseline"], "r", encoding="utf-8") as f:
+                baseline = json.load(f)
+            regressions = runner.compare_to_baseline(report, baseline, options["max_regression"])
+            if regressions:
+                for regression in regressions:
+                    self.stderr.write(
+                        f"REGRESSION {regression['metric']}: {regression['current']:.4f} "
+                        f"(baseline {regression['baseline']:.4f}, limit {regression['limit']:.4f})"
+                    )
+                raise CommandError(f"{len(regressions)} benchmark metric(s) regressed beyond {options['max_regression']:.0%}.")
+            self.stdout.write(self.style.SUCCESS("No regressions against baseline."))
@@ -0,0 +1,34 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from ...core.embedding_service import EmbeddingServer
+from ...core.models import build_local_embeddings
+
+
+class Command(BaseCommand):
+    help = (
+        "Load the embedding model once and serve it to all worker processes over a Unix socket, "
+        "micro-batching concurrent requests. Point workers at it with EMBEDDING_SERVICE_SOCKET=<path>."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--socket", default=settings.EMBEDDING_SERVICE_SOCKET, help="Unix socket path (defaults to EMBEDDING_SERVICE_SOCKET).")
+        parser.add_argument("--max-batch", type=int, default=settings.EMBEDDING_SERVICE_MAX_BATCH, help="Most texts embedded in one model call.")
+        parser.add_argument("--max-wait-ms", type=float, default=settings.EMBEDDING_SERVICE_MAX_WAIT_MS, help="How long the first request waits for others to join its batch.")
+
+    def handle(self, *args, **options):
+        if not options["socket"]:
+            raise CommandError("Give --socket or set EMBEDDING_SERVICE_SOCKET.")
+        embeddings = build_local_embeddings()
+        server = EmbeddingServer(options["socket"], embeddings, max_batch_size=options["max_batch"], max_wait_ms=options["max_wait_ms"])
+        self.stdout.write(
+            f"Embedding server ({settings.EMBEDDING_BACKEND}: {settings.EMBEDDING_MODEL}) listening on {options['socket']} "
+            f"(batch up to {options['max_batch']} texts, {options['max_wait_ms']}ms window). Ctrl+C to stop."
+        )
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            server.server_close()
+            self.stdout.write("Embedding server stopped.")
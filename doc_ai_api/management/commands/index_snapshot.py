@@ -0,0 +1,36 @@
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+
+from ...core import index_snapshot
+
+
+class Command(BaseCommand):
+    help = (
+        "Export the live RAG index to a portable snapshot file, or import one as a new live index "
+        "version without recomputing embeddings. Use it to seed new nodes with a file copy."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("action", choices=["export", "import", "inspect"])
+        parser.add_argument("path", help="Snapshot file (.zip).")
+        parser.add_argument("--backend", default=None, help="Vector store backend (defaults to VECTOR_STORE_BACKEND).")
+        parser.add_argument(
+            "--allow-model-mismatch", action="store_true",
+            help="Import even if the snapshot was embedded with a different embedding model.",
+        )
+
+    def handle(self, *args, **options):
+        try:
+            if options["action"] == "export":
+                manifest = index_snapshot.export_snapshot(options["path"], backend=options["backend"])
+                self.stdout.write(f"Exported {manifest['count']} chunks to {options['path']}.")
+            elif options["action"] == "import":
+                manifest = index_snapshot.import_snapshot(
+                    options["path"], backend=options["backend"], allow_model_mismatch=options["allow_model_mismatch"],
+                )
+                self.stdout.write(f"Imported {manifest['count']} chunks from {options['path']}.")
+            else:
+                self.stdout.write(json.dumps(index_snapshot.inspect_snapshot(options["path"]), indent=2))
+        except (index_snapshot.SnapshotError, OSError, ValueError) as e:
+            raise CommandError(str(e))
@@ -0,0 +1,85 @@
+import json
+import os
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from ...benchmarks import loadgen, runner
+
+
+class Command(BaseCommand):
+    help = (
+        "Drive a running server with concurrent /rag_chat/, /qgen/, /summarize/ and /ingest_documents/ "
+        "requests (closed-loop concurrency, open-loop rate, or replay of a captured request log) and "
+        "report throughput, p50/p95/p99 latency and error rates per endpoint."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--base-url", default="http://127.0.0.1:8000")
+        mode = parser.add_mutually_exclusive_group()
+        mode.add_argument("--concurrency", type=int, default=None, help="Closed loop: number of concurrent virtual users.")
+        mode.add_argument("--rate", type=float, default=None, help="Open loop: target arrival rate in requests/second.")
+        mode.add_argument("--replay", default=None, help="Replay a JSONL request capture (REQUEST_CAPTURE_PATH) with its original timing.")
+        parser.add_argument("--poisson", action="store_true", help="Open loop: Poisson arrivals instead of a fixed interval.")
+        parser.add_argument("--speed", type=float, default=1.0, help="Replay: time compression factor (2.0 = twice as fast).")
+        parser.add_argument("--duration", type=float, default=None, help="Seconds to generate load (default 30 unless --requests is given).")
+        parser.add_argument("--requests", type=int, default=None, help="Total requests to send.")
+        parser.add_argument("--mix", default=None, help="Endpoint weights, e.g. 'rag_chat=6,qgen=2,summarize=2,ingest_documents=0'.")
+        parser.add_argument("--questions", default=None, help="Question set JSON (default: bundled benchmarks/questions.json).")
+        parser.add_argument("--ingest-first", action="store_true", help="Upload the bundled corpus once before generating load.")
+        parser.add_argument("--timeout", type=float, default=120.0, help="Per-request timeout in seconds.")
+        parser.add_argument("--max-inflight", type=int, default=256, help="Open loop/replay: maximum outstanding requests.")
+        parser.add_argument("--seed", type=int, default=None)
+        parser.add_argument("--output", default=None, help="Write the JSON report to this path.")
+
+    def handle(self, *args, **options):
+        question_set = runner.load_question_set(options["questions"])
+        corpus_paths = [
+            path if os.path.isabs(path) else os.path.join(settings.BASE_DIR, path)
+            for path in question_set["corpus"]
+        ]
+        base_url = options["base_url"]
+        duration = options["duration"]
+        if duration is None and options["requests"] is None:
+            duration = 30.0
+
+        if options["ingest_first"]:
+            status, error = loadgen.send_request(base_url, loadgen.ingest_request(corpus_paths), options["timeout"])
+            if status != 200:
+                raise CommandError(f"Initial ingest failed with status {status}: {error}")
+            self.stdout.write("Corpus ingested.")
+
+        try:
+            if options["replay"]:
+                requests = loadgen.load_replay_log(options["replay"], corpus_paths)
+                if options["requests"]:
+                    requests = requests[: options["requests"]]
+                self.stdout.write(f"Replaying {len(requests)} captured requests at {options['speed']}x...")
+                recorder, wall_seconds = loadgen.run_replay(
+                    base_url, requests, speed=options["speed"], timeout=options["timeout"], max_inflight=options["max_inflight"]
+                )
+            else:
+                mix = loadgen.RequestMix(question_set, loadgen.parse_mix(options["mix"]), corpus_paths, seed=options["seed"])
+                if options["rate"]:
+                    self.stdout.write(f"Open loop at {options['rate']} req/s...")
+                    recorder, wall_seconds = loadgen.run_open_loop(
+                        base_url, mix, options["rate"], duration=duration, total_requests=options["requests"],
+                        poisson=options["poisson"], timeout=options["timeout"],
+                        max_inflight=options["max_inflight"], seed=options["seed"],
+                    )
+                else:
+                    concurrency = options["concurrency"] or 4
+                    self.stdout.write(f"Closed loop with {concurrency} concurrent users...")
+                    recorder, wall_seconds = loadgen.run_closed_loop(
+                        base_url, mix, concurrency, duration=duration, total_requests=options["requests"],
+                        timeout=options["timeout"],
+                    )
+        except ValueError as e:
+            raise CommandError(str(e))
+
+        report = loadgen.build_report(recorder, wall_seconds)
+        self.stdout.write(loadgen.format_report(report))
+        if options["output"]:
+            with open(options["output"], "w", encoding="utf-8") as f:
+                json.dump(report, f, indent=2)
+            self.stdout.write(f"Report written to {options['output']}")
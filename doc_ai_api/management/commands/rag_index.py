@@ -0,0 +1,48 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from ...core import index_store
+
+
+class Command(BaseCommand):
+    help = (
+        "Inspect and manage versioned RAG index builds: list versions, roll back to the previous "
+        "version, activate a specific version or garbage-collect old ones. Running workers switch "
+        "to the new live version on their next request."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("action", choices=["list", "rollback", "activate", "gc"])
+        parser.add_argument("version", nargs="?", help="Version to activate (for 'activate').")
+        parser.add_argument("--backend", default=None, help="Vector store backend (defaults to VECTOR_STORE_BACKEND).")
+        parser.add_argument("--keep", type=int, default=None, help="Previous versions to keep for 'gc' (defaults to RAG_INDEX_KEEP_VERSIONS).")
+
+    def handle(self, *args, **options):
+        backend = options["backend"]
+        action = options["action"]
+        try:
+            if action == "list":
+                current = index_store.current_version(backend)
+                pointer = index_store.read_pointer(backend) or {}
+                history = pointer.get("history", [])
+                self.stdout.write(f"Index root: {index_store.index_root(backend)}")
+                if current == "legacy":
+                    self.stdout.write(f"* legacy ({index_store.legacy_directory(backend)})")
+                for version in index_store.list_versions(backend):
+                    marker = "*" if version == current else " "
+                    note = " (rollback target)" if history and version == history[0] else ""
+                    self.stdout.write(f"{marker} {version}{note}")
+                if current is None:
+                    self.stdout.write("No index version is live.")
+            elif action == "rollback":
+                version = index_store.rollback(backend)
+                self.stdout.write(f"Rolled back to {version}.")
+            elif action == "activate":
+                if not options["version"]:
+                    raise CommandError("'activate' needs a VERSION argument.")
+                index_store.activate(options["version"], backend)
+                self.stdout.write(f"Activated {options['version']}.")
+            elif action == "gc":
+                removed = index_store.collect_garbage(backend, keep=options["keep"])
+                self.stdout.write(f"Removed {len(removed)} version(s).")
+        except ValueError as e:
+            raise CommandError(str(e))
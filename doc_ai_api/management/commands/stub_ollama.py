@@ -0,0 +1,38 @@
+from django.core.management.base import BaseCommand
+
+from ...benchmarks.stub_ollama import StubOllamaServer
+
+
+class Command(BaseCommand):
+    help = (
+        "Serve a deterministic Ollama-compatible stub LLM over HTTP for offline load tests. "
+        "Point the backend at it with OLLAMA_BASE_URL=http://<host>:<port>."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--host", default="127.0.0.1")
+        parser.add_argument("--port", type=int, default=11435)
+        parser.add_argument("--model", default="stub", help="Model name reported by /api/tags.")
+        parser.add_argument("--latency-ms", type=float, default=200.0, help="Fixed latency per generation.")
+        parser.add_argument("--ms-per-token", type=float, default=5.0, help="Simulated time per output token.")
+        parser.add_argument("--parallel", type=int, default=1, help="Concurrent generations before requests queue (like OLLAMA_NUM_PARALLEL).")
+
+    def handle(self, *args, **options):
+        server = StubOllamaServer(
+            (options["host"], options["port"]),
+            model_name=options["model"],
+            latency_ms=options["latency_ms"],
+            ms_per_token=options["ms_per_token"],
+            parallel=options["parallel"],
+        )
+        self.stdout.write(
+            f"Stub Ollama listening on http://{options['host']}:{options['port']} "
+            f"(latency {options['latency_ms']}ms + {options['ms_per_token']}ms/token, parallel={options['parallel']}). Ctrl+C to stop."
+        )
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            server.server_close()
+            self.stdout.write(f"Stub Ollama stopped. Stats: {server.stats}")
@@ -0,0 +1,44 @@
+import json
+import logging
+import threading
+import time
+
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+
+# Appends one JSON line per API POST to REQUEST_CAPTURE_PATH so production traffic
+# can be replayed with `manage.py loadtest --replay`. JSON bodies are recorded
+# as-is; multipart uploads only record their size so uploads are never buffered here.
+class RequestCaptureMiddleware:
+    _write_lock = threading.Lock()
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.capture_path = getattr(settings, "REQUEST_CAPTURE_PATH", None)
+
+    def __call__(self, request):
+        if not self.capture_path or request.method != "POST" or not request.path.startswith("/api/"):
+            return self.get_response(request)
+
+        started_at = time.time()
+        entry = {"ts": started_at, "method": request.method, "path": request.path, "content_type": request.content_type}
+        if request.content_type == "application/json":
+            try:
+                entry["body"] = json.loads(request.body or b"{}")
+            except ValueError:
+                entry["body"] = None
+        else:
+            entry["content_length"] = int(request.META.get("CONTENT_LENGTH") or 0)
+
+        response = self.get_response(request)
+
+        entry["status"] = response.status_code
+        entry["duration_seconds"] = round(time.time() - started_at, 6)
+        try:
+            with self._write_lock, open(self.capture_path, "a", encoding="utf-8") as f:
+                f.write(json.dumps(entry) + "\n")
+        except OSError as e:
+            logger.warning("Could not write request capture to %s: %s", self.capture_path, e)
+        return response
@@ -0,0 +1,41 @@
+import threading
+
+from ..core import context_packing, metrics
+from . import retrieval
+
+
+# Per-request store for the chunks the RAG graph works on. Graph state carries
+# only chunk IDs; each Document is stored once and never modified, so state
+# updates, retries and parallel branches share it instead of copying its text.
+# Merged chunks and packed context strings are memoized per chunk-ID list, so
+# grading, summarization and critique of the same chunks merge them once, and a
+# node that re-runs on the same chunks reuses the packed string.
+class ChunkStore:
+    def __init__(self):
+        self._documents = {}
+        self._merged = {}
+        self._packed = {}
+        self._lock = threading.Lock()
+
+    def add(self, documents):
+        documents = retrieval.with_chunk_ids(list(documents))
+        with self._lock:
+            for document in documents:
+                self._documents.setdefault(document.metadata["chunk_id"], document)
+        return [document.metadata["chunk_id"] for document in documents]
+
+    def documents(self, chunk_ids):
+        return [self._documents[chunk_id] for chunk_id in chunk_ids]
+
+    def context(self, chunk_ids, budget_key="default", separator=context_packing.CONTEXT_SEPARATOR):
+        chunk_ids = tuple(chunk_ids)
+        key = (chunk_ids, budget_key, separator)
+        packed = self._packed.get(key)
+        if packed is not None:
+            metrics.incr("rag.context.memo_hits")
+            return packed
+        merged = self._merged.get(chunk_ids)
+        if merged is None:
+            merged = self._merged[chunk_ids] = context_packing.merge_items(self.documents(chunk_ids))
+        packed = self._packed[key] = context_packing.pack_merged(merged, budget_key, separator=separator)
+        return packed
@@ -1,18 +1,30 @@
-import traceback
-from typing import List, TypedDict, Optional
+import hashlib
+import logging
+from typing import Dict, List, TypedDict, Optional
+from django.conf import settings
+from langchain_core.documents import Document
 from langgraph.graph import START, END, StateGraph
 
 from ..core import (
+    metrics,
     models,
+    tracing,
 )
+from . import retrieval
+from .chunk_store import ChunkStore
+
+logger = logging.getLogger(__name__)
 
 retriever_rag = None
 rag_graph_compiled = None
 
 
+# Nodes return only the keys they change. Retrieved chunks live in the request's
+# ChunkStore; the state refers to them by ID (document_ids, in relevance order).
 class GraphState(TypedDict):
     question: str
-    documents: List[str] 
+    chunk_store: ChunkStore
+    document_ids: List[str]
     summarized_context: Optional[str]
     relevance_grade: str
     query_rewrite_attempted: bool
@@ -20,338 +32,489 @@ class GraphState(TypedDict):
     generation: str
     critique_status: str
     attempt_count: int
+    seen_chunk_ids: List[str]
+    retry_new_chunks: int
+    retrieval_k: int
+    previous_generation: Optional[str]
+    node_memo: Dict[str, str]
+
+
+def build_initial_state(question):
+    return {
+        "question": question,
+        "query_rewrite_attempted": False,
+        "attempt_count": 0,
+        "chunk_store": ChunkStore(),
+        "document_ids": [],
+        "summarized_context": None,
+        "relevance_grade": "unknown",
+        "query_classification": "unknown",
+        "generation": None,
+        "critique_status": "none",
+        "seen_chunk_ids": [],
+        "retry_new_chunks": 0,
+        "retrieval_k": 0,
+        "previous_generation": None,
+        "node_memo": {},
+    }
+
+
+# Per-request memo of generated answers keyed on the exact prompt inputs, so a
+# retry whose summarized context came out unchanged reuses the earlier answer.
+# Grades, summaries and critiques are not memoized: a retry only runs when it
+# found new chunks, so their inputs always differ. Failed calls are never stored.
+def _memo_key(node_name, *parts):
+    digest = hashlib.sha1("\x00".join(str(part) for part in parts).encode("utf-8")).hexdigest()
+    return f"{node_name}:{digest}"
+
+
+def _memo_lookup(state, key):
+    value = (state.get("node_memo") or {}).get(key)
+    if value is not None:
+        metrics.incr(f"rag.memo.hits.{key.split(':', 1)[0]}")
+    return value
+
+
+def _memo_store(state, key, value):
+    return {**(state.get("node_memo") or {}), key: value}
+
+
+# Counts the state keys each node writes, so a node that returns more than its
+# delta (and makes LangGraph re-write every channel) shows up in the benchmark.
+def _counted_updates(node_fn):
+    def wrapper(state):
+        update = node_fn(state)
+        metrics.incr("rag.state.keys_written", len(update))
+        return update
+
+    return wrapper
+
+
+def _instrumented(node_name, node_fn):
+    return metrics.timed_node(node_name, tracing.traced_node(node_name, _counted_updates(node_fn)))
 
 
 def classify_query_node_rag(state: GraphState):
-    print("\n---NODE: RAG CLASSIFY QUERY---")
+    logger.debug("NODE: RAG CLASSIFY QUERY")
     question = state["question"]
 
     if models.query_classifier_chain is None:
-        print("Error: RAG Query classifier chain not initialized.")
-        return {**state, "query_classification": "document_based"}
+        logger.error("RAG Query classifier chain not initialized.")
+        return {"query_classification": "document_based"}
 
-    print(f"Classifying query: '{question}'")
+    logger.debug("Classifying query: '%s'", question)
     try:
         raw_classification_output = models.query_classifier_chain.invoke(
             {"question": question}
         )
-        classification = (
-            models.get_string_content(raw_classification_output)
-            .strip()
-            .lower()
-            .strip("'")
-            .strip('"')
+        classification = models.parse_label(
+            raw_classification_output, ["document_based", "requires_web_search", "ambiguous_or_general"]
         )
 
-        if classification not in [
-            "document_based",
-            "requires_web_search",
-            "ambiguous_or_general",
-        ]:
-            print(
-                f"Warning: Classifier returned unexpected output: '{classification}'. Defaulting to 'document_based'."
-            )
+        if classification is None:
+            logger.warning("Classifier returned unexpected output: '%s'. Defaulting to 'document_based'.", models.get_string_content(raw_classification_output))
+            metrics.incr("llm.label_unparsed.query_classifier")
             classification = "document_based"
     except Exception as e:
-        print(f"Error during RAG query classification: {e}\n{traceback.format_exc()}")
+        logger.exception("Error during RAG query classification: %s", e)
         classification = "document_based"
-    print(f"Query classified as: '{classification}'")
-    return {**state, "query_classification": classification}
+    logger.debug("Query classified as: '%s'", classification)
+    return {"query_classification": classification}
+
+
+# Web search replaces whatever a speculative retrieval put in the state: those
+# chunks were never shown to the LLM, so they must not count as seen on a retry,
+# and no summary, answer or critique from them may survive.
+_WEB_SEARCH_RESET = {
+    "seen_chunk_ids": [],
+    "retrieval_k": 0,
+    "summarized_context": None,
+    "generation": None,
+    "critique_status": "none",
+}
 
 
 def web_search_tool_node_rag(state: GraphState):
-    print("\n---NODE: RAG WEB SEARCH---")
+    logger.debug("NODE: RAG WEB SEARCH")
     question = state["question"]
-    print(f"Performing web search for: '{question}'")
+    logger.debug("Performing web search for: '%s'", question)
 
+    chunk_store = state["chunk_store"]
     if models.web_search_tool is None:
-        print("Error: Web Search Tool not initialized. Cannot perform web search.")
+        logger.error("Web Search Tool not initialized. Cannot perform web search.")
         return {
-            **state,
-            "documents": ["Error: Web search tool not available."],
+            "document_ids": chunk_store.add(
+                [Document(page_content="Error: Web search tool not available.", metadata={"source": "web_search"})]
+            ),
             "relevance_grade": "no",
             "query_rewrite_attempted": True,
+            **_WEB_SEARCH_RESET,
         }
 
     try:
         search_results_raw = models.web_search_tool.run(question)
-        search_results_doc = [f"Web Search Results:\n{search_results_raw}"]
-        print(f"Web search executed. Results length: {len(search_results_raw)} chars.")
+        search_results_doc = [
+            Document(page_content=f"Web Search Results:\n{search_results_raw}", metadata={"source": "web_search"})
+        ]
+        logger.debug("Web search executed. Results length: %s chars.", len(search_results_raw))
 
         return {
-            **state,
-            "documents": search_results_doc,
+            "document_ids": chunk_store.add(search_results_doc),
             "relevance_grade": "yes",
             "query_rewrite_attempted": True,
-            "summarized_context": None,
-            "generation": None,
-            "critique_status": "none",
+            **_WEB_SEARCH_RESET,
         }
     except Exception as e:
-        print(f"Error during RAG web search: {e}\n{traceback.format_exc()}")
+        logger.exception("Error during RAG web search: %s", e)
         return {
-            **state,
-            "documents": [f"Error during web search: {e}"],
+            "document_ids": chunk_store.add(
+                [Document(page_content=f"Error during web search: {e}", metadata={"source": "web_search"})]
+            ),
             "relevance_grade": "no",
             "query_rewrite_attempted": True,
+            **_WEB_SEARCH_RESET,
         }
 
 
+def _rewritten_queries(question):
+    try:
+        raw_better_question_output = models.query_rewriter_chain.invoke({"question": question})
+    except Exception as e:
+        logger.warning("Query rewrite for multi-query retrieval failed: %s", e)
+        return []
+    return [models.get_string_content(raw_better_question_output).strip()]
+
+
+# RAG_MULTI_QUERY: retrieves several variants of the question in parallel and
+# fuses them (see retrieval.multi_query_retrieve). In "llm" mode the query
+# rewriter runs alongside the local variants' retrieval, so a failed grade no
+# longer needs a sequential transform_query -> retrieve loop.
+def _multi_query_retrieve(question):
+    queries = retrieval.local_query_variants(question, settings.RAG_MULTI_QUERY_VARIANTS)
+    generate_queries = None
+    if settings.RAG_MULTI_QUERY == "llm" and models.query_rewriter_chain is not None:
+        generate_queries = lambda: _rewritten_queries(question)
+    return retrieval.multi_query_retrieve(retriever_rag, queries, "rag_chat", generate_queries)
+
+
 def retrieve_node_rag(state: GraphState):
-    print("\n---NODE: RAG RETRIEVE DOCUMENTS---")
+    logger.debug("NODE: RAG RETRIEVE DOCUMENTS")
     question = state["question"]
-    print(f"Retrieving for question: '{question}'")
+    logger.debug("Retrieving for question: '%s'", question)
 
-    global retriever_rag
     if retriever_rag is None:
-        print("Error: RAG Retriever not initialized.")
+        logger.warning("RAG Retriever not initialized.")
         return {
-            **state,
-            "documents": [],
+            "document_ids": [],
             "relevance_grade": "no",
             "generation": None,
             "critique_status": "none",
         }
 
+    update = {}
     try:
-        documents_obj = retriever_rag.invoke(question)
-        doc_contents = [doc.page_content for doc in documents_obj]
-        print(f"Retrieved {len(doc_contents)} documents.")
+        with metrics.timer("retrieval"), tracing.span("retrieval") as retrieval_span:
+            if settings.RAG_MULTI_QUERY == "off":
+                documents_obj = retrieval.adaptive_retrieve(retriever_rag, question, "rag_chat")
+            else:
+                documents_obj, queries = _multi_query_retrieve(question)
+                retrieval_span.set(queries=len(queries))
+                if settings.RAG_MULTI_QUERY == "llm":
+                    update["query_rewrite_attempted"] = True
+            retrieval_span.set(chunks=len(documents_obj))
+        document_ids = state["chunk_store"].add(documents_obj)
+        logger.debug("Retrieved %s documents.", len(document_ids))
     except Exception as e:
-        print(f"Error during RAG retrieval: {e}\n{traceback.format_exc()}")
-        doc_contents = []
-    return {
-        **state,
-        "documents": doc_contents,
+        logger.exception("Error during RAG retrieval: %s", e)
+        document_ids = []
+    seen_chunk_ids = list(state.get("seen_chunk_ids") or [])
+    seen_chunk_ids += [chunk_id for chunk_id in document_ids if chunk_id not in seen_chunk_ids]
+    update.update({
+        "document_ids": document_ids,
+        "seen_chunk_ids": seen_chunk_ids,
+        "retrieval_k": len(document_ids),
         "relevance_grade": "unknown",
         "summarized_context": None,
         "generation": None,
         "critique_status": "none",
+    })
+    return update
+
+
+def retry_retrieve_node_rag(state: GraphState):
+    # Critique failed: widen the search instead of repeating it. k grows by
+    # RAG_RETRY_K_STEP over the k the previous pass used (adaptive retrieval may
+    # have gone past the retriever's base k), and chunks already shown to the LLM
+    # are excluded, so the retry only proceeds when it has genuinely new material.
+    logger.debug("NODE: RAG RETRY RETRIEVE")
+    question = state["question"]
+    previous_ids = state["document_ids"] or []
+    seen_chunk_ids = list(state.get("seen_chunk_ids") or [])
+    metrics.incr("rag.retry.attempts")
+
+    new_ids = []
+    k = state.get("retrieval_k") or 0
+    if retriever_rag is None:
+        logger.warning("RAG Retriever not initialized.")
+    else:
+        k = max(k, retrieval.base_k(retriever_rag)) + settings.RAG_RETRY_K_STEP
+        logger.debug("Retrying retrieval with k=%s, excluding %s already seen chunks.", k, len(seen_chunk_ids))
+        try:
+            with metrics.timer("retrieval"), tracing.span("retrieval", k=k, excluded=len(seen_chunk_ids)) as retrieval_span:
+                new_documents = retrieval.retrieve_unseen(retriever_rag, question, k, seen_chunk_ids)
+                retrieval_span.set(chunks=len(new_documents))
+            new_ids = state["chunk_store"].add(new_documents)
+        except Exception as e:
+            logger.exception("Error during RAG retry retrieval: %s", e)
+
+    logger.debug("Retry retrieved %s new documents.", len(new_ids))
+    metrics.incr("rag.retry.new_chunks", len(new_ids))
+    return {
+        "document_ids": previous_ids + new_ids,
+        "seen_chunk_ids": seen_chunk_ids + new_ids,
+        "retry_new_chunks": len(new_ids),
+        "retrieval_k": k,
+        "previous_generation": state["generation"],
+        "relevance_grade": "unknown",
+        "summarized_context": None,
+        "critique_status": "none",
     }
 
 
 def grade_documents_node_rag(state: GraphState):
-    print("\n---NODE: RAG GRADE DOCUMENTS---")
+    logger.debug("NODE: RAG GRADE DOCUMENTS")
     question = state["question"]
-    documents = state["documents"]
+    document_ids = state["document_ids"]
 
     if models.document_grader_chain is None:
-        print("Error: RAG Document grader chain not initialized (LLM failed?).")
-        return {**state, "relevance_grade": "no"}
+        logger.error("RAG Document grader chain not initialized (LLM failed?).")
+        return {"relevance_grade": "no"}
+
+    if not document_ids:
+        logger.debug("No documents to grade.")
+        return {"relevance_grade": "no"}
 
-    if not documents:
-        print("No documents to grade.")
-        return {**state, "relevance_grade": "no"}
+    documents_str = state["chunk_store"].context(document_ids, "grade_documents", separator="\n---\n")
 
-    documents_str = "\n---\n".join(documents)
-    print("Asking LLM to grade RAG document relevance...")
+    logger.debug("Asking LLM to grade RAG document relevance...")
     try:
         raw_grade_output = models.document_grader_chain.invoke(
             {"question": question, "documents": documents_str}
         )
-        grade = models.get_string_content(raw_grade_output).strip().lower()
+        grade = models.parse_label(raw_grade_output, ["yes", "no"])
 
-        if grade not in ["yes", "no"]:
-            print(
-                f"Warning: RAG Grader returned unexpected output: '{grade}'. Defaulting to 'no'."
-            )
+        if grade is None:
+            logger.warning("RAG Grader returned unexpected output: '%s'. Defaulting to 'no'.", models.get_string_content(raw_grade_output))
+            metrics.incr("llm.label_unparsed.document_grader")
             grade = "no"
     except Exception as e:
-        print(f"Error during RAG document grading: {e}\n{traceback.format_exc()}")
-        grade = "no"
-    print(f"RAG LLM Grade: {grade}")
-    return {**state, "relevance_grade": grade}
+        logger.exception("Error during RAG document grading: %s", e)
+        return {"relevance_grade": "no"}
+    logger.debug("RAG LLM Grade: %s", grade)
+    return {"relevance_grade": grade}
 
 
 def transform_query_node_rag(state: GraphState):
-    print("\n---NODE: RAG TRANSFORM QUERY---")
+    logger.debug("NODE: RAG TRANSFORM QUERY")
     question = state["question"]
 
     if models.query_rewriter_chain is None:
-        print("Error: RAG Query rewriter chain not initialized (LLM failed?).")
-        return {**state, "query_rewrite_attempted": True}
+        logger.error("RAG Query rewriter chain not initialized (LLM failed?).")
+        return {"query_rewrite_attempted": True}
 
-    print(f"Attempting to rewrite question: '{question}'")
+    logger.debug("Attempting to rewrite question: '%s'", question)
     try:
         raw_better_question_output = models.query_rewriter_chain.invoke(
             {"question": question}
         )
         better_question = models.get_string_content(raw_better_question_output).strip()
-        print(f"Rewritten question: '{better_question}'")
-        return {**state, "question": better_question, "query_rewrite_attempted": True}
+        logger.debug("Rewritten question: '%s'", better_question)
+        metrics.incr("rag.query_rewrites")
+        return {"question": better_question, "query_rewrite_attempted": True}
     except Exception as e:
-        print(f"Error during RAG query transformation: {e}\n{traceback.format_exc()}")
-        return {**state, "query_rewrite_attempted": True}
+        logger.exception("Error during RAG query transformation: %s", e)
+        return {"query_rewrite_attempted": True}
 
 
 def summarize_context_node_rag(state: GraphState):
-    print("\n---NODE: RAG SUMMARIZE CONTEXT---")
+    logger.debug("NODE: RAG SUMMARIZE CONTEXT")
     question = state["question"]
-    documents = state["documents"]
+    document_ids = state["document_ids"]
+    chunk_store = state["chunk_store"]
 
     if models.context_summarizer_chain is None:
-        print("Error: Context summarizer chain not initialized.")
-        return {
-            **state,
-            "summarized_context": "\n\n---\n\n".join(documents) if documents else None,
-        }
+        logger.error("Context summarizer chain not initialized.")
+        return {"summarized_context": chunk_store.context(document_ids, "summarize_context") if document_ids else None}
+
+    if not document_ids:
+        logger.debug("No documents to summarize.")
+        return {"summarized_context": None}
 
-    if not documents:
-        print("No documents to summarize.")
-        return {**state, "summarized_context": None}
+    documents_str = chunk_store.context(document_ids, "summarize_context")
 
-    documents_str = "\n\n---\n\n".join(documents)
-    print(f"Summarizing {len(documents)} documents for question: '{question}'")
+    logger.debug("Summarizing %s documents for question: '%s'", len(document_ids), question)
     try:
         raw_summarized_context_output = models.context_summarizer_chain.invoke(
             {"question": question, "documents": documents_str}
         )
         summarized_context = models.get_string_content(raw_summarized_context_output)
-        print(f"Context summarized (length: {len(summarized_context)} chars).")
-        return {**state, "summarized_context": summarized_context}
+        logger.debug("Context summarized (length: %s chars).", len(summarized_context))
+        return {"summarized_context": summarized_context}
     except Exception as e:
-        print(f"Error during context summarization: {e}\n{traceback.format_exc()}")
-        return {
-            **state,
-            "summarized_context": "\n\n---\n\n".join(documents) if documents else None,
-        }
+        logger.exception("Error during context summarization: %s", e)
+        return {"summarized_context": documents_str}
 
 
 def generate_node_rag(state: GraphState):
-    print("\n---NODE: RAG GENERATE ANSWER---")
+    logger.debug("NODE: RAG GENERATE ANSWER")
     question = state["question"]
-    documents = state["documents"]
+    document_ids = state["document_ids"]
     context_for_generation = state["summarized_context"]
     relevance_grade = state["relevance_grade"]
 
     if models.rag_chain is None or models.llm is None:
-        print("Error: RAG chain or LLM not initialized.")
+        logger.error("RAG chain or LLM not initialized.")
         generation = "Error: LLM or RAG chain not configured."
-    elif relevance_grade == "no" or not documents:
-        print(
-            "No relevant documents found for RAG. Generating a response indicating lack of information."
-        )
+    elif relevance_grade == "no" or not document_ids:
+        logger.debug("No relevant documents found for RAG. Generating a response indicating lack of information.")
         try:
             raw_generation_output = models.llm.invoke(
                 f"Based on the provided documents, I was unable to find information to answer the question: '{question}'. Please try rephrasing or asking about a different topic."
             )
             generation = models.get_string_content(raw_generation_output)
         except Exception as e:
-            print(
-                f"Error generating 'don't know' RAG response: {e}\n{traceback.format_exc()}"
-            )
+            logger.exception("Error generating 'don't know' RAG response: %s", e)
             generation = (
                 "I cannot answer this question based on the provided documents."
             )
     else:
-        print(
-            f"Generating RAG answer using summarized context (length: {len(context_for_generation)} chars) for question: '{question}'..."
-        )
+        memo_key = _memo_key("generate", question, context_for_generation)
+        cached_generation = _memo_lookup(state, memo_key)
+        if cached_generation is not None:
+            logger.debug("Context unchanged since last attempt; reusing generated answer.")
+            return {"generation": cached_generation}
+
+        logger.debug("Generating RAG answer using summarized context (length: %s chars) for question: '%s'...", len(context_for_generation), question)
         try:
             raw_generation_output = models.rag_chain.invoke(
                 {"context": context_for_generation, "question": question}
             )
             generation = models.get_string_content(raw_generation_output)
+            logger.debug("Generated RAG response: %s", generation)
+            return {"generation": generation, "node_memo": _memo_store(state, memo_key, generation)}
         except Exception as e:
-            print(f"Error during RAG generation: {e}\n{traceback.format_exc()}")
+            logger.exception("Error during RAG generation: %s", e)
             generation = "An error occurred during answer generation."
-    print(f"Generated RAG response: {generation}")
-    return {**state, "generation": generation}
+    logger.debug("Generated RAG response: %s", generation)
+    return {"generation": generation}
 
 
 def critique_answer_node_rag(state: GraphState):
-    print("\n---NODE: RAG CRITIQUE ANSWER---")
+    logger.debug("NODE: RAG CRITIQUE ANSWER")
     question = state["question"]
-    documents = state["documents"]
+    document_ids = state["document_ids"]
     generation = state["generation"]
 
     if models.critique_chain is None:
-        print("Error: Critique chain not initialized.")
-        return {**state, "critique_status": "PASS"}
+        logger.error("Critique chain not initialized.")
+        return {"critique_status": "PASS"}
 
-    if not generation or not documents:
-        print("No generation or documents to critique.")
+    if not generation or not document_ids:
+        logger.debug("No generation or documents to critique.")
         return {
-            **state,
             "critique_status": "FAIL",
             "attempt_count": state["attempt_count"] + 1,
         }
 
-    documents_str = "\n\n---\n\n".join(documents)
-    print("Asking LLM to critique the generated answer...")
+    previous_generation = state.get("previous_generation")
+    if previous_generation is not None:
+        metrics.incr("rag.retry.answer_changed" if generation != previous_generation else "rag.retry.answer_unchanged")
+
+    documents_str = state["chunk_store"].context(document_ids, "critique_answer")
+    logger.debug("Asking LLM to critique the generated answer...")
     try:
         raw_critique_output = models.critique_chain.invoke(
             {"question": question, "context": documents_str, "generation": generation}
         )
-        critique_result = models.get_string_content(raw_critique_output).strip().upper()
+        critique_result = models.parse_label(raw_critique_output, ["PASS", "FAIL"])
 
-        if critique_result not in ["PASS", "FAIL"]:
-            print(
-                f"Warning: Critique returned unexpected output: '{critique_result}'. Defaulting to 'FAIL'."
-            )
+        if critique_result is None:
+            logger.warning("Critique returned unexpected output: '%s'. Defaulting to 'FAIL'.", models.get_string_content(raw_critique_output))
+            metrics.incr("llm.label_unparsed.critique")
             critique_result = "FAIL"
     except Exception as e:
-        print(f"Error during RAG critique: {e}\n{traceback.format_exc()}")
+        logger.exception("Error during RAG critique: %s", e)
         critique_result = "FAIL"
-    print(f"Critique Result: {critique_result}")
-    return {
-        **state,
-        "critique_status": critique_result,
-        "attempt_count": state["attempt_count"] + 1,
-    }
+    logger.debug("Critique Result: %s", critique_result)
+    metrics.incr(f"rag.critique.attempt_{state['attempt_count'] + 1}.{critique_result.lower()}")
+    return {"critique_status": critique_result, "attempt_count": state["attempt_count"] + 1}
+
+
+def speculative_retrieve_node_rag(state: GraphState):
+    # Runs in parallel with classify_query. Must return only the keys it changes so
+    # the two branches never write the same state key in one step.
+    logger.debug("NODE: RAG SPECULATIVE RETRIEVE")
+    update = retrieve_node_rag(state)
+    if settings.RAG_SPECULATIVE_GRADING and update["document_ids"]:
+        update.update(grade_documents_node_rag({**state, **update}))
+    return update
+
+
+def join_speculation_node_rag(state: GraphState):
+    return {}
+
+
+def decide_route_after_speculation(state: GraphState):
+    route = decide_route_on_query_classification(state)
+    if route == "web_search":
+        logger.debug("RAG DECISION: Discarding speculative retrieval in favour of web search.")
+        metrics.incr("rag.speculation.discarded")
+        return "web_search"
+
+    metrics.incr("rag.speculation.used")
+    if state["relevance_grade"] in ("yes", "no"):
+        metrics.incr("rag.speculation.graded")
+        return decide_to_summarize_or_transform_rag(state)
+    return "grade_documents"
 
 
 def decide_route_on_query_classification(state: GraphState):
-    print("\n---RAG DECISION NODE (Query Classification)---")
+    logger.debug("RAG DECISION NODE (Query Classification)")
     classification = state["query_classification"]
-    print(f"Query Classification: {classification}")
+    logger.debug("Query Classification: %s", classification)
 
     if classification == "document_based":
-        print(
-            "---RAG DECISION: Query is document-based, proceed to retrieve from internal DB.---"
-        )
+        logger.debug("RAG DECISION: Query is document-based, proceed to retrieve from internal DB.")
         return "retrieve_internal"
     elif classification == "requires_web_search":
         
         if models.web_search_tool:
-            print(
-                "---RAG DECISION: Query requires web search. Proceed to web search tool.---"
-            )
+            logger.debug("RAG DECISION: Query requires web search. Proceed to web search tool.")
             return "web_search"
         else:
-            print(
-                "---RAG DECISION: Query requires web search, but tool not available. Defaulting to internal retrieval.---"
-            )
+            logger.debug("RAG DECISION: Query requires web search, but tool not available. Defaulting to internal retrieval.")
             return "retrieve_internal"
     else:  
-        print(
-            "---RAG DECISION: Query is ambiguous/general, defaulting to internal document retrieval.---"
-        )
+        logger.debug("RAG DECISION: Query is ambiguous/general, defaulting to internal document retrieval.")
         return "retrieve_internal"
 
 
 
 def decide_to_summarize_or_transform_rag(state: GraphState):
-    print("\n---RAG DECISION NODE (Document Grade Check)---")
+    logger.debug("RAG DECISION NODE (Document Grade Check)")
     relevance_grade = state["relevance_grade"]
     query_rewrite_attempted = state.get("query_rewrite_attempted", False)
-    print(f"RAG Grade: {relevance_grade}, Rewrite Attempted: {query_rewrite_attempted}")
+    logger.debug("RAG Grade: %s, Rewrite Attempted: %s", relevance_grade, query_rewrite_attempted)
 
     if relevance_grade == "yes":
-        print(
-            "---RAG DECISION: Documents relevant, proceed to context summarization.---"
-        )
+        logger.debug("RAG DECISION: Documents relevant, proceed to context summarization.")
         return "summarize_context"
     else:  
         if not query_rewrite_attempted:
-            print(
-                "---RAG DECISION: No relevant documents, attempting query transformation.---"
-            )
+            logger.debug("RAG DECISION: No relevant documents, attempting query transformation.")
             return "transform_query"
         else:
-            print(
-                "---RAG DECISION: Query transformation already attempted, no relevant documents found, proceed to generation (failure).---"
-            )
+            logger.debug("RAG DECISION: Query transformation already attempted, no relevant documents found, proceed to generation (failure).")
             return "generate"
 
 
@@ -360,32 +523,32 @@ MAX_ATTEMPTS = 2
 
 
 def decide_to_loop_or_end_rag(state: GraphState):
-    print("\n---RAG DECISION NODE (Critique Check)---")
+    logger.debug("RAG DECISION NODE (Critique Check)")
     critique_status = state["critique_status"]
     attempt_count = state["attempt_count"]
-    print(f"Critique Status: {critique_status}, Attempt Count: {attempt_count}")
+    logger.debug("Critique Status: %s, Attempt Count: %s", critique_status, attempt_count)
 
     if critique_status == "PASS":
-        print("---RAG DECISION: Critique passed, ending workflow.---")
+        logger.debug("RAG DECISION: Critique passed, ending workflow.")
         return "end"
     elif attempt_count < MAX_ATTEMPTS:
-        print(
-            f"---RAG DECISION: Critique failed (Attempt {attempt_count}/{MAX_ATTEMPTS}). Retrying retrieval.---"
-        )
-        
-        state["generation"] = None
-        state["summarized_context"] = None
-        state["documents"] = []  
-        state["relevance_grade"] = "unknown"
-        return "retry"  
+        logger.debug("RAG DECISION: Critique failed (Attempt %s/%s). Retrying with a wider retrieval.", attempt_count, MAX_ATTEMPTS)
+        return "retry"
     else:
-        print(
-            f"---RAG DECISION: Critique failed and max attempts ({MAX_ATTEMPTS}) reached. Ending workflow.---"
-        )
+        logger.debug("RAG DECISION: Critique failed and max attempts (%s) reached. Ending workflow.", MAX_ATTEMPTS)
+        return "end"
+
+
+def decide_after_retry_retrieve(state: GraphState):
+    logger.debug("RAG DECISION NODE (Retry Retrieval)")
+    if state.get("retry_new_chunks", 0) == 0:
+        logger.debug("RAG DECISION: Retry found no unseen documents, keeping the previous answer.")
+        metrics.incr("rag.retry.no_new_chunks")
         return "end"
+    return "grade_documents"
 
 
-def compile_rag_workflow():
+def compile_rag_workflow(render_diagram=False):
     global rag_graph_compiled
     
     if not (
@@ -396,36 +559,53 @@ def compile_rag_workflow():
         and models.context_summarizer_chain
         and models.critique_chain
     ):
-        print(
-            "RAG LangGraph workflow compilation skipped due to chain initialization failure."
-        )
+        logger.warning("RAG LangGraph workflow compilation skipped due to chain initialization failure.")
         rag_graph_compiled = None
         return False
 
     workflow_rag = StateGraph(GraphState)
 
     
-    workflow_rag.add_node("classify_query", classify_query_node_rag)
-    workflow_rag.add_node("web_search", web_search_tool_node_rag)
-    workflow_rag.add_node("retrieve", retrieve_node_rag)
-    workflow_rag.add_node("grade_documents", grade_documents_node_rag)
-    workflow_rag.add_node("transform_query", transform_query_node_rag)
-    workflow_rag.add_node("summarize_context", summarize_context_node_rag)
-    workflow_rag.add_node("generate", generate_node_rag)
-    workflow_rag.add_node("critique_answer", critique_answer_node_rag)
-
-   
-    workflow_rag.set_entry_point("classify_query")
-
-    
-    workflow_rag.add_conditional_edges(
-        "classify_query",
-        decide_route_on_query_classification,
-        {
-            "retrieve_internal": "retrieve",
-            "web_search": "web_search",
-        },
-    )
+    workflow_rag.add_node("classify_query", _instrumented("classify_query", classify_query_node_rag))
+    workflow_rag.add_node("web_search", _instrumented("web_search", web_search_tool_node_rag))
+    workflow_rag.add_node("retrieve", _instrumented("retrieve", retrieve_node_rag))
+    workflow_rag.add_node("grade_documents", _instrumented("grade_documents", grade_documents_node_rag))
+    workflow_rag.add_node("transform_query", _instrumented("transform_query", transform_query_node_rag))
+    workflow_rag.add_node("summarize_context", _instrumented("summarize_context", summarize_context_node_rag))
+    workflow_rag.add_node("generate", _instrumented("generate", generate_node_rag))
+    workflow_rag.add_node("critique_answer", _instrumented("critique_answer", critique_answer_node_rag))
+    workflow_rag.add_node("retry_retrieve", _instrumented("retry_retrieve", retry_retrieve_node_rag))
+
+    if settings.RAG_SPECULATIVE_RETRIEVAL:
+        # Retrieval (and optionally grading) starts alongside classification; the
+        # speculative result is only thrown away if the query is routed to web search.
+        workflow_rag.add_node("speculative_retrieve", _instrumented("speculative_retrieve", speculative_retrieve_node_rag))
+        workflow_rag.add_node("join_speculation", join_speculation_node_rag)
+        workflow_rag.add_edge(START, "classify_query")
+        workflow_rag.add_edge(START, "speculative_retrieve")
+        workflow_rag.add_edge(["classify_query", "speculative_retrieve"], "join_speculation")
+        workflow_rag.add_conditional_edges(
+            "join_speculation",
+            decide_route_after_speculation,
+            {
+                "web_search": "web_search",
+                "grade_documents": "grade_documents",
+                "transform_query": "transform_query",
+                "summarize_context": "summarize_context",
+                "generate": "generate",
+            },
+        )
+    else:
+        workflow_rag.set_entry_point("classify_query")
+
+        workflow_rag.add_conditional_edges(
+            "classify_query",
+            decide_route_on_query_classification,
+            {
+                "retrieve_internal": "retrieve",
+                "web_search": "web_search",
+            },
+        )
 
     
     workflow_rag.add_edge("web_search", "grade_documents")
@@ -458,37 +638,52 @@ def compile_rag_workflow():
         "critique_answer",
         decide_to_loop_or_end_rag,
         {
-            "retry": "retrieve",
+            "retry": "retry_retrieve",
+            "end": END,
+        },
+    )
+
+    workflow_rag.add_conditional_edges(
+        "retry_retrieve",
+        decide_after_retry_retrieve,
+        {
+            "grade_documents": "grade_documents",
             "end": END,
         },
     )
 
     try:
         rag_graph_compiled = workflow_rag.compile()
-        print("RAG LangGraph workflow compiled successfully.")
-        
-        try:
-            rag_graph_compiled.get_graph().draw_png("rag_workflow.png")
-            print("RAG workflow graph saved as rag_workflow.png")
-        except Exception as e:
-            print(
-                f"Warning: Could not draw PNG graph. Ensure graphviz and pygraphviz are installed. Error: {e}"
-            )
+        logger.info("RAG LangGraph workflow compiled successfully.")
 
-        
-        try:
-            mermaid_syntax = rag_graph_compiled.get_graph().draw_mermaid()
-            with open("rag_workflow.mermaid", "w") as f:
-                f.write(mermaid_syntax)
-            print(
-                "RAG workflow Mermaid syntax saved to rag_workflow.mermaid. Paste into Mermaid Live Editor (https://mermaid.live)."
-            )
-        except Exception as e:
-            print(f"Warning: Could not generate Mermaid graph. Error: {e}")
+        if render_diagram:
+            render_rag_workflow_diagram()
 
         return True
     except Exception as e:
-        print(f"FATAL ERROR: Error compiling RAG LangGraph workflow: {e}")
-        print(traceback.format_exc())
+        logger.exception("Error compiling RAG LangGraph workflow: %s", e)
         rag_graph_compiled = None
         return False
+
+
+def render_rag_workflow_diagram():
+    if rag_graph_compiled is None:
+        logger.debug("RAG workflow diagram not rendered: graph is not compiled.")
+        return False
+
+    try:
+        rag_graph_compiled.get_graph().draw_png("rag_workflow.png")
+        logger.info("RAG workflow graph saved as rag_workflow.png")
+    except Exception as e:
+        logger.warning("Could not draw PNG graph. Ensure graphviz and pygraphviz are installed. Error: %s", e)
+
+    try:
+        mermaid_syntax = rag_graph_compiled.get_graph().draw_mermaid()
+        with open("rag_workflow.mermaid", "w") as f:
+            f.write(mermaid_syntax)
+        logger.info("RAG workflow Mermaid syntax saved to rag_workflow.mermaid. Paste into Mermaid Live Editor (https://mermaid.live).")
+    except Exception as e:
+        logger.warning("Could not generate Mermaid graph. Error: %s", e)
+        return False
+
+    return True
@@ -0,0 +1,180 @@
+import contextvars
+import hashlib
+import re
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+
+from ..core import metrics, vectorstores
+
+DEFAULT_K = 4
+FANOUT_WORKERS = 8
+# Words dropped from a question to form its keyword variant.
+_QUERY_STOPWORDS = {
+    "a", "about", "an", "and", "are", "as", "at", "be", "by", "can", "could", "define", "describe", "did", "do",
+    "does", "explain", "for", "from", "give", "how", "in", "is", "it", "its", "main", "me", "mentioned", "of", "on",
+    "or", "should", "state", "tell", "that", "the", "their", "there", "these", "this", "those", "to", "was", "were",
+    "what", "when", "where", "which", "who", "why", "with", "would",
+}
+
+_fanout_executor = None
+_fanout_lock = threading.Lock()
+
+
+def chunk_id(document):
+    metadata = document.metadata or {}
+    key = f"{metadata.get('source')}\x00{metadata.get('start_index')}\x00{document.page_content}"
+    return hashlib.sha1(key.encode("utf-8")).hexdigest()[:16]
+
+
+def with_chunk_ids(documents):
+    for document in documents:
+        if document.metadata is None:
+            document.metadata = {}
+        document.metadata.setdefault("chunk_id", chunk_id(document))
+    return documents
+
+
+def base_k(retriever):
+    search_kwargs = getattr(retriever, "search_kwargs", None) or {}
+    return search_kwargs.get("k", DEFAULT_K)
+
+
+# Returns up to `k` chunks for `question` that are not in `exclude_ids`. The
+# vector store is asked for k + len(exclude_ids) hits so excluded chunks never
+# crowd out unseen ones; this works for any LangChain vector store.
+def retrieve_unseen(retriever, question, k, exclude_ids=()):
+    exclude_ids = set(exclude_ids)
+    vectorstore = getattr(retriever, "vectorstore", None)
+    if vectorstore is None:
+        documents = retriever.invoke(question)
+    else:
+        documents = vectorstore.similarity_search(question, k=k + len(exclude_ids))
+    documents = with_chunk_ids(list(documents))
+    return [document for document in documents if document.metadata["chunk_id"] not in exclude_ids][:k]
+
+
+def retrieval_profile(name):
+    profile = {"min_score": settings.RETRIEVAL_MIN_SCORE, "max_gap": settings.RETRIEVAL_MAX_SCORE_GAP}
+    profile.update(settings.RETRIEVAL_PROFILES[name])
+    # An override with max_k below min_k (or non-positive counts) still returns at least one chunk.
+    profile["max_k"] = max(1, int(profile["max_k"]))
+    profile["min_k"] = min(max(0, int(profile["min_k"])), profile["max_k"])
+    return profile
+
+
+# Keeps scored chunks (most similar first) until one falls below min_score or more
+# than max_gap below the previous chunk; the first min_k are always kept and at
+# most max_k are returned. Returns (documents, reason the list was cut).
+def cut_by_score(scored, min_k, max_k, min_score, max_gap):
+    kept, previous = [], None
+    for document, score in scored:
+        if len(kept) >= max_k:
+            return kept, "max_k"
+        if len(kept) >= min_k:
+            if score < min_score:
+                return kept, "score"
+            if previous is not None and previous - score > max_gap:
+                return kept, "gap"
+        kept.append(document)
+        previous = score
+    return kept, "pool"
+
+
+# Adaptive top-k for one endpoint profile (see RETRIEVAL_PROFILES): narrow
+# questions whose relevance falls off quickly get fewer chunks, broad ones more.
+# Falls back to the retriever's fixed k when adaptive retrieval is off or the
+# retriever has no vector store to score against.
+def adaptive_retrieve(retriever, query, profile_name):
+    vectorstore = getattr(retriever, "vectorstore", None)
+    if not settings.ADAPTIVE_RETRIEVAL or vectorstore is None:
+        documents, reason = list(retriever.invoke(query)), "fixed"
+    else:
+        profile = retrieval_profile(profile_name)
+        pool = max(settings.RETRIEVAL_CANDIDATE_POOL, profile["max_k"])
+        scored = vectorstores.similarity_search_with_similarity(vectorstore, query, pool)
+        documents, reason = cut_by_score(
+            scored, profile["min_k"], profile["max_k"], profile["min_score"], profile["max_gap"]
+        )
+    metrics.observe(f"retrieval.k.{profile_name}", len(documents))
+    metrics.incr(f"retrieval.cutoff.{reason}")
+    return with_chunk_ids(documents)
+
+
+def _executor():
+    global _fanout_executor
+    with _fanout_lock:
+        if _fanout_executor is None:
+            _fanout_executor = ThreadPoolExecutor(max_workers=FANOUT_WORKERS, thread_name_prefix="retrieval-fanout")
+        return _fanout_executor
+
+
+def _content_words(text):
+    return [word for word in re.findall(r"[\w’'-]+", text) if word.lower() not in _QUERY_STOPWORDS]
+
+
+# Cheap query variants without an LLM: the question itself, its keywords, and
+# each clause of a compound question ("What is X and what limits it?").
+def local_query_variants(question, limit):
+    variants = [question]
+    keywords = " ".join(_content_words(question))
+    if keywords:
+        variants.append(keywords)
+    clauses = [clause.strip() for clause in re.split(r"\band\b|[;?]", question) if clause.strip()]
+    if len(clauses) > 1:
+        variants.extend(clause for clause in clauses if len(_content_words(clause)) >= 2)
+    unique, seen = [], set()
+    for variant in variants:
+        key = " ".join(re.findall(r"\w+", variant.lower()))
+        if key and key not in seen:
+            seen.add(key)
+            unique.append(variant)
+    return unique[:limit]
+
+
+# Reciprocal rank fusion: a chunk scores sum(1 / (rrf_k + rank)) over the
+# rankings it appears in, so chunks several variants agree on rise to the top.
+# A chunk repeated within one ranking counts once, at its best rank; ties keep
+# the order in which chunks were first seen.
+def fuse_rankings(rankings, rrf_k, limit):
+    scores, documents = {}, {}
+    for ranking in rankings:
+        ranked = set()
+        for rank, document in enumerate(with_chunk_ids(list(ranking)), 1):
+            key = document.metadata["chunk_id"]
+            if key in ranked:
+                continue
+            ranked.add(key)
+            documents.setdefault(key, document)
+            scores[key] = scores.get(key, 0.0) + 1.0 / (rrf_k + rank)
+    fused = sorted(scores, key=lambda key: scores[key], reverse=True)[:limit]
+    return [documents[key] for key in fused]
+
+
+# Retrieves every query variant in parallel and fuses the rankings. Queries
+# from generate_queries (e.g. an LLM rewrite) are produced concurrently with the
+# local variants' retrieval and retrieved as they arrive. The fused list is as
+# long as the longest single-variant result. Returns (documents, queries used).
+def multi_query_retrieve(retriever, queries, profile_name, generate_queries=None):
+    executor = _executor()
+
+    def retrieve(query):
+        return adaptive_retrieve(retriever, query, profile_name)
+
+    def retrieve_generated():
+        generated = [query for query in generate_queries() if query and query not in queries]
+        return generated, [retrieve(query) for query in generated]
+
+    futures = [executor.submit(contextvars.copy_context().run, retrieve, query) for query in queries]
+    generated_future = executor.submit(contextvars.copy_context().run, retrieve_generated) if generate_queries else None
+    rankings = [future.result() for future in futures]
+    used = list(queries)
+    if generated_future is not None:
+        generated, generated_rankings = generated_future.result()
+        used += generated
+        rankings += generated_rankings
+    documents = fuse_rankings(rankings, settings.RAG_RRF_K, max((len(ranking) for ranking in rankings), default=0))
+    metrics.observe("rag.multi_query.variants", len(used))
+    metrics.observe("rag.multi_query.candidates", len({doc.metadata["chunk_id"] for ranking in rankings for doc in ranking}))
+    return documents, used
@@ -0,0 +1,51 @@
+import json
+import threading
+from unittest import mock
+
+from django.test import SimpleTestCase
+
+from doc_ai_api import views
+from doc_ai_api.core import llm_scheduler
+from doc_ai_api.rag_processing import graph
+
+
+class PriorityRecordingGraph:
+    def __init__(self):
+        self.priorities = []
+
+    def invoke(self, state, config=None):
+        self.priorities.append(llm_scheduler._current_priority.get())
+        return {"generation": f"answer to {state['question']}"}
+
+
+class StreamBatchAnswersTests(SimpleTestCase):
+    def setUp(self):
+        self.graph = PriorityRecordingGraph()
+        patcher = mock.patch.object(graph, "rag_graph_compiled", self.graph)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_questions_run_at_batch_priority(self):
+        questions = ["What is stress?", "What is  stress?", "What is strain?"]
+        unique = list(dict.fromkeys(views._normalize_question(question) for question in questions))
+        lines = [json.loads(line) for line in views._stream_batch_answers(questions, unique, 2)]
+        self.assertEqual(self.graph.priorities, ["batch", "batch"])
+        self.assertEqual(sorted(line["index"] for line in lines[:-1]), [0, 1, 2])
+        self.assertEqual(lines[-1]["status"], "done")
+        self.assertEqual(llm_scheduler._current_priority.get(), llm_scheduler.DEFAULT_PRIORITY)
+
+    def test_stream_can_be_closed_from_another_thread(self):
+        stream = views._stream_batch_answers(["What is stress?", "What is strain?"], ["What is stress?", "What is strain?"], 1)
+        next(stream)
+        errors = []
+
+        def close():
+            try:
+                stream.close()
+            except Exception as e:
+                errors.append(e)
+
+        thread = threading.Thread(target=close)
+        thread.start()
+        thread.join()
+        self.assertEqual(errors, [])
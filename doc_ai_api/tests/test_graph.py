@@ -0,0 +1,91 @@
+from unittest import mock
+
+from django.test import SimpleTestCase
+from langchain_core.documents import Document
+
+from doc_ai_api.core import models
+from doc_ai_api.rag_processing import graph
+
+
+class FailingSearchTool:
+    def run(self, query):
+        raise RuntimeError("search backend down")
+
+
+class StaticSearchTool:
+    def run(self, query):
+        return f"Results for {query}"
+
+
+def _state_after_speculation():
+    state = graph.build_initial_state("What is Hooke's law?")
+    speculative_ids = state["chunk_store"].add([Document(page_content="Stress is proportional to strain.")])
+    state.update({
+        "document_ids": speculative_ids,
+        "seen_chunk_ids": list(speculative_ids),
+        "summarized_context": "old summary",
+        "generation": "old answer",
+        "critique_status": "FAIL",
+    })
+    return state
+
+
+class WebSearchNodeTests(SimpleTestCase):
+    def _assert_reset(self, update):
+        self.assertEqual(update["seen_chunk_ids"], [])
+        self.assertIsNone(update["summarized_context"])
+        self.assertIsNone(update["generation"])
+        self.assertEqual(update["critique_status"], "none")
+
+    def test_success_discards_speculative_chunks(self):
+        with mock.patch.object(models, "web_search_tool", StaticSearchTool()):
+            update = graph.web_search_tool_node_rag(_state_after_speculation())
+        self.assertEqual(update["relevance_grade"], "yes")
+        self._assert_reset(update)
+
+    def test_error_resets_previous_attempt(self):
+        with mock.patch.object(models, "web_search_tool", FailingSearchTool()):
+            update = graph.web_search_tool_node_rag(_state_after_speculation())
+        self.assertEqual(update["relevance_grade"], "no")
+        self._assert_reset(update)
+
+    def test_missing_tool_resets_previous_attempt(self):
+        with mock.patch.object(models, "web_search_tool", None):
+            update = graph.web_search_tool_node_rag(_state_after_speculation())
+        self._assert_reset(update)
+
+
+class FakeVectorStore:
+    def __init__(self, count):
+        self.documents = [Document(page_content=f"chunk {i}", metadata={"source": "book.pdf"}) for i in range(count)]
+
+    def similarity_search(self, query, k):
+        return self.documents[:k]
+
+
+class FakeRetriever:
+    def __init__(self, vectorstore, k):
+        self.vectorstore = vectorstore
+        self.search_kwargs = {"k": k}
+
+
+class RetryRetrieveTests(SimpleTestCase):
+    def _retry(self, retrieval_k, base_k=4):
+        vectorstore = FakeVectorStore(40)
+        state = graph.build_initial_state("What is Hooke's law?")
+        first_pass = state["chunk_store"].add(vectorstore.documents[:retrieval_k])
+        state.update({"document_ids": first_pass, "seen_chunk_ids": list(first_pass), "retrieval_k": retrieval_k})
+        with mock.patch.object(graph, "retriever_rag", FakeRetriever(vectorstore, base_k)), \
+                self.settings(RAG_RETRY_K_STEP=3):
+            update = graph.retry_retrieve_node_rag(state)
+        return update, first_pass
+
+    def test_widens_from_adaptive_k_above_base_k(self):
+        update, first_pass = self._retry(retrieval_k=7)
+        self.assertEqual(update["retrieval_k"], 10)
+        self.assertEqual(update["retry_new_chunks"], 10)
+        self.assertFalse(set(update["document_ids"][len(first_pass):]) & set(first_pass))
+
+    def test_never_narrower_than_base_k(self):
+        update, _ = self._retry(retrieval_k=2)
+        self.assertEqual(update["retrieval_k"], 7)
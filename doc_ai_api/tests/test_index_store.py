@@ -0,0 +1,98 @@
+import os
+import shutil
+import tempfile
+from unittest import mock
+
+from django.test import SimpleTestCase
+
+from doc_ai_api.core import index_store, stubs, vectorstores
+
+
+class IndexStoreTests(SimpleTestCase):
+    def setUp(self):
+        root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, root, ignore_errors=True)
+        overrides = self.settings(RAG_INDEX_ROOT=root, RAG_INDEX_KEEP_VERSIONS=1, VECTOR_STORE_BACKEND="mmap")
+        overrides.enable()
+        self.addCleanup(overrides.disable)
+        # Collection runs explicitly in these tests, not on a background thread.
+        patcher = mock.patch.object(index_store, "schedule_garbage_collection")
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def _build(self, content="rows"):
+        with index_store.build_version(copy_current=False) as directory:
+            with open(os.path.join(directory, "data"), "w") as f:
+                f.write(content)
+        return index_store.current_version()
+
+    def test_failed_build_leaves_current_unchanged(self):
+        live = self._build()
+        with self.assertRaises(RuntimeError):
+            with index_store.build_version() as directory:
+                failed_directory = directory
+                raise RuntimeError("embedding failed")
+        self.assertEqual(index_store.current_version(), live)
+        self.assertFalse(os.path.exists(failed_directory))
+        self.assertEqual(index_store.list_versions(), [live])
+
+    def test_build_copies_the_live_index(self):
+        self._build("first")
+        with index_store.build_version() as directory:
+            with open(os.path.join(directory, "data"), "r") as f:
+                self.assertEqual(f.read(), "first")
+
+    def test_rollback_restores_previous_version(self):
+        first = self._build("first")
+        second = self._build("second")
+        self.assertEqual(index_store.rollback(), first)
+        self.assertEqual(index_store.current_version(), first)
+        self.assertEqual(index_store.read_pointer()["history"][0], second)
+        with open(os.path.join(index_store.current_directory(), "data"), "r") as f:
+            self.assertEqual(f.read(), "first")
+
+    def test_rollback_without_history_fails(self):
+        self._build()
+        with self.assertRaises(ValueError):
+            index_store.rollback()
+
+    def test_activate_rejects_unknown_version(self):
+        with self.assertRaises(ValueError):
+            index_store.activate("v-missing")
+
+    def test_garbage_collection_keeps_live_and_rollback_target(self):
+        oldest = self._build()
+        rollback_target = self._build()
+        live = self._build()
+        removed = index_store.collect_garbage()
+        self.assertEqual(removed, [oldest])
+        self.assertEqual(index_store.list_versions(), sorted([rollback_target, live]))
+        # After rolling back, the version just left becomes the rollback target.
+        self.assertEqual(index_store.rollback(), rollback_target)
+        self.assertEqual(index_store.collect_garbage(), [])
+        self.assertEqual(index_store.list_versions(), sorted([rollback_target, live]))
+
+    def test_garbage_collection_skips_builds_in_progress(self):
+        self._build()
+        # A build running in another process: only its marker is visible here.
+        building = index_store.version_directory("v-building")
+        os.makedirs(building)
+        open(os.path.join(building, index_store.BUILDING_MARKER), "w").close()
+        self.assertEqual(index_store.collect_garbage(keep=0), [])
+        self.assertTrue(os.path.isdir(building))
+
+    def test_garbage_collection_closes_cached_chroma_client(self):
+        from chromadb.api.client import SharedSystemClient
+
+        with self.settings(VECTOR_STORE_BACKEND="chroma"):
+            with index_store.build_version(copy_current=False) as directory:
+                store = vectorstores.open_vector_store(directory, embedding_function=stubs.StubEmbeddings())
+                store.add_texts(["Stress is proportional to strain."])
+            old = index_store.current_version()
+            self._build()
+            self._build()
+            self.assertIn(directory, SharedSystemClient._identifier_to_system)
+
+            self.assertEqual(index_store.collect_garbage(), [old])
+        self.assertNotIn(directory, SharedSystemClient._identifier_to_system)
+        self.assertFalse(os.path.exists(directory))
@@ -0,0 +1,153 @@
+import threading
+import time
+from typing import Any, List, Optional
+from unittest import mock
+
+from django.http import HttpResponse, StreamingHttpResponse
+from django.test import RequestFactory, SimpleTestCase
+from langchain_core.language_models.chat_models import BaseChatModel
+
+from doc_ai_api.core import llm_scheduler, metrics, stubs
+
+
+def _wait_until(condition, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        if time.monotonic() > deadline:
+            raise AssertionError("Condition not reached in time.")
+        time.sleep(0.001)
+
+
+class FailingChatModel(BaseChatModel):
+    @property
+    def _llm_type(self) -> str:
+        return "failing"
+
+    def _generate(self, messages: List[Any], stop: Optional[List[str]] = None, run_manager=None, **kwargs: Any):
+        raise RuntimeError("model crashed")
+
+
+class SlotOrderTests(SimpleTestCase):
+    def test_interactive_is_served_before_earlier_batch(self):
+        scheduler = llm_scheduler.LLMScheduler(1, {})
+        order = []
+        release_first = threading.Event()
+
+        def hold_slot():
+            with scheduler.slot("standard"):
+                release_first.wait()
+
+        def queued(priority):
+            with scheduler.slot(priority):
+                order.append(priority)
+
+        holder = threading.Thread(target=hold_slot)
+        holder.start()
+        _wait_until(lambda: scheduler.stats()["active"] == 1)
+        batch = threading.Thread(target=queued, args=("batch",))
+        batch.start()
+        _wait_until(lambda: scheduler.stats()["waiting"]["batch"] == 1)
+        interactive = threading.Thread(target=queued, args=("interactive",))
+        interactive.start()
+        _wait_until(lambda: scheduler.stats()["waiting"]["interactive"] == 1)
+
+        release_first.set()
+        for thread in (holder, batch, interactive):
+            thread.join(5)
+        self.assertEqual(order, ["interactive", "batch"])
+        self.assertEqual(scheduler.stats()["active"], 0)
+
+    def test_failed_generation_frees_the_slot(self):
+        scheduler = llm_scheduler.LLMScheduler(1, {})
+        model = llm_scheduler.ScheduledChatModel(inner=FailingChatModel(), scheduler=scheduler)
+        with self.assertRaises(RuntimeError):
+            model.invoke("hello")
+        self.assertEqual(scheduler.stats()["active"], 0)
+
+    def test_counts_output_tokens(self):
+        metrics.reset()
+        scheduler = llm_scheduler.LLMScheduler(1, {})
+        model = llm_scheduler.ScheduledChatModel(inner=stubs.StubChatModel(), scheduler=scheduler)
+        message = model.invoke("Question: what is strain?\nContext: Strain is the relative deformation.")
+        self.assertTrue(message.content)
+        self.assertEqual(metrics.counters()["llm.chain.direct.calls"], 1)
+        self.assertEqual(metrics.counters()["llm.priority.standard.calls"], 1)
+        self.assertGreater(metrics.counters()["llm.chain.direct.output_tokens"], 0)
+
+
+class AdmissionTests(SimpleTestCase):
+    def setUp(self):
+        metrics.reset()
+        self.scheduler = llm_scheduler.LLMScheduler(2, {"standard": 2})
+        patcher = mock.patch.object(llm_scheduler, "_scheduler", self.scheduler)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.request = RequestFactory().post("/api/qgen/", data="{}", content_type="application/json")
+
+    def _admitted(self):
+        return self.scheduler.stats()["admitted"]["standard"]
+
+    def test_saturated_class_is_refused_with_retry_after(self):
+        for seconds in (3.0, 5.0):
+            metrics.observe("llm.generation_seconds.standard", seconds)
+        self.assertTrue(self.scheduler.try_admit("standard"))
+        self.assertTrue(self.scheduler.try_admit("standard"))
+        self.assertFalse(self.scheduler.try_admit("standard"))
+        # Two requests ahead at 4s each, spread over two slots.
+        self.assertEqual(self.scheduler.retry_after_seconds("standard"), 4)
+
+        response = llm_scheduler.scheduled("standard")(lambda request: HttpResponse("ok"))(self.request)
+        self.assertEqual(response.status_code, 429)
+        self.assertEqual(response["Retry-After"], "4")
+
+    def test_retry_after_without_history_is_bounded(self):
+        self.scheduler.try_admit("standard")
+        self.scheduler.try_admit("standard")
+        retry_after = self.scheduler.retry_after_seconds("standard")
+        self.assertGreaterEqual(retry_after, 1)
+        self.assertLessEqual(retry_after, 60)
+
+    def test_view_exception_releases_admission(self):
+        def failing_view(request):
+            raise RuntimeError("view crashed")
+
+        with self.assertRaises(RuntimeError):
+            llm_scheduler.scheduled("standard")(failing_view)(self.request)
+        self.assertEqual(self._admitted(), 0)
+
+    def test_view_runs_at_its_priority_and_releases(self):
+        seen = []
+
+        def view(request):
+            seen.append(llm_scheduler._current_priority.get())
+            return HttpResponse("ok")
+
+        llm_scheduler.scheduled("standard")(view)(self.request)
+        self.assertEqual(seen, ["standard"])
+        self.assertEqual(self._admitted(), 0)
+
+    def test_stream_holds_admission_until_exhausted(self):
+        view = llm_scheduler.scheduled("standard")(lambda request: StreamingHttpResponse(iter([b"a", b"b"])))
+        response = view(self.request)
+        self.assertEqual(self._admitted(), 1)
+        self.assertEqual(b"".join(response.streaming_content), b"ab")
+        self.assertEqual(self._admitted(), 0)
+        response.close()
+        self.assertEqual(self._admitted(), 0)
+
+    def test_unread_stream_releases_on_close(self):
+        view = llm_scheduler.scheduled("standard")(lambda request: StreamingHttpResponse(iter([b"a"])))
+        response = view(self.request)
+        response.close()
+        self.assertEqual(self._admitted(), 0)
+
+    def test_failing_stream_releases_admission(self):
+        def chunks():
+            yield b"a"
+            raise RuntimeError("stream crashed")
+
+        view = llm_scheduler.scheduled("standard")(lambda request: StreamingHttpResponse(chunks()))
+        response = view(self.request)
+        with self.assertRaises(RuntimeError):
+            b"".join(response.streaming_content)
+        self.assertEqual(self._admitted(), 0)
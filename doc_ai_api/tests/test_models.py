@@ -0,0 +1,59 @@
+from unittest import mock
+
+from django.test import SimpleTestCase
+from langchain_core.messages import AIMessage
+from langchain_core.prompts import PromptTemplate
+from langchain_ollama import ChatOllama
+
+from doc_ai_api.core import llm_scheduler, models, stubs
+
+
+class ParseLabelTests(SimpleTestCase):
+    def test_plain_quoted_and_cased_labels(self):
+        self.assertEqual(models.parse_label("yes", ["yes", "no"]), "yes")
+        self.assertEqual(models.parse_label(' "No." ', ["yes", "no"]), "no")
+        self.assertEqual(models.parse_label("PASS", ["PASS", "FAIL"]), "PASS")
+
+    def test_separators_match_underscored_labels(self):
+        labels = ["rag_chat", "web_search"]
+        self.assertEqual(models.parse_label("web-search", labels), "web_search")
+        self.assertEqual(models.parse_label("Rag Chat", labels), "rag_chat")
+
+    def test_json_string_and_object(self):
+        self.assertEqual(models.parse_label('"yes"', ["yes", "no"]), "yes")
+        self.assertEqual(models.parse_label('{"grade": "no"}', ["yes", "no"]), "no")
+
+    def test_earliest_label_in_an_explanation_wins(self):
+        self.assertEqual(models.parse_label("No, although yes in part.", ["yes", "no"]), "no")
+
+    def test_labels_must_be_whole_words(self):
+        self.assertIsNone(models.parse_label("nothing relevant", ["yes", "no"]))
+        self.assertIsNone(models.parse_label("", ["yes", "no"]))
+
+    def test_message_content_is_parsed(self):
+        self.assertEqual(models.parse_label(AIMessage(content="FAIL"), ["PASS", "FAIL"]), "FAIL")
+
+
+class BuildChainTests(SimpleTestCase):
+    def _bound_kwargs(self, llm, chain_name, options):
+        with mock.patch.object(models, "llm", llm), \
+                self.settings(CHAIN_GENERATION_OPTIONS={chain_name: options}):
+            chain = models.build_chain(PromptTemplate.from_template("{question}"), chain_name)
+        return chain.bound.steps[1].kwargs
+
+    def test_chain_options_are_merged_over_model_options(self):
+        ollama = ChatOllama(model="llama3", temperature=0.1, num_ctx=8192, top_k=20, num_predict=512)
+        llm = llm_scheduler.ScheduledChatModel(inner=ollama, scheduler=llm_scheduler.LLMScheduler(1, {}))
+        kwargs = self._bound_kwargs(llm, "document_grader", {"num_predict": 4, "stop": ["\n"], "format": "json"})
+        self.assertEqual(kwargs["format"], "json")
+        self.assertEqual(kwargs["options"], {"temperature": 0.1, "num_ctx": 8192, "top_k": 20, "num_predict": 4, "stop": ["\n"]})
+
+    def test_other_models_get_default_temperature(self):
+        kwargs = self._bound_kwargs(stubs.StubChatModel(), "critique", {"num_predict": 4})
+        self.assertEqual(kwargs, {"options": {"temperature": models.LLM_TEMPERATURE, "num_predict": 4}})
+
+    def test_chain_without_options_is_not_bound(self):
+        llm = stubs.StubChatModel()
+        with mock.patch.object(models, "llm", llm), self.settings(CHAIN_GENERATION_OPTIONS={}):
+            chain = models.build_chain(PromptTemplate.from_template("{question}"), "rag")
+        self.assertIs(chain.bound.steps[1], llm)
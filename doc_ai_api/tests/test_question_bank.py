@@ -0,0 +1,116 @@
+import shutil
+import tempfile
+from unittest import mock
+
+from django.test import SimpleTestCase
+
+from doc_ai_api.core import models, question_bank, shared_json
+
+SECTION = {"id": "book.pdf#8.4", "number": "8.4", "title": "Stress-Strain Curve", "source": "book.pdf",
+           "text": "The stress-strain curve of a metal shows its elastic and plastic regions.", "sha256": "abc123"}
+BANDS = {"recall": [1, 5], "analysis": [16, 20]}
+
+
+class FakeChain:
+    def __init__(self, output):
+        self.output = output
+
+    def invoke(self, inputs):
+        return self.output
+
+
+class ParseQuestionsTests(SimpleTestCase):
+    def test_numbered_and_bulleted_items(self):
+        text = "1. What is Young's modulus?\n2) Define the elastic limit.\n- Why does a wire yield?\n• What is a strain?"
+        self.assertEqual(question_bank.parse_questions(text), [
+            "What is Young's modulus?", "Define the elastic limit.", "Why does a wire yield?", "What is a strain?",
+        ])
+
+    def test_malformed_output_is_rejected(self):
+        self.assertEqual(question_bank.parse_questions("Sure! Here are some questions about stress and strain."), [])
+        self.assertEqual(question_bank.parse_questions(""), [])
+        text = "Here are your questions:\n1. Recall questions:\n2. Why?\n3.\n4. What is the yield point?"
+        self.assertEqual(question_bank.parse_questions(text), ["What is the yield point?"])
+
+
+class BandForTests(SimpleTestCase):
+    def test_bands_are_inclusive(self):
+        with self.settings(QUESTION_BANK_BANDS=BANDS):
+            self.assertEqual(question_bank.band_for(1), "recall")
+            self.assertEqual(question_bank.band_for(5), "recall")
+            self.assertEqual(question_bank.band_for(16), "analysis")
+            self.assertIsNone(question_bank.band_for(10))
+            self.assertIsNone(question_bank.band_for(21))
+
+
+class DrawTests(SimpleTestCase):
+    def setUp(self):
+        root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, root, ignore_errors=True)
+        overrides = self.settings(
+            RAG_INDEX_ROOT=root, QUESTION_BANK_BANDS=BANDS, QUESTION_BANK_MIN_STOCK=0,
+            QUESTION_BANK_MAX_PER_BAND=40, QUESTION_BANK_BATCH=10, QUESTION_BANK_EXHAUSTED_TTL=3600,
+        )
+        overrides.enable()
+        self.addCleanup(overrides.disable)
+        patcher = mock.patch.object(question_bank, "schedule_build")
+        self.schedule_build = patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def _stock(self, count):
+        questions = [f"Question number {i} about stress?" for i in range(count)]
+        question_bank._bank.update(lambda bank: bank.setdefault(SECTION["sha256"], {}).update({"recall": questions}))
+        return questions
+
+    def _state_entry(self):
+        # A fresh reader, as another server process would see the file.
+        return shared_json.SharedJSONFile(question_bank._state_path).read()[f"{SECTION['sha256']}:recall"]
+
+    def test_cursor_does_not_repeat_across_draws(self):
+        questions = self._stock(6)
+        first = question_bank.draw(SECTION, 3, 3)
+        second = question_bank.draw(SECTION, 3, 3)
+        self.assertEqual(first + second, questions)
+        self.assertEqual(self._state_entry()["served"], 6)
+
+    def test_low_stock_requests_a_top_up(self):
+        self._stock(4)
+        self.assertIsNotNone(question_bank.draw(SECTION, 3, 3))
+        self.assertIsNone(question_bank.draw(SECTION, 3, 3))
+        self.assertTrue(self._state_entry()["top_up"])
+        self.schedule_build.assert_called()
+
+    def test_difficulty_outside_every_band(self):
+        self._stock(6)
+        self.assertIsNone(question_bank.draw(SECTION, 10, 3))
+
+    def test_exhausted_state_persists_and_rotates(self):
+        questions = self._stock(4)
+        # A batch that only repeats known questions marks the band exhausted.
+        duplicates = "\n".join(f"{i + 1}. {question}" for i, question in enumerate(questions))
+        with mock.patch.object(models, "question_generator_chain", FakeChain(duplicates)):
+            self.assertEqual(question_bank._generate(SECTION, "recall"), 0)
+        entry = self._state_entry()
+        self.assertIsNotNone(entry["exhausted_at"])
+        self.assertFalse(entry["top_up"])
+        self.assertTrue(question_bank._is_exhausted(entry))
+
+        self.assertEqual(question_bank.draw(SECTION, 3, 3), questions[:3])
+        # Not enough left for another request: an exhausted band starts over without a top-up.
+        self.assertEqual(question_bank.draw(SECTION, 3, 3), questions[:3])
+        self.schedule_build.assert_not_called()
+
+    def test_exhausted_band_is_retried_after_ttl(self):
+        self._stock(4)
+        with mock.patch.object(models, "question_generator_chain", FakeChain("No new questions.")):
+            question_bank._generate(SECTION, "recall")
+        with self.settings(QUESTION_BANK_EXHAUSTED_TTL=0):
+            self.assertFalse(question_bank._is_exhausted(self._state_entry()))
+
+    def test_new_questions_are_added_without_duplicates(self):
+        questions = self._stock(2)
+        output = f"1. {questions[0]}\n2. What limits the elastic region?\n3. what limits the ELASTIC region"
+        with mock.patch.object(models, "question_generator_chain", FakeChain(output)):
+            self.assertEqual(question_bank._generate(SECTION, "recall"), 1)
+        self.assertEqual(question_bank.stock(SECTION, "recall"), questions + ["What limits the elastic region?"])
+        self.assertIsNone(self._state_entry()["exhausted_at"])
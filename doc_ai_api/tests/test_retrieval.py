@@ -0,0 +1,137 @@
+from unittest import mock
+
+from django.test import SimpleTestCase
+from langchain_core.documents import Document
+
+from doc_ai_api.rag_processing import retrieval
+
+
+def _doc(name):
+    return Document(page_content=f"chunk {name}", metadata={"source": "book.pdf", "start_index": name})
+
+
+def _scored(*scores):
+    return [(_doc(i), score) for i, score in enumerate(scores)]
+
+
+def _names(documents):
+    return [document.metadata["start_index"] for document in documents]
+
+
+class FakeRetriever:
+    def __init__(self, scored_by_query=None, k=3):
+        self.scored_by_query = scored_by_query or {}
+        self.vectorstore = object() if scored_by_query is not None else None
+        self.search_kwargs = {"k": k}
+
+    def invoke(self, query):
+        return [_doc(i) for i in range(self.search_kwargs["k"])]
+
+
+class CutByScoreTests(SimpleTestCase):
+    def _cut(self, scored, min_k=1, max_k=5, min_score=0.5, max_gap=0.1):
+        documents, reason = retrieval.cut_by_score(scored, min_k, max_k, min_score, max_gap)
+        return _names(documents), reason
+
+    def test_stops_below_min_score(self):
+        self.assertEqual(self._cut(_scored(0.9, 0.85, 0.45, 0.44)), ([0, 1], "score"))
+
+    def test_stops_at_a_gap(self):
+        self.assertEqual(self._cut(_scored(0.9, 0.85, 0.7, 0.69)), ([0, 1], "gap"))
+
+    def test_min_k_is_kept_regardless_of_score(self):
+        self.assertEqual(self._cut(_scored(0.3, 0.1, 0.05), min_k=2), ([0, 1], "score"))
+
+    def test_min_k_zero_can_return_nothing(self):
+        self.assertEqual(self._cut(_scored(0.3, 0.2), min_k=0), ([], "score"))
+
+    def test_min_k_zero_still_checks_the_gap_after_the_first_chunk(self):
+        self.assertEqual(self._cut(_scored(0.9, 0.6), min_k=0), ([0], "gap"))
+
+    def test_max_k_and_exhausted_pool(self):
+        self.assertEqual(self._cut(_scored(0.9, 0.89, 0.88, 0.87), max_k=2), ([0, 1], "max_k"))
+        self.assertEqual(self._cut(_scored(0.9, 0.89)), ([0, 1], "pool"))
+
+
+class RetrievalProfileTests(SimpleTestCase):
+    def test_profile_overrides_defaults(self):
+        profiles = {"rag_chat": {"min_k": 1, "max_k": 3, "min_score": 0.6}}
+        with self.settings(RETRIEVAL_PROFILES=profiles, RETRIEVAL_MIN_SCORE=0.25, RETRIEVAL_MAX_SCORE_GAP=0.1):
+            self.assertEqual(
+                retrieval.retrieval_profile("rag_chat"),
+                {"min_k": 1, "max_k": 3, "min_score": 0.6, "max_gap": 0.1},
+            )
+
+    def test_counts_are_clamped(self):
+        profiles = {"inverted": {"min_k": 5, "max_k": 2}, "empty": {"min_k": -1, "max_k": 0}}
+        with self.settings(RETRIEVAL_PROFILES=profiles):
+            inverted = retrieval.retrieval_profile("inverted")
+            empty = retrieval.retrieval_profile("empty")
+        self.assertEqual((inverted["min_k"], inverted["max_k"]), (2, 2))
+        self.assertEqual((empty["min_k"], empty["max_k"]), (0, 1))
+
+
+class AdaptiveRetrieveTests(SimpleTestCase):
+    def _retrieve(self, retriever, profiles=None, adaptive=True):
+        profiles = profiles or {"rag_chat": {"min_k": 1, "max_k": 4}}
+        with self.settings(ADAPTIVE_RETRIEVAL=adaptive, RETRIEVAL_PROFILES=profiles, RETRIEVAL_CANDIDATE_POOL=2,
+                           RETRIEVAL_MIN_SCORE=0.5, RETRIEVAL_MAX_SCORE_GAP=0.2), \
+                mock.patch.object(retrieval.vectorstores, "similarity_search_with_similarity",
+                                  side_effect=lambda store, query, k: retriever.scored_by_query[query][:k]) as search:
+            documents = retrieval.adaptive_retrieve(retriever, "q", "rag_chat")
+        return documents, search
+
+    def test_cuts_candidates_and_assigns_chunk_ids(self):
+        documents, search = self._retrieve(FakeRetriever({"q": _scored(0.9, 0.8, 0.4, 0.3, 0.2)}))
+        self.assertEqual(_names(documents), [0, 1])
+        self.assertTrue(all("chunk_id" in document.metadata for document in documents))
+        # The pool is never smaller than the profile's max_k.
+        self.assertEqual(search.call_args.args[2], 4)
+
+    def test_fixed_k_when_adaptive_retrieval_is_off(self):
+        documents, search = self._retrieve(FakeRetriever({"q": []}, k=3), adaptive=False)
+        self.assertEqual(_names(documents), [0, 1, 2])
+        search.assert_not_called()
+
+    def test_fixed_k_without_a_vector_store(self):
+        documents, _ = self._retrieve(FakeRetriever(k=2))
+        self.assertEqual(_names(documents), [0, 1])
+
+
+class FuseRankingsTests(SimpleTestCase):
+    def test_chunks_shared_by_rankings_rise(self):
+        a, b, c = _doc("a"), _doc("b"), _doc("c")
+        fused = retrieval.fuse_rankings([[a, b], [c, b]], rrf_k=60, limit=3)
+        self.assertEqual(_names(fused), ["b", "a", "c"])
+
+    def test_ties_keep_first_seen_order(self):
+        fused = retrieval.fuse_rankings([[_doc("a")], [_doc("b")], [_doc("c")]], rrf_k=60, limit=3)
+        self.assertEqual(_names(fused), ["a", "b", "c"])
+
+    def test_duplicate_within_a_ranking_counts_once(self):
+        a, b = _doc("a"), _doc("b")
+        fused = retrieval.fuse_rankings([[a, _doc("a"), _doc("a")], [b]], rrf_k=1, limit=5)
+        self.assertEqual(_names(fused), ["a", "b"])
+        self.assertIs(fused[0], a)
+
+    def test_limit(self):
+        fused = retrieval.fuse_rankings([[_doc("a"), _doc("b"), _doc("c")]], rrf_k=60, limit=2)
+        self.assertEqual(_names(fused), ["a", "b"])
+
+
+class MultiQueryRetrieveTests(SimpleTestCase):
+    def test_fuses_local_and_generated_variants(self):
+        retriever = FakeRetriever({
+            "q": [(_doc("a"), 0.9), (_doc("b"), 0.85)],
+            "keywords": [(_doc("b"), 0.9), (_doc("c"), 0.85)],
+            "rewrite": [(_doc("b"), 0.9)],
+        })
+        with self.settings(ADAPTIVE_RETRIEVAL=True, RETRIEVAL_PROFILES={"rag_chat": {"min_k": 1, "max_k": 4}},
+                           RETRIEVAL_CANDIDATE_POOL=4, RAG_RRF_K=60), \
+                mock.patch.object(retrieval.vectorstores, "similarity_search_with_similarity",
+                                  side_effect=lambda store, query, k: retriever.scored_by_query[query][:k]):
+            documents, used = retrieval.multi_query_retrieve(
+                retriever, ["q", "keywords"], "rag_chat", generate_queries=lambda: ["rewrite", "q", ""]
+            )
+        self.assertEqual(used, ["q", "keywords", "rewrite"])
+        self.assertEqual(_names(documents), ["b", "a"])
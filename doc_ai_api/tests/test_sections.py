@@ -0,0 +1,86 @@
+import os
+import shutil
+import tempfile
+
+from django.test import SimpleTestCase
+
+from doc_ai_api.core import index_store, sections
+
+# Real headings are separated by body text; headings two lines apart read as a table of contents.
+BODY = "The body of this section explains the idea in enough detail\nto count as real text for the index,\nspread over a few lines."
+
+CHAPTER = "\n".join([
+    "CHAPTER EIGHT",
+    "8.1 Introduction",
+    "8.2 Stress and Strain",
+    "8.3 Hooke's Law",
+    "",
+    "Matter deforms under forces; this chapter studies how solids respond.",
+    "",
+    "8.1 INTRODUCTION",
+    BODY,
+    "8.2 STRESS AND STRAIN",
+    BODY,
+    "8.2.1 Shearing Strain",
+    BODY,
+    "8.3 HOOKE'S LAW",
+    BODY,
+    "SUMMARY",
+    "1. Stress is the restoring force per unit area.",
+    "EXERCISES",
+    "8.1 Steel Wire",
+    BODY,
+])
+
+
+class DetectSectionsTests(SimpleTestCase):
+    def setUp(self):
+        self.sections = sections.detect_sections(CHAPTER, "book.pdf")
+
+    def test_headings_in_the_contents_and_exercises_are_skipped(self):
+        self.assertEqual([section["number"] for section in self.sections], ["8.1", "8.2", "8.2.1", "8.3"])
+        self.assertEqual(self.sections[0]["id"], "book.pdf#8.1")
+
+    def test_titles_are_displayed_in_title_case(self):
+        self.assertEqual([section["title"] for section in self.sections],
+                         ["Introduction", "Stress and Strain", "Shearing Strain", "Hooke's Law"])
+
+    def test_section_includes_its_subsections_and_stops_at_end_matter(self):
+        stress = self.sections[1]
+        self.assertIn("Shearing Strain", stress["text"])
+        self.assertNotIn("Hooke", stress["text"])
+        self.assertNotIn("restoring force", self.sections[3]["text"])
+
+    def test_short_bodies_are_not_sections(self):
+        self.assertEqual(sections.detect_sections("8.1 INTRODUCTION\nToo short.\n", "book.pdf"), [])
+
+
+class MatchSectionTests(SimpleTestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory, ignore_errors=True)
+        # Recorded into a version being built, as ingest does, then published.
+        marker = os.path.join(self.directory, index_store.BUILDING_MARKER)
+        open(marker, "w").close()
+        sections.record(sections.detect_sections(CHAPTER, "book.pdf"), self.directory)
+        os.remove(marker)
+
+    def _match(self, topic):
+        with self.settings(SECTION_MATCH_THRESHOLD=0.6):
+            section = sections.match_section(topic, directory=self.directory)
+        return section["number"] if section else None
+
+    def test_match_by_number(self):
+        self.assertEqual(self._match("Summarize section 8.2.1 please"), "8.2.1")
+
+    def test_match_by_title_words(self):
+        self.assertEqual(self._match("Explain Hooke's law"), "8.3")
+        self.assertEqual(self._match("stress and strains"), "8.2")
+
+    def test_tie_goes_to_the_broader_section(self):
+        self.assertEqual(self._match("strain"), "8.2")
+
+    def test_unrelated_or_empty_topic(self):
+        self.assertIsNone(self._match("thermodynamics of gases"))
+        self.assertIsNone(self._match(""))
+        self.assertIsNone(self._match("what is the summary"))
@@ -0,0 +1,117 @@
+import threading
+import time
+from unittest import mock
+
+from django.http import HttpResponse
+from django.test import RequestFactory, SimpleTestCase
+
+from doc_ai_api.core import index_store, single_flight
+
+
+def _wait_until(condition, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        if time.monotonic() > deadline:
+            raise AssertionError("Condition not reached in time.")
+        time.sleep(0.001)
+
+
+class SingleFlightTests(SimpleTestCase):
+    def _run_concurrently(self, fn, callers=5):
+        group = single_flight.SingleFlight()
+        outcomes = []
+        outcomes_lock = threading.Lock()
+
+        def call():
+            try:
+                outcome = group.do("key", fn)
+            except Exception as e:
+                outcome = e
+            with outcomes_lock:
+                outcomes.append(outcome)
+
+        threads = [threading.Thread(target=call) for _ in range(callers)]
+        threads[0].start()
+        _wait_until(lambda: group.in_flight() == {"key": 0})
+        for thread in threads[1:]:
+            thread.start()
+        _wait_until(lambda: group.in_flight() == {"key": callers - 1})
+        return group, threads, outcomes
+
+    def test_identical_calls_run_once_and_share_the_result(self):
+        release = threading.Event()
+        calls = []
+
+        def fn():
+            calls.append(1)
+            release.wait(5)
+            return "answer"
+
+        group, threads, outcomes = self._run_concurrently(fn)
+        release.set()
+        for thread in threads:
+            thread.join(5)
+        self.assertEqual(len(calls), 1)
+        self.assertEqual(sorted(outcomes, key=lambda outcome: outcome[1]), [("answer", False)] + [("answer", True)] * 4)
+        self.assertEqual(group.in_flight(), {})
+
+    def test_all_waiters_receive_the_exception(self):
+        release = threading.Event()
+
+        def fn():
+            release.wait(5)
+            raise RuntimeError("pipeline failed")
+
+        group, threads, outcomes = self._run_concurrently(fn)
+        release.set()
+        for thread in threads:
+            thread.join(5)
+        self.assertEqual(len(outcomes), 5)
+        self.assertTrue(all(isinstance(outcome, RuntimeError) for outcome in outcomes))
+        self.assertEqual(group.in_flight(), {})
+
+    def test_later_call_runs_again(self):
+        group = single_flight.SingleFlight()
+        self.assertEqual(group.do("key", lambda: 1), (1, False))
+        self.assertEqual(group.do("key", lambda: 2), (2, False))
+
+
+class RequestKeyTests(SimpleTestCase):
+    def setUp(self):
+        patcher = mock.patch.object(index_store, "current_version", return_value="v1")
+        self.current_version = patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_whitespace_and_debug_flag_do_not_change_the_key(self):
+        self.assertEqual(
+            single_flight.request_key("rag_chat", b'{"question": "What is  strain?"}'),
+            single_flight.request_key("rag_chat", b'{"debug": true, "question": " What is strain? "}'),
+        )
+
+    def test_index_version_changes_the_key(self):
+        before = single_flight.request_key("rag_chat", b'{"question": "What is strain?"}')
+        self.current_version.return_value = "v2"
+        self.assertNotEqual(before, single_flight.request_key("rag_chat", b'{"question": "What is strain?"}'))
+
+    def test_endpoint_and_question_change_the_key(self):
+        key = single_flight.request_key("rag_chat", b'{"question": "What is strain?"}')
+        self.assertNotEqual(key, single_flight.request_key("direct_chat", b'{"question": "What is strain?"}'))
+        self.assertNotEqual(key, single_flight.request_key("rag_chat", b'{"question": "What is stress?"}'))
+
+    def test_invalid_json_is_not_coalesced(self):
+        self.assertIsNone(single_flight.request_key("rag_chat", b"{not json"))
+
+
+class CoalesceRequestsTests(SimpleTestCase):
+    def test_each_caller_gets_its_own_response_without_shared_trace_id(self):
+        def view(request):
+            response = HttpResponse(b'{"answer": "ok"}', content_type="application/json")
+            response["X-Trace-Id"] = "leader-trace"
+            return response
+
+        request = RequestFactory().post("/api/rag_chat/", data=b'{"question": "q"}', content_type="application/json")
+        with self.settings(REQUEST_COALESCING=True):
+            first = single_flight.coalesce_requests("rag_chat")(view)(request)
+        self.assertEqual(first.content, b'{"answer": "ok"}')
+        self.assertEqual(first["Content-Type"], "application/json")
+        self.assertNotIn("X-Trace-Id", first)
@@ -0,0 +1,79 @@
+import json
+import os
+import tempfile
+from unittest import mock
+
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test import RequestFactory, SimpleTestCase
+
+from doc_ai_api import upload_handlers, views
+
+
+LIMITS = {"UPLOAD_MAX_FILE_BYTES": 1000, "UPLOAD_MAX_REQUEST_BYTES": 4000, "UPLOAD_SPOOL_MAX_MEMORY_BYTES": 100}
+
+
+class HashingUploadHandlerTests(SimpleTestCase):
+    def _request(self, *contents):
+        files = [SimpleUploadedFile(f"doc{i}.txt", content, content_type="text/plain") for i, content in enumerate(contents)]
+        request = RequestFactory().post("/api/ingest/", data={"files": files})
+        request.upload_handlers = [upload_handlers.HashingUploadHandler(request)]
+        return request
+
+    def _unread_bytes(self, request):
+        return len(request._stream.read())
+
+    def test_hash_matches_file_on_disk(self):
+        content = b"Stress is proportional to strain.\n" * 20
+        with self.settings(**LIMITS):
+            request = self._request(content)
+            uploaded = request.FILES.getlist("files")
+        self.assertFalse(hasattr(request, "upload_rejected"))
+        self.assertEqual(uploaded[0].read(), content)
+
+        with tempfile.NamedTemporaryFile(delete=False) as f:
+            f.write(content)
+        self.addCleanup(os.remove, f.name)
+        from_disk = upload_handlers.hashed_file_from_path(f.name)
+        from_disk.close()
+        self.assertEqual(uploaded[0].sha256, from_disk.sha256)
+        self.assertEqual(uploaded[0].size, from_disk.size)
+
+    def test_declared_size_over_limit_is_rejected_unread(self):
+        with self.settings(**dict(LIMITS, UPLOAD_MAX_REQUEST_BYTES=500)):
+            request = self._request(b"x" * 600)
+            content_length = int(request.META["CONTENT_LENGTH"])
+            self.assertEqual(len(request.FILES), 0)
+        self.assertIn("request limit", request.upload_rejected)
+        self.assertEqual(self._unread_bytes(request), content_length)
+
+    def test_streamed_file_over_limit_is_rejected(self):
+        with self.settings(**LIMITS):
+            request = self._request(b"x" * 1500)
+            self.assertEqual(len(request.FILES), 0)
+        self.assertIn("per-file limit", request.upload_rejected)
+
+    def test_streamed_files_over_request_limit_are_rejected(self):
+        # Without a usable Content-Length the request limit is enforced on the
+        # sum of the streamed files, each of which is within the per-file limit.
+        request = RequestFactory().post("/api/ingest/")
+        with self.settings(**dict(LIMITS, UPLOAD_MAX_REQUEST_BYTES=2000)):
+            handler = upload_handlers.HashingUploadHandler(request)
+            self.assertIsNone(handler.handle_raw_input(None, {}, None, b"boundary"))
+            handler.new_file("files", "a.txt", "text/plain", None)
+            handler.receive_data_chunk(b"a" * 900, 0)
+            handler.file_complete(900).close()
+            handler.new_file("files", "b.txt", "text/plain", None)
+            handler.receive_data_chunk(b"b" * 900, 0)
+            handler.file_complete(900).close()
+            handler.new_file("files", "c.txt", "text/plain", None)
+            with self.assertRaises(upload_handlers.StopUpload):
+                handler.receive_data_chunk(b"c" * 900, 0)
+        self.assertIn("request limit", request.upload_rejected)
+
+    def test_view_returns_413(self):
+        with self.settings(**dict(LIMITS, UPLOAD_MAX_REQUEST_BYTES=500)), \
+                mock.patch.object(views.startup, "is_warming", return_value=False):
+            files = [SimpleUploadedFile("doc.txt", b"x" * 600, content_type="text/plain")]
+            response = views.ingest_documents(RequestFactory().post("/api/ingest/", data={"files": files}))
+        self.assertEqual(response.status_code, 413)
+        self.assertEqual(json.loads(response.content)["status"], "error")
@@ -0,0 +1,104 @@
+import json
+import os
+import shutil
+import tempfile
+
+import numpy as np
+from django.test import SimpleTestCase
+
+from doc_ai_api.benchmarks import runner, vector_stores
+from doc_ai_api.core import stubs, vector_index
+
+
+class FixedEmbeddings:
+    def __init__(self, vectors):
+        self.vectors = vectors
+
+    def embed_documents(self, texts):
+        return [self.vectors[text] for text in texts]
+
+    def embed_query(self, text):
+        return self.vectors[text]
+
+
+class MmapVectorStoreTests(SimpleTestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory, ignore_errors=True)
+        self.embeddings = stubs.StubEmbeddings(dimensions=64)
+
+    def _open(self, quantization="none", embeddings=None):
+        return vector_index.MmapVectorStore(self.directory, embeddings or self.embeddings, quantization=quantization)
+
+    def _manifest(self):
+        with open(os.path.join(self.directory, vector_index.MANIFEST_FILE), "r", encoding="utf-8") as f:
+            return json.load(f)
+
+    def test_append_and_reopen(self):
+        store = self._open()
+        first = store.add_texts(["stress and strain", "hooke's law"], metadatas=[{"n": 1}, {"n": 2}])
+        second = store.add_texts(["surface tension", "viscosity of fluids"], metadatas=[{"n": 3}, {"n": 4}])
+        self.assertEqual(len(store), 4)
+
+        reopened = self._open()
+        self.assertEqual(len(reopened), 4)
+        self.assertEqual(self._manifest()["count"], 4)
+        hits = reopened.similarity_search_with_score("viscosity of fluids", k=2)
+        self.assertEqual(hits[0][0].id, second[1])
+        self.assertEqual(hits[0][0].metadata, {"n": 4})
+        self.assertAlmostEqual(hits[0][1], 1.0, places=5)
+        ids = [doc_id for batch_ids, _, _, _ in reopened.iter_records(batch_size=3) for doc_id in batch_ids]
+        self.assertEqual(ids, first + second)
+
+    def test_quantized_codes_are_appended_and_rebuilt(self):
+        store = self._open("int8")
+        store.add_texts(["stress and strain"])
+        store.add_texts(["viscosity of fluids"])
+        codes_path = os.path.join(self.directory, vector_index.CODE_FILES["int8"])
+        self.assertEqual(os.path.getsize(codes_path), 2 * 64)
+
+        os.remove(codes_path)
+        reopened = self._open("int8")
+        self.assertEqual(os.path.getsize(codes_path), 2 * 64)
+        self.assertEqual(reopened.similarity_search("viscosity of fluids", k=1)[0].page_content, "viscosity of fluids")
+
+    def test_dimension_mismatch_is_rejected(self):
+        self._open().add_texts(["stress and strain"])
+        other = self._open(embeddings=FixedEmbeddings({"wide": [1.0] * 65}))
+        with self.assertRaises(ValueError):
+            other.add_texts(["wide"])
+        self.assertEqual(self._manifest()["count"], 1)
+        self.assertEqual(self._manifest()["dim"], 64)
+
+    def test_rows_beyond_manifest_are_ignored_and_truncated(self):
+        store = self._open()
+        store.add_texts(["stress and strain"])
+        # An add that crashed before rewriting the manifest leaves extra bytes behind.
+        with open(os.path.join(self.directory, vector_index.EMBEDDINGS_FILE), "ab") as f:
+            f.write(np.ones(64, dtype=np.float32).tobytes())
+        with open(os.path.join(self.directory, vector_index.METADATA_FILE), "ab") as f:
+            f.write(b'{"id": "orphan", "text": "orphan", "metadata": {}}\n')
+
+        reopened = self._open()
+        self.assertEqual(len(reopened), 1)
+        reopened.add_texts(["viscosity of fluids"])
+        self.assertEqual(os.path.getsize(os.path.join(self.directory, vector_index.EMBEDDINGS_FILE)), 2 * 64 * 4)
+        texts = [text for _, batch_texts, _, _ in self._open().iter_records() for text in batch_texts]
+        self.assertEqual(texts, ["stress and strain", "viscosity of fluids"])
+
+    def test_unknown_quantization_is_rejected(self):
+        with self.assertRaises(ValueError):
+            self._open("int4")
+
+
+class QuantizationRecallTests(SimpleTestCase):
+    def test_recall_on_sample_pdfs(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory, ignore_errors=True)
+        questions = [payload["question"] for payload in runner.load_question_set()["rag_chat"]]
+        report = vector_stores.quantization_recall(
+            vector_stores.sample_pdf_paths(), questions, stubs.StubEmbeddings(), directory, k=4
+        )
+        self.assertGreater(report["chunks"], 100)
+        self.assertGreaterEqual(report["mmap-int8"], 0.98)
+        self.assertGreaterEqual(report["mmap-binary"], 0.85)
@@ -0,0 +1,107 @@
+from unittest import mock
+
+from django.test import SimpleTestCase
+
+from doc_ai_api.core import web_search
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+class SearchBackendTests(SimpleTestCase):
+    def test_search_is_abstract(self):
+        class Incomplete(web_search.SearchBackend):
+            pass
+
+        with self.assertRaises(TypeError):
+            Incomplete()
+
+
+class TTLCacheTests(SimpleTestCase):
+    def setUp(self):
+        self.clock = FakeClock()
+        patcher = mock.patch.object(web_search.time, "monotonic", self.clock)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_entry_expires_after_ttl(self):
+        cache = web_search.TTLCache(ttl_seconds=10, max_entries=4)
+        cache.set("q", ["result"])
+        self.clock.now += 9.9
+        self.assertEqual(cache.get("q"), ["result"])
+        self.clock.now += 0.2
+        self.assertIsNone(cache.get("q"))
+        self.assertEqual(len(cache), 0)
+
+    def test_least_recently_used_entry_is_dropped(self):
+        cache = web_search.TTLCache(ttl_seconds=10, max_entries=2)
+        cache.set("a", 1)
+        cache.set("b", 2)
+        cache.get("a")
+        cache.set("c", 3)
+        self.assertEqual(cache.get("a"), 1)
+        self.assertIsNone(cache.get("b"))
+        self.assertEqual(cache.get("c"), 3)
+
+    def test_zero_ttl_disables_caching(self):
+        cache = web_search.TTLCache(ttl_seconds=0, max_entries=4)
+        cache.set("q", 1)
+        self.assertIsNone(cache.get("q"))
+
+
+class CircuitBreakerTests(SimpleTestCase):
+    def setUp(self):
+        self.clock = FakeClock()
+        patcher = mock.patch.object(web_search.time, "monotonic", self.clock)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.breaker = web_search.CircuitBreaker(failure_threshold=2, cooldown_seconds=30)
+
+    def _open(self):
+        self.breaker.record_failure()
+        self.breaker.record_failure()
+
+    def test_opens_after_threshold_failures(self):
+        self.breaker.record_failure()
+        self.assertEqual(self.breaker.state, web_search.CircuitBreaker.CLOSED)
+        self.assertTrue(self.breaker.allow())
+        self.breaker.record_failure()
+        self.assertEqual(self.breaker.state, web_search.CircuitBreaker.OPEN)
+        self.assertFalse(self.breaker.allow())
+        self.assertAlmostEqual(self.breaker.retry_after_seconds(), 30)
+
+    def test_success_resets_failure_count(self):
+        self.breaker.record_failure()
+        self.breaker.record_success()
+        self.breaker.record_failure()
+        self.assertEqual(self.breaker.state, web_search.CircuitBreaker.CLOSED)
+
+    def test_half_open_allows_one_trial_after_cooldown(self):
+        self._open()
+        self.clock.now += 30
+        self.assertTrue(self.breaker.allow())
+        self.assertEqual(self.breaker.state, web_search.CircuitBreaker.HALF_OPEN)
+        self.assertFalse(self.breaker.allow())
+
+    def test_successful_trial_closes(self):
+        self._open()
+        self.clock.now += 30
+        self.breaker.allow()
+        self.breaker.record_success()
+        self.assertEqual(self.breaker.state, web_search.CircuitBreaker.CLOSED)
+        self.assertTrue(self.breaker.allow())
+
+    def test_failed_trial_reopens(self):
+        self._open()
+        self.clock.now += 30
+        self.breaker.allow()
+        self.breaker.record_failure()
+        self.assertEqual(self.breaker.state, web_search.CircuitBreaker.OPEN)
+        self.assertFalse(self.breaker.allow())
+        self.clock.now += 29
+        self.assertFalse(self.breaker.allow())
@@ -0,0 +1,98 @@
+import hashlib
+import os
+import tempfile
+
+from django.conf import settings
+from django.core.files.uploadedfile import UploadedFile
+from django.core.files.uploadhandler import FileUploadHandler, StopUpload
+from django.http import QueryDict
+from django.utils.datastructures import MultiValueDict
+
+
+HASH_READ_SIZE = 64 * 1024
+
+
+class HashedUploadedFile(UploadedFile):
+    def __init__(self, file, name, content_type, size, charset, sha256, content_type_extra=None):
+        super().__init__(file, name, content_type, size, charset, content_type_extra)
+        self.sha256 = sha256
+
+
+# Receives each uploaded file in a single pass: the SHA-256 is computed while the
+# chunks arrive, content stays in memory up to UPLOAD_SPOOL_MAX_MEMORY_BYTES and
+# only larger files spill to an anonymous temporary file. Uploads over the
+# per-file or per-request limit stop parsing and set `request.upload_rejected`,
+# which the view turns into a 413. A declared Content-Length over the request
+# limit is refused before any of the body is read.
+class HashingUploadHandler(FileUploadHandler):
+    def __init__(self, request=None):
+        super().__init__(request)
+        self.max_file_bytes = settings.UPLOAD_MAX_FILE_BYTES
+        self.max_request_bytes = settings.UPLOAD_MAX_REQUEST_BYTES
+        self.request_bytes = 0
+
+    def _mark_rejected(self, message):
+        if self.request is not None:
+            self.request.upload_rejected = message
+
+    def _reject(self, message):
+        self._mark_rejected(message)
+        raise StopUpload(connection_reset=False)
+
+    def handle_raw_input(self, input_data, META, content_length, boundary, encoding=None):
+        # Returning parsed data here skips the multipart parser entirely, so the
+        # oversized body is never read (StopUpload would drain all of it).
+        if content_length and content_length > self.max_request_bytes:
+            self._mark_rejected(f"Upload of {content_length} bytes exceeds the {self.max_request_bytes} byte request limit.")
+            return QueryDict(encoding=encoding), MultiValueDict()
+        return None
+
+    def new_file(self, *args, **kwargs):
+        super().new_file(*args, **kwargs)
+        self.file = tempfile.SpooledTemporaryFile(max_size=settings.UPLOAD_SPOOL_MAX_MEMORY_BYTES)
+        self.hasher = hashlib.sha256()
+        self.file_bytes = 0
+
+    def receive_data_chunk(self, raw_data, start):
+        self.file_bytes += len(raw_data)
+        self.request_bytes += len(raw_data)
+        if self.file_bytes > self.max_file_bytes:
+            self.file.close()
+            self._reject(f"File '{self.file_name}' exceeds the {self.max_file_bytes} byte per-file limit.")
+        if self.request_bytes > self.max_request_bytes:
+            self.file.close()
+            self._reject(f"Upload exceeds the {self.max_request_bytes} byte request limit.")
+        self.hasher.update(raw_data)
+        self.file.write(raw_data)
+        return None
+
+    def file_complete(self, file_size):
+        self.file.seek(0)
+        return HashedUploadedFile(
+            file=self.file,
+            name=self.file_name,
+            content_type=self.content_type,
+            size=file_size,
+            charset=self.charset,
+            sha256=self.hasher.hexdigest(),
+            content_type_extra=self.content_type_extra,
+        )
+
+    def upload_interrupted(self):
+        if hasattr(self, "file"):
+            self.file.close()
+
+
+def hashed_file_from_path(path, content_type="text/plain"):
+    hasher = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(HASH_READ_SIZE), b""):
+            hasher.update(block)
+    return HashedUploadedFile(
+        file=open(path, "rb"),
+        name=os.path.basename(path),
+        content_type=content_type,
+        size=os.path.getsize(path),
+        charset="utf-8",
+        sha256=hasher.hexdigest(),
+    )
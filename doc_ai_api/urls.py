@@ -5,6 +5,9 @@ urlpatterns = [
     path('ingest_documents/', views.ingest_documents, name='ingest_documents'),
     path('clear_documents_db/', views.clear_documents_db, name='clear_documents_db'),
     path('rag_chat/', views.rag_chat, name='rag_chat'),
+    path('rag_chat/batch/', views.rag_chat_batch, name='rag_chat_batch'),
     path('qgen/', views.qgen_questions, name='qgen_questions'),
     path('summarize/', views.summarize_content, name='summarize_content'),
+    path('ready/', views.readiness, name='readiness'),
+    path('metrics/', views.metrics_snapshot, name='metrics'),
 ]
\ No newline at end of file
@@ -1,175 +1,118 @@
 import json
+import logging
 import os
 import shutil
-import traceback
-from django.http import JsonResponse, HttpResponse
+import time
+from django.http import JsonResponse, HttpResponse, StreamingHttpResponse, FileResponse, Http404
+from django.utils.cache import patch_cache_control
 from django.views.decorators.csrf import csrf_exempt
-from django.core.files.storage import FileSystemStorage
+from django.views.decorators.http import condition
 from django.conf import settings
 
 from .core import models
 from .core import utils
+from .core import startup
+from .core import metrics
+from .core import context_packing
+from .core import web_search
+from .core import vectorstores
+from .core import index_store
+from .core import ingest_registry
+from .core import sections
+from .core import question_bank
+from .core import media_cache
+from .core import single_flight
+from .core import llm_scheduler
+from .core import tracing
+from .core import logs
+from . import upload_handlers
 from .rag_processing import graph as rag_graph_module 
+from .rag_processing import retrieval
 
-from langchain_community.vectorstores import Chroma
 from langchain.text_splitter import RecursiveCharacterTextSplitter
-from langchain_core.documents import Document
-
-
-def handle_uploaded_files(uploaded_files):
-    temp_dir = settings.PDF_TEMP_DIR
-    os.makedirs(temp_dir, exist_ok=True)
-    temp_file_paths = []
-    fs = FileSystemStorage(location=temp_dir)
-    for file in uploaded_files:
-        filename = file.name
-        safe_filename = os.path.basename(filename)
-        saved_path = fs.save(safe_filename, file)
-        temp_file_paths.append(fs.path(saved_path))
-    return temp_file_paths
-
-def process_text_files_logic(file_paths):
-    all_chunks = []
-    processed_file_names = []
-    print(f"\n--- Django API: Ingesting {len(file_paths)} file(s) into persistent DB ---")
-    try:
-        for file_path in file_paths:
-             file_name = os.path.basename(file_path)
-             processed_file_names.append(file_name)
-             print(f"Django API: Ingesting file: {file_name}")
-
-             with open(file_path, 'r', encoding='utf-8') as f:
-                 document_content = f.read()
-             cleaned_content = utils.clean_text(document_content)
-             docs = [Document(page_content=chunk, metadata={"source": file_name})
-                     for chunk in RecursiveCharacterTextSplitter(chunk_size=800, chunk_overlap=100).split_text(cleaned_content)]
-             all_chunks.extend(docs)
-             print(f"Django API: Chunked '{file_name}' into {len(docs)} chunks.")
-
-        if not all_chunks:
-             raise Exception("Error: Uploaded documents resulted in no valid chunks for ingestion.")
+from langchain_core.runnables import RunnableLambda
 
-        print(f"Django API: Total chunks for ingestion: {len(all_chunks)}.")
+logger = logging.getLogger(__name__)
 
-        if models.embeddings is None:
-             raise Exception("Embedding model failed to initialize.")
 
-        chroma_dir_rag = settings.CHROMA_DB_DIR_RAG
-        pdf_temp_dir = settings.PDF_TEMP_DIR 
+def warming_up_response():
+    if not startup.is_warming():
+        return None
+    response = JsonResponse({
+        'status': 'error',
+        'message': 'Server is still warming up models and index. Please retry shortly.',
+        'components': startup.component_status(),
+    }, status=503)
+    response['Retry-After'] = '5'
+    return response
 
-        try:
-            if os.path.exists(chroma_dir_rag) and os.listdir(chroma_dir_rag): 
-                print(f"Django API: Attempting graceful ChromaDB reset at {chroma_dir_rag}.")
-                temp_chroma_client_rag = Chroma(
-                    persist_directory=chroma_dir_rag,
-                    embedding_function=models.embeddings
-                )
-                temp_chroma_client_rag.delete_collection(name=None) 
-                temp_chroma_client_rag.reset() 
-                print(f"Django API: Successfully reset ChromaDB at {chroma_dir_rag}.")
-        except Exception as e:
-            print(f"Django API: Warning: Graceful ChromaDB reset failed for {chroma_dir_rag}: {e}. Falling back to forceful deletion.")
-
-        for db_dir in [chroma_dir_rag, pdf_temp_dir]: 
-            if os.path.exists(db_dir):
-                print(f"Django API: Deleting directory (force fallback): {db_dir}")
-                try:
-                    shutil.rmtree(db_dir)
-                    print(f"Django API: Cleaned up {db_dir} using shutil.rmtree.")
-                except Exception as e:
-                    print(f"Django API: shutil.rmtree failed for {db_dir}: {e}. Attempting shell command.")
-                    import time
-                    time.sleep(0.5)
-                    os.system(f'rm -rf "{db_dir}"')
-                    print(f"Django API: Attempted force cleanup via shell for: {db_dir}.")
-                    if os.path.exists(db_dir):
-                        print(f"Django API: WARNING: Directory {db_dir} still exists after shell cleanup!")
-                        raise PermissionError(f"Failed to clean directory: {db_dir}. Please delete manually.") from e
-
-        os.makedirs(chroma_dir_rag, exist_ok=True)
-        os.makedirs(pdf_temp_dir, exist_ok=True)
-
-        print(f"Django API: Loading/Creating ChromaDB at: {chroma_dir_rag}")
-        vectorstore_rag = Chroma(
-            persist_directory=chroma_dir_rag,
-            embedding_function=models.embeddings
-        )
-
-        print(f"Django API: Adding {len(all_chunks)} chunks to ChromaDB.")
-        vectorstore_rag.add_documents(all_chunks)
-        print(f"Django API: Documents added to ChromaDB.")
-
-        rag_graph_module.retriever_rag = vectorstore_rag.as_retriever(search_kwargs={"k": 3})
-        print("Django API: Retriever updated.")
-
-        return f"Successfully ingested {len(processed_file_names)} file(s). Documents are ready!", processed_file_names
 
-    except Exception as e:
-        print(f"Django API: Error during document ingestion: {e}\n{traceback.format_exc()}")
-        raise e
+def readiness(request):
+    report = startup.readiness_report()
+    return JsonResponse(report, status=200 if report['ready'] else 503)
 
 
-@csrf_exempt
-def clear_documents_db(request):
-    if request.method == 'POST':
-        print("\n--- Django API: Clearing all document data ---")
-        try:
-            chroma_dir_rag = settings.CHROMA_DB_DIR_RAG
-            
-            if os.path.exists(chroma_dir_rag) and os.listdir(chroma_dir_rag):
-                try:
-                    temp_chroma_client = Chroma(persist_directory=chroma_dir_rag, embedding_function=models.embeddings)
-                    temp_chroma_client.delete_collection(name=None)
-                    temp_chroma_client.reset()
-                    print(f"Django API: Gracefully reset ChromaDB at {chroma_dir_rag}.")
-                except Exception as e:
-                    print(f"Django API: Warning: Graceful reset failed for {chroma_dir_rag}: {e}. Falling back to forceful deletion.")
-            
-            for db_dir in [chroma_dir_rag, settings.PDF_TEMP_DIR, settings.MEDIA_ROOT]:
-                if os.path.exists(db_dir):
-                    try:
-                        shutil.rmtree(db_dir)
-                        print(f"Django API: Forcefully deleted {db_dir}.")
-                    except Exception as e:
-                        print(f"Django API: Error forcefully deleting {db_dir}: {e}. Try manual deletion if issue persists.")
-                        return JsonResponse({'status': 'error', 'message': f'Failed to clear: {e}. Please delete {db_dir} manually.'}, status=500)
-            
-            os.makedirs(chroma_dir_rag, exist_ok=True)
-            os.makedirs(settings.PDF_TEMP_DIR, exist_ok=True)
-            os.makedirs(settings.MEDIA_ROOT, exist_ok=True)
+def metrics_snapshot(request):
+    snapshot = metrics.snapshot()
+    web_search_service = web_search.current_web_search_service()
+    snapshot['web_search'] = web_search_service.stats() if web_search_service is not None else None
+    snapshot['coalescing_in_flight'] = single_flight.stats()
+    snapshot['llm_scheduler'] = llm_scheduler.get_scheduler().stats()
+    snapshot['logging'] = logs.stats()
+    snapshot['media_cache'] = media_cache.stats()
+    return JsonResponse(snapshot)
 
-            rag_graph_module.retriever_rag = None
-            print("Django API: All document data cleared and retriever reset.")
-            return JsonResponse({'status': 'success', 'message': 'All documents and associated data cleared.'})
-        except Exception as e:
-            print(f"Django API: Error clearing documents DB: {e}\n{traceback.format_exc()}")
-            return JsonResponse({'status': 'error', 'message': f'Failed to clear documents: {e}'}, status=500)
-    return JsonResponse({'status': 'error', 'message': 'Only POST method is allowed.'}, status=405)
 
+def chunk_document(document_content, file_name):
+    cleaned_content = utils.clean_text(document_content)
+    return RecursiveCharacterTextSplitter(chunk_size=800, chunk_overlap=100, add_start_index=True).create_documents(
+        [cleaned_content], metadatas=[{"source": file_name}])
 
 
-def ingest_documents_logic(file_paths):
+# Takes HashedUploadedFile objects (from HashingUploadHandler or
+# hashed_file_from_path). Files whose content hash is already in the index, or
+# repeated within the same upload, are skipped.
+def ingest_documents_logic(uploaded_files):
     all_chunks = []
     processed_file_names = []
-    print(f"\n--- Django API: Ingesting {len(file_paths)} file(s) into persistent DB ---")
+    skipped_file_names = []
+    registry_entries = []
+    new_sections = []
+    seen_hashes = set()
+    logger.info("Ingesting %s file(s) into persistent DB", len(uploaded_files))
     try:
-        for file_path in file_paths:
-             file_name = os.path.basename(file_path)
+        for uploaded_file in uploaded_files:
+             file_name = os.path.basename(uploaded_file.name)
+             if uploaded_file.sha256 in seen_hashes or ingest_registry.is_ingested(uploaded_file.sha256):
+                 logger.info("Skipping '%s': identical content is already ingested.", file_name)
+                 skipped_file_names.append(file_name)
+                 continue
+             seen_hashes.add(uploaded_file.sha256)
              processed_file_names.append(file_name)
-             print(f"Django API: Ingesting file: {file_name}")
+             logger.info("Ingesting file: %s", file_name)
 
-             with open(file_path, 'r', encoding='utf-8') as f:
-                 document_content = f.read()
-             cleaned_content = utils.clean_text(document_content)
-             docs = [Document(page_content=chunk, metadata={"source": file_name})
-                     for chunk in RecursiveCharacterTextSplitter(chunk_size=800, chunk_overlap=100).split_text(cleaned_content)]
+             try:
+                 document_content = uploaded_file.read().decode('utf-8')
+             except UnicodeDecodeError as e:
+                 raise Exception(f"'{file_name}' is not valid UTF-8 text: {e}") from e
+             docs = chunk_document(document_content, file_name)
              all_chunks.extend(docs)
-             print(f"Django API: Chunked '{file_name}' into {len(docs)} chunks.")
+             registry_entries.append((uploaded_file.sha256, file_name, len(docs)))
+             file_sections = sections.detect_sections(document_content, file_name)
+             new_sections.extend(file_sections)
+             logger.info("Chunked '%s' into %s chunks and %s sections.", file_name, len(docs), len(file_sections))
+
+        metrics.incr("ingest.duplicates_skipped", len(skipped_file_names))
+        if not processed_file_names and skipped_file_names:
+             return "All uploaded files were already ingested. Documents are ready!", [], skipped_file_names
 
         if not all_chunks:
              raise Exception("Error: Uploaded documents resulted in no valid chunks for ingestion.")
 
-        print(f"Django API: Total chunks for ingestion: {len(all_chunks)}.")
+        logger.info("Total chunks for ingestion: %s.", len(all_chunks))
+        metrics.incr("ingest.files", len(processed_file_names))
+        metrics.incr("ingest.chunks", len(all_chunks))
+        metrics.incr("ingest.sections", len(new_sections))
 
         
         if models.embeddings is None:
@@ -177,25 +120,31 @@ def ingest_documents_logic(file_paths):
 
         
         
-        print(f"Django API: Loading/Creating ChromaDB at: {settings.CHROMA_DB_DIR_RAG}")
-        vectorstore_rag = Chroma(
-            persist_directory=settings.CHROMA_DB_DIR_RAG,
-            embedding_function=models.embeddings 
-        )
-
-        
-        print(f"Django API: Adding {len(all_chunks)} chunks to ChromaDB.")
-        vectorstore_rag.add_documents(all_chunks)
-        print(f"Django API: Documents added to ChromaDB.")
+        # The new chunks go into a copy of the live index; it only goes live once
+        # complete, so queries keep being served from the previous version meanwhile.
+        with index_store.build_version(copy_current=True) as build_dir:
+            logger.info("Building %s index version at: %s", settings.VECTOR_STORE_BACKEND, build_dir)
+            vectorstore_rag = vectorstores.open_vector_store(build_dir)
+
+            logger.info("Adding %s chunks to the vector store.", len(all_chunks))
+            vectorstore_rag.add_documents(all_chunks)
+            ingest_registry.record(registry_entries, build_dir)
+            sections.record(new_sections, build_dir)
+            logger.info("Documents added to the vector store.")
 
         
-        rag_graph_module.retriever_rag = vectorstore_rag.as_retriever(search_kwargs={"k": 3})
-        print("Django API: Retriever updated.")
+        vectorstores.load_current_retriever()
+        logger.info("Retriever updated.")
+        sections.schedule_summaries()
+        question_bank.schedule_build()
 
-        return f"Successfully ingested {len(processed_file_names)} file(s). Documents are ready!", processed_file_names
+        status_message = f"Successfully ingested {len(processed_file_names)} file(s). Documents are ready!"
+        if skipped_file_names:
+            status_message += f" Skipped {len(skipped_file_names)} already ingested file(s)."
+        return status_message, processed_file_names, skipped_file_names
 
     except Exception as e:
-        print(f"Django API: Error during document ingestion: {e}\n{traceback.format_exc()}")
+        logger.exception("Error during document ingestion: %s", e)
         
         
         raise e
@@ -204,21 +153,34 @@ def ingest_documents_logic(file_paths):
 @csrf_exempt
 def ingest_documents(request):
     if request.method == 'POST':
+        warming = warming_up_response()
+        if warming is not None:
+            return warming
+
+        # Must be set before request.FILES is first touched.
+        request.upload_handlers = [upload_handlers.HashingUploadHandler(request)]
         uploaded_files = request.FILES.getlist('files')
+        rejection = getattr(request, 'upload_rejected', None)
+        if rejection:
+            for uploaded_file in uploaded_files:
+                uploaded_file.close()
+            return JsonResponse({'status': 'error', 'message': rejection}, status=413)
         if not uploaded_files:
             return JsonResponse({'status': 'error', 'message': 'No files uploaded.'}, status=400)
 
-        temp_file_paths = handle_uploaded_files(uploaded_files)
-
         try:
-            status_message, processed_file_names = ingest_documents_logic(temp_file_paths)
-            return JsonResponse({'status': 'success', 'message': status_message, 'processed_files': processed_file_names})
+            status_message, processed_file_names, skipped_file_names = ingest_documents_logic(uploaded_files)
+            return JsonResponse({
+                'status': 'success',
+                'message': status_message,
+                'processed_files': processed_file_names,
+                'skipped_duplicates': skipped_file_names,
+            })
         except Exception as e:
              return JsonResponse({'status': 'error', 'message': f'Ingestion failed: {e}'}, status=500)
         finally:
-            for path in temp_file_paths:
-                if os.path.exists(path):
-                    os.remove(path)
+            for uploaded_file in uploaded_files:
+                uploaded_file.close()
 
     return JsonResponse({'status': 'error', 'message': 'Only POST method is allowed.'}, status=405)
 
@@ -226,44 +188,39 @@ def ingest_documents(request):
 @csrf_exempt
 def clear_documents_db(request):
     if request.method == 'POST':
-        print("\n--- Django API: Clearing ChromaDB ---")
+        logger.info("Clearing all document data")
         try:
-            chroma_dir_rag = settings.CHROMA_DB_DIR_RAG
+            # Takes the live index offline atomically; old versions remain
+            # available to `manage.py rag_index rollback` until garbage-collected.
+            index_store.deactivate()
             chroma_dir_qgen = settings.CHROMA_DB_DIR_QGEN 
 
-            if os.path.exists(chroma_dir_rag) and os.listdir(chroma_dir_rag):
-                try:
-                    temp_chroma_client = Chroma(persist_directory=chroma_dir_rag, embedding_function=models.embeddings)
-                    temp_chroma_client.delete_collection(name=None)
-                    temp_chroma_client.reset() 
-                    print(f"Django API: Gracefully reset ChromaDB at {chroma_dir_rag}.")
-                except Exception as e:
-                    print(f"Django API: Warning: Graceful reset failed for {chroma_dir_rag}: {e}. Falling back to forceful deletion.")
-            
-            for db_dir in [chroma_dir_rag, chroma_dir_qgen, settings.PDF_TEMP_DIR, settings.MEDIA_ROOT]:
+            for db_dir in [index_store.legacy_directory(), chroma_dir_qgen, settings.PDF_TEMP_DIR, settings.MEDIA_ROOT]:
                 if os.path.exists(db_dir):
                     try:
                         shutil.rmtree(db_dir)
-                        print(f"Django API: Forcefully deleted {db_dir}.")
+                        logger.info("Forcefully deleted %s.", db_dir)
                     except Exception as e:
-                        print(f"Django API: Error forcefully deleting {db_dir}: {e}. Try manual deletion if issue persists.")
+                        logger.error("Error forcefully deleting %s: %s. Try manual deletion if issue persists.", db_dir, e)
                         return JsonResponse({'status': 'error', 'message': f'Failed to clear: {e}. Please delete {db_dir} manually.'}, status=500)
             
-            os.makedirs(chroma_dir_rag, exist_ok=True)
             os.makedirs(chroma_dir_qgen, exist_ok=True)
             os.makedirs(settings.PDF_TEMP_DIR, exist_ok=True)
             os.makedirs(settings.MEDIA_ROOT, exist_ok=True)
 
-            rag_graph_module.retriever_rag = None
-            print("Django API: All document data cleared and retriever reset.")
+            vectorstores.load_current_retriever()
+            logger.info("All document data cleared and retriever reset.")
             return JsonResponse({'status': 'success', 'message': 'All documents and associated data cleared.'})
         except Exception as e:
-            print(f"Django API: Error clearing documents DB: {e}\n{traceback.format_exc()}")
+            logger.exception("Error clearing documents DB: %s", e)
             return JsonResponse({'status': 'error', 'message': f'Failed to clear documents: {e}'}, status=500)
     return JsonResponse({'status': 'error', 'message': 'Only POST method is allowed.'}, status=405)
 
 
 @csrf_exempt
+@tracing.traced('rag_chat')
+@single_flight.coalesce_requests('rag_chat')
+@llm_scheduler.scheduled('interactive')
 def rag_chat(request):
     if request.method == 'POST':
         try:
@@ -273,48 +230,159 @@ def rag_chat(request):
             if not question:
                 return JsonResponse({'status': 'error', 'message': 'No question provided.'}, status=400)
 
+            warming = warming_up_response()
+            if warming is not None:
+                return warming
+
+            vectorstores.sync_retriever()
             if rag_graph_module.retriever_rag is None:
                  return JsonResponse({'status': 'error', 'message': 'No documents processed. Please ingest documents first.'}, status=400)
             if rag_graph_module.rag_graph_compiled is None:
                  return JsonResponse({'status': 'error', 'message': 'RAG workflow not initialized. Check server logs.'}, status=500)
 
 
-            print(f"\n--- Django API: Answering question: '{question}' ---")
+            logger.info("Answering question: '%s'", question)
             try:
-                inputs = {
-                    "question": question,
-                    "query_rewrite_attempted": False,
-                    "attempt_count": 0,
-                    "documents": [],
-                    "summarized_context": None,
-                    "relevance_grade": "unknown",
-                    "query_classification": "unknown",
-                    "generation": None,
-                    "critique_status": "none"
-                }
+                inputs = rag_graph_module.build_initial_state(question)
                 final_state = rag_graph_module.rag_graph_compiled.invoke(inputs)
                 response = final_state.get("generation", "Could not generate an answer.")
 
-                print("--- Django API: RAG flow completed. ---")
+                logger.info("RAG flow completed.")
                 return JsonResponse({'status': 'success', 'answer': response})
 
             except Exception as e:
-                print(f"--- Django API: Error during RAG chat: {e} ---")
-                print(traceback.format_exc())
+                logger.exception("Error during RAG chat: %s", e)
                 return JsonResponse({'status': 'error', 'message': f'An error occurred: {e}'}, status=500)
 
         except json.JSONDecodeError:
              return JsonResponse({'status': 'error', 'message': 'Invalid JSON body.'}, status=400)
         except Exception as e:
-             print(f"--- Django API: Unexpected Error in rag_chat view: {e} ---")
-             print(traceback.format_exc())
+             logger.exception("Unexpected Error in rag_chat view: %s", e)
              return JsonResponse({'status': 'error', 'message': f'An unexpected error occurred: {e}'}, status=500)
 
 
     return JsonResponse({'status': 'error', 'message': 'Only POST method is allowed.'}, status=405)
 
 
+def _normalize_question(question):
+    return " ".join(question.split())
+
+
+# Runs one batch question on a worker thread. The priority is set there, per
+# question, rather than around the streaming generator: the stream may be closed
+# from another thread or context, where resetting a scope opened across its
+# yields would fail.
+def _answer_batch_question(state):
+    with llm_scheduler.priority('batch'):
+        return rag_graph_module.rag_graph_compiled.invoke(state)
+
+
+def _stream_batch_answers(questions, unique_questions, max_concurrency):
+    started_at = time.perf_counter()
+    indexes_by_question = {}
+    for index, question in enumerate(questions):
+        indexes_by_question.setdefault(_normalize_question(question), []).append(index)
+
+    inputs = [rag_graph_module.build_initial_state(question) for question in unique_questions]
+    results = RunnableLambda(_answer_batch_question).batch_as_completed(
+        inputs, config={"max_concurrency": max_concurrency}, return_exceptions=True
+    )
+    for unique_index, final_state in results:
+        question = unique_questions[unique_index]
+        if isinstance(final_state, Exception):
+            logger.error("Error answering batch question '%s': %s", question, final_state)
+            metrics.incr("rag_batch.errors")
+            result = {'status': 'error', 'message': f'An error occurred: {final_state}'}
+        else:
+            result = {'status': 'success', 'answer': final_state.get("generation", "Could not generate an answer.")}
+        for index in indexes_by_question[question]:
+            yield json.dumps({'index': index, 'question': questions[index], **result}) + "\n"
+
+    yield json.dumps({
+        'status': 'done',
+        'questions': len(questions),
+        'unique_questions': len(unique_questions),
+        'elapsed_seconds': round(time.perf_counter() - started_at, 3),
+    }) + "\n"
+
+
+@csrf_exempt
+@llm_scheduler.scheduled('batch')
+def rag_chat_batch(request):
+    if request.method != 'POST':
+        return JsonResponse({'status': 'error', 'message': 'Only POST method is allowed.'}, status=405)
+
+    try:
+        data = json.loads(request.body)
+    except json.JSONDecodeError:
+        return JsonResponse({'status': 'error', 'message': 'Invalid JSON body.'}, status=400)
+
+    questions = data.get('questions')
+    if not isinstance(questions, list) or not questions:
+        return JsonResponse({'status': 'error', 'message': "Provide a non-empty 'questions' list."}, status=400)
+    if not all(isinstance(question, str) and question.strip() for question in questions):
+        return JsonResponse({'status': 'error', 'message': 'Every question must be a non-empty string.'}, status=400)
+    if len(questions) > settings.RAG_BATCH_MAX_QUESTIONS:
+        return JsonResponse({
+            'status': 'error',
+            'message': f'At most {settings.RAG_BATCH_MAX_QUESTIONS} questions are allowed per batch.',
+        }, status=400)
+    try:
+        max_concurrency = int(data.get('max_concurrency') or settings.RAG_BATCH_MAX_CONCURRENCY)
+    except (TypeError, ValueError):
+        return JsonResponse({'status': 'error', 'message': "'max_concurrency' must be an integer."}, status=400)
+    max_concurrency = max(1, min(max_concurrency, settings.RAG_BATCH_MAX_CONCURRENCY))
+
+    warming = warming_up_response()
+    if warming is not None:
+        return warming
+    vectorstores.sync_retriever()
+    if rag_graph_module.retriever_rag is None:
+        return JsonResponse({'status': 'error', 'message': 'No documents processed. Please ingest documents first.'}, status=400)
+    if rag_graph_module.rag_graph_compiled is None:
+        return JsonResponse({'status': 'error', 'message': 'RAG workflow not initialized. Check server logs.'}, status=500)
+
+    # Duplicate questions run through the graph once; their query embeddings are
+    # computed together up front so retrieval never calls the embedding model.
+    unique_questions = list(dict.fromkeys(_normalize_question(question) for question in questions))
+    if hasattr(models.embeddings, 'prime'):
+        try:
+            models.embeddings.prime(unique_questions)
+        except Exception as e:
+            logger.warning("Could not pre-embed batch questions: %s", e)
+    metrics.incr("rag_batch.questions", len(questions))
+    metrics.incr("rag_batch.deduplicated", len(questions) - len(unique_questions))
+    logger.info("Answering batch of %s questions (%s unique, concurrency %s)", len(questions), len(unique_questions), max_concurrency)
+
+    return StreamingHttpResponse(
+        _stream_batch_answers(questions, unique_questions, max_concurrency),
+        content_type='application/x-ndjson',
+    )
+
+
+# Questions from the bank for the live section the topic names, or None when no
+# section matches or its difficulty band is short of unserved questions.
+def banked_questions(topic, difficulty, num_questions):
+    if not settings.QUESTION_BANK or num_questions < 1:
+        return None
+    with tracing.span("question_bank") as bank_span:
+        section = sections.match_section(topic)
+        questions = question_bank.draw(section, difficulty, num_questions) if section is not None else None
+        bank_span.set(section=section["id"] if section else None, served=len(questions or []))
+    if section is None:
+        metrics.incr("qgen.question_bank.miss")
+        return None
+    if questions is None:
+        metrics.incr("qgen.question_bank.low_stock")
+        return None
+    metrics.incr("qgen.question_bank.hit")
+    return section, questions
+
+
 @csrf_exempt
+@tracing.traced('qgen')
+@single_flight.coalesce_requests('qgen')
+@llm_scheduler.scheduled('standard')
 def qgen_questions(request):
      if request.method == 'POST':
          try:
@@ -326,45 +394,131 @@ def qgen_questions(request):
              if not topic.strip():
                  return JsonResponse({'status': 'error', 'message': 'Please enter a topic for question generation.'}, status=400)
 
+             warming = warming_up_response()
+             if warming is not None:
+                 return warming
+
+             banked = banked_questions(topic, difficulty, num_questions)
+             if banked is not None:
+                 section, questions = banked
+                 logger.info("Serving %s banked questions from section %s for topic: '%s'", len(questions), section["id"], topic)
+                 return JsonResponse({
+                     'status': 'success',
+                     'questions': "\n".join(f"{i}. {question}" for i, question in enumerate(questions, 1)),
+                     'source': 'question_bank',
+                     'section': {'number': section['number'], 'title': section['title'], 'source': section['source']},
+                 })
+
+             vectorstores.sync_retriever()
              if rag_graph_module.retriever_rag is None:
                  return JsonResponse({"status": "error", "message": "No documents processed for QGen. Please ingest documents first."}, status=400)
              if models.question_generator_chain is None:
                   return JsonResponse({"status": "error", "message": "LLM or QGen chain not configured. Check backend initialization."}, status=500)
 
-             print(f"\n--- Django API: Generating {num_questions} QGen questions for topic: '{topic}', difficulty {difficulty}/20 ---")
+             logger.info("Generating %s QGen questions for topic: '%s', difficulty %s/20", num_questions, topic, difficulty)
              try:
-                 topic_relevant_chunks = rag_graph_module.retriever_rag.invoke(topic)
+                 with metrics.timer("retrieval"), tracing.span("retrieval") as retrieval_span:
+                     topic_relevant_chunks = retrieval.adaptive_retrieve(rag_graph_module.retriever_rag, topic, "qgen")
+                     retrieval_span.set(chunks=len(topic_relevant_chunks))
                  if not topic_relevant_chunks:
                      return JsonResponse({"status": "error", "message": f"Could not find info about '{topic}' in the ingested documents to generate questions."}, status=404)
 
-                 topic_context_str = "\n\n---\n\n".join([doc.page_content for doc in topic_relevant_chunks])
+                 topic_context_str = context_packing.pack_context(topic_relevant_chunks, "qgen")
 
                  raw_questions_output = models.question_generator_chain.invoke({
                      "context": topic_context_str, "topic": topic,
                      "num_questions": num_questions, "difficulty": difficulty
                  })
                  generated_questions = models.get_string_content(raw_questions_output)
-                 print(f"--- Django API: Generated QGen questions (raw output):\n{generated_questions}\n---")
+                 logger.debug("Generated QGen questions (raw output): %s", generated_questions)
 
-                 print("--- Django API: QGen questions generated. ---")
+                 logger.info("QGen questions generated.")
                  return JsonResponse({'status': 'success', 'questions': generated_questions})
 
              except Exception as e:
-                 print(f"--- Django API: Error during QGen: {e} ---")
-                 print(traceback.format_exc())
+                 logger.exception("Error during QGen: %s", e)
                  return JsonResponse({'status': 'error', 'message': f'An error occurred during question generation: {e}'}, status=500)
 
          except json.JSONDecodeError:
              return JsonResponse({'status': 'error', 'message': 'Invalid JSON body.'}, status=400)
          except Exception as e:
-             print(f"--- Django API: Unexpected Error in qgen_questions view: {e} ---")
-             print(traceback.format_exc())
+             logger.exception("Unexpected Error in qgen_questions view: %s", e)
              return JsonResponse({'status': 'error', 'message': f'An unexpected error occurred: {e}'}, status=500)
 
      return JsonResponse({'status': 'error', 'message': 'Only POST method is allowed.'}, status=405)
 
 
+HANDWRITING_RENDER_PARAMS = {
+    "font_size": 35,
+    "text_color": (0, 0, 128),
+    "background_color": (255, 255, 240),
+    "max_width_pixels": 700,
+    "padding": 50,
+}
+
+
+# Renders summary_text as a handwriting image in the media cache (an identical
+# summary reuses the cached image). Returns the image URL (None on failure) and
+# the summary text, with an error note appended on failure.
+def render_summary_handwriting(topic, summary_text):
+    logger.info("Generating handwriting image for topic: '%s'", topic)
+    try:
+        font_path = settings.CUSTOM_HANDWRITING_FONT_PATH
+        key = media_cache.cache_key(summary_text, HANDWRITING_RENDER_PARAMS, font_path)
+        handwriting_url = media_cache.get_or_render(key, "png", lambda path: utils.render_text_with_custom_handwriting(
+            text_content=summary_text,
+            output_image_path=path,
+            custom_font_path=font_path,
+            **HANDWRITING_RENDER_PARAMS,
+        ))
+
+        if handwriting_url is not None:
+            logger.info("Handwriting image URL: %s", handwriting_url)
+            return handwriting_url, summary_text
+        logger.error("Custom handwriting rendering failed.")
+        return None, summary_text + "\n\n(Error: Custom handwriting image generation failed.)"
+
+    except Exception as e:
+        logger.exception("Error generating handwriting image: %s", e)
+        return None, summary_text + "\n\n(Error: An unexpected error occurred during handwriting image generation.)"
+
+
+# Serves a media cache file. Its name is its content hash, so the name is the ETag
+# and the response may be cached for good.
+@condition(etag_func=lambda request, file_name: os.path.splitext(file_name)[0])
+def cached_media(request, file_name):
+    path = os.path.join(media_cache.cache_directory(), file_name)
+    if not os.path.isfile(path):
+        raise Http404("Media file not found.")
+    os.utime(path)  # counts as a use for LRU eviction
+    response = FileResponse(open(path, 'rb'))
+    patch_cache_control(response, public=True, max_age=settings.MEDIA_CACHE_MAX_AGE, immutable=True)
+    return response
+
+
+# Precomputed notes for the live section the topic names, or None when no section
+# matches or its summary is not generated yet.
+def section_notes(topic):
+    if not settings.SECTION_SUMMARIES:
+        return None
+    with tracing.span("section_match") as match_span:
+        section = sections.match_section(topic)
+        summary_text = sections.summary_for(section) if section is not None else None
+        match_span.set(section=section["id"] if section else None, ready=summary_text is not None)
+    if section is None:
+        metrics.incr("summarize.section_notes.miss")
+        return None
+    if summary_text is None:
+        metrics.incr("summarize.section_notes.pending")
+        return None
+    metrics.incr("summarize.section_notes.hit")
+    return section, summary_text
+
+
 @csrf_exempt
+@tracing.traced('summarize')
+@single_flight.coalesce_requests('summarize')
+@llm_scheduler.scheduled('standard')
 def summarize_content(request):
     if request.method == 'POST':
         try:
@@ -375,71 +529,61 @@ def summarize_content(request):
              if not topic.strip():
                  return JsonResponse({'status': 'error', 'message': 'Please enter a topic for summarization.'}, status=400)
 
+             warming = warming_up_response()
+             if warming is not None:
+                 return warming
+
+             notes = section_notes(topic)
+             if notes is not None:
+                  section, generated_summary_text = notes
+                  logger.info("Serving section notes %s for topic: '%s'", section["id"], topic)
+                  handwriting_url = None
+                  if generate_handwriting:
+                      handwriting_url, generated_summary_text = render_summary_handwriting(topic, generated_summary_text)
+                  return JsonResponse({
+                      'status': 'success', 'summary': generated_summary_text, 'handwriting_url': handwriting_url,
+                      'source': 'section_notes',
+                      'section': {'number': section['number'], 'title': section['title'], 'source': section['source']},
+                  })
+
+             vectorstores.sync_retriever()
              if rag_graph_module.retriever_rag is None:
                  return JsonResponse({"status": "error", "message": "No documents processed for Summarization. Please ingest documents first."}, status=400)
              if models.summarization_chain is None:
                   return JsonResponse({"status": "error", "message": "LLM or Summarization chain not configured."}, status=500)
 
-             print(f"\n--- Django API: Generating summary for topic: '{topic}' ---")
+             logger.info("Generating summary for topic: '%s'", topic)
              handwriting_url = None
              try:
-                  topic_relevant_chunks = rag_graph_module.retriever_rag.invoke(topic)
+                  with metrics.timer("retrieval"), tracing.span("retrieval") as retrieval_span:
+                      topic_relevant_chunks = retrieval.adaptive_retrieve(rag_graph_module.retriever_rag, topic, "summarize")
+                      retrieval_span.set(chunks=len(topic_relevant_chunks))
                   if not topic_relevant_chunks:
                       return JsonResponse({"status": "error", "message": f"Could not find information about '{topic}' in the ingested documents to summarize."}, status=404)
 
-                  topic_context_str = "\n\n---\n\n".join([doc.page_content for doc in topic_relevant_chunks])
+                  topic_context_str = context_packing.pack_context(topic_relevant_chunks, "summarize")
 
                   raw_summary_output = models.summarization_chain.invoke({
                       "context": topic_context_str, "topic": topic
                   })
                   generated_summary_text = models.get_string_content(raw_summary_output)
-                  print("--- Django API: Summary generated. ---")
+                  logger.info("Summary generated.")
 
                   if generate_handwriting:
-                      print("--- Django API: Generating handwriting image... ---")
-                      try:
-                          os.makedirs(settings.MEDIA_ROOT, exist_ok=True)
-                          safe_topic_name = "".join(c for c in topic if c.isalnum() or c in [' ', '_']).replace(' ', '_')
-                          handwriting_filename = f"summary_{safe_topic_name}_handwriting.png"
-                          handwriting_full_path = os.path.join(settings.MEDIA_ROOT, handwriting_filename)
-
-                          render_success = utils.render_text_with_custom_handwriting(
-                              text_content=generated_summary_text,
-                              output_image_path=handwriting_full_path,
-                              custom_font_path=settings.CUSTOM_HANDWRITING_FONT_PATH,
-                              font_size=35,
-                              text_color=(0, 0, 128),
-                              background_color=(255, 255, 240),
-                              max_width_pixels=700,
-                              padding=50
-                          )
-
-                          if render_success:
-                              handwriting_url = f"{settings.MEDIA_URL}{handwriting_filename}"
-                              print(f"--- Django API: Handwriting image saved, URL: {handwriting_url} ---")
-                          else:
-                              print("--- Django API: Custom handwriting rendering failed. ---")
-                              generated_summary_text += "\n\n(Error: Custom handwriting image generation failed.)"
-
-                      except Exception as e:
-                          print(f"--- Django API: Error generating handwriting image: {e} ---")
-                          print(traceback.format_exc())
-                          generated_summary_text += "\n\n(Error: An unexpected error occurred during handwriting image generation.)"
+                      handwriting_url, generated_summary_text = render_summary_handwriting(topic, generated_summary_text)
 
 
                   return JsonResponse({'status': 'success', 'summary': generated_summary_text, 'handwriting_url': handwriting_url})
 
 
              except Exception as e:
-                  print(f"--- Django API: Error during summarization: {e} ---")
-                  print(traceback.format_exc())
+                  logger.exception("Error during summarization: %s", e)
                   return JsonResponse({'status': 'error', 'message': f'An error occurred: {e}'}, status=500)
 
         except json.JSONDecodeError:
              return JsonResponse({'status': 'error', 'message': 'Invalid JSON body.'}, status=400)
         except Exception as e:
-             print(f"--- Django API: Unexpected Error in summarize_content view: {e} ---")
-             print(traceback.format_exc())
+             logger.exception("Unexpected Error in summarize_content view: %s", e)
              return JsonResponse({'status': 'error', 'message': f'An unexpected error occurred: {e}'}, status=500)
 
 